@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from enigma import EnigmaMachine
+
+
+# Measure a function: "warmup" untimed calls, then "repeat" samples of "number" calls each, timed with
+# time.perf_counter. Returns a dictionary with the statistics of the time per call in seconds
+def measure(function, repeat=5, number=1, warmup=1):
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - t_start) / number)
+    return {"min": min(samples),
+            "median": statistics.median(samples),
+            "mean": statistics.mean(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            "repeat": repeat,
+            "number": number}
+
+
+# Seeded random message of "length" UPPERCASE letters
+def random_message(length, seed):
+    rng = random.Random(seed)
+    return "".join(chr(65 + rng.randint(0, 25)) for _ in range(length))
+
+
+# Enigma Machine with the given rotors (from the leftmost rotor) and number of plug leads
+def benchmark_machine(rotors, num_plugleads=0):
+    em = EnigmaMachine()
+    em.configure({"rotors": rotors, "positions": ["A"] * len(rotors), "ring_settings": [1] * len(rotors),
+                  "reflector": "B",
+                  "plugleads": ["AB", "CD", "EF", "GH", "IJ", "KL", "MN", "OP", "QR", "ST"][:num_plugleads]})
+    return em
+
+
+# Encoding benchmarks: (name, rotors, number of plug leads, message length, calls per sample)
+ENCODING_BENCHMARKS = [("single_letter_latency", ["I", "II", "III"], 0, 1, 1000),
+                       ("throughput_3_rotors", ["I", "II", "III"], 0, 10000, 1),
+                       ("throughput_4_rotors", ["Beta", "I", "II", "III"], 0, 10000, 1),
+                       ("throughput_plugleads_0", ["I", "II", "III"], 0, 10000, 1),
+                       ("throughput_plugleads_5", ["I", "II", "III"], 5, 10000, 1),
+                       ("throughput_plugleads_10", ["I", "II", "III"], 10, 10000, 1),
+                       ("compiled_throughput_3_rotors", ["I", "II", "III"], 10, 1000000, 1)]
+
+# End to end code breaking benchmarks (CodeBreaking static methods)
+CODE_BREAKING_BENCHMARKS = ["code1", "code2", "code3", "code4", "code5"]
+
+
+# Run the benchmarks whose name contains one of the "selected" strings (all of them if None).
+# Returns a dictionary with the run environment and the statistics of each benchmark
+def run_benchmarks(selected=None, repeat=5, end_to_end_repeat=1):
+    def wanted(name):
+        return selected is None or any(pattern in name for pattern in selected)
+    results = {}
+    for name, rotors, num_plugleads, length, number in ENCODING_BENCHMARKS:
+        if not wanted(name):
+            continue
+        em = benchmark_machine(rotors, num_plugleads)
+        message = random_message(length, seed=length)
+        encode = em.compile().encode if name.startswith("compiled") else em.encode
+        results[name] = measure(lambda: encode(message), repeat=repeat, number=number)
+        results[name]["letters_per_second"] = length / results[name]["median"]
+    if wanted("common_words_analysis"):
+        from code_breaking import CodeBreaking
+        cb = CodeBreaking()
+        phrases = [random_message(60, seed) for seed in range(200)]
+        results["common_words_analysis"] = measure(lambda: [cb.common_words_analysis(p) for p in phrases], repeat=repeat)
+        results["common_words_analysis"]["phrases"] = len(phrases)
+    for name in CODE_BREAKING_BENCHMARKS:
+        if not wanted(name):
+            continue
+        from code_breaking import CodeBreaking
+        code = getattr(CodeBreaking, name)
+
+        # The codes print their results: keep the benchmark output clean
+        def run_code():
+            with contextlib.redirect_stdout(io.StringIO()):
+                code()
+        results[name] = measure(run_code, repeat=end_to_end_repeat, warmup=0)
+    return {"environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "processor": platform.processor(), "timer": "time.perf_counter"},
+            "benchmarks": results}
+
+
+# Compare the median times of a run against a baseline run.
+# A benchmark is a regression if it is more than "threshold" (e.g. 0.1 = 10%) slower than in the baseline.
+# Returns a list of (name, baseline median, current median, ratio, is regression)
+def compare_results(baseline, current, threshold):
+    comparison = []
+    for name, stats in current["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        base_median = baseline["benchmarks"][name]["median"]
+        ratio = stats["median"] / base_median if base_median > 0 else float("inf")
+        comparison.append((name, base_median, stats["median"], ratio, ratio > 1 + threshold))
+    return comparison
+
+
+# Helper function which prints the benchmark results
+def print_benchmarks(results):
+    for name, stats in results["benchmarks"].items():
+        print(f"{name:32s} median {stats['median'] * 1e3:12.4f} ms  min {stats['min'] * 1e3:12.4f} ms  "
+              f"stdev {stats['stdev'] * 1e3:10.4f} ms")
+
+
+# Helper function which prints a comparison against a baseline
+def print_comparison(comparison, threshold):
+    for name, base_median, median, ratio, regression in comparison:
+        flag = "REGRESSION" if regression else ("faster" if ratio < 1 - threshold else "ok")
+        print(f"{name:32s} {base_median * 1e3:12.4f} ms -> {median * 1e3:12.4f} ms  x{ratio:7.3f}  {flag}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Enigma Machine benchmark suite")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare the results against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slow down flagged as a regression (default 0.1 = 10%%)")
+    parser.add_argument("--filter", nargs="*", help="only run the benchmarks whose name contains one of these strings")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed samples of each benchmark")
+    parser.add_argument("--end-to-end-repeat", type=int, default=1,
+                        help="number of timed samples of each code breaking benchmark")
+    args = parser.parse_args()
+    results = run_benchmarks(args.filter, args.repeat, args.end_to_end_repeat)
+    print_benchmarks(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+        comparison = compare_results(baseline, results, args.threshold)
+        print_comparison(comparison, args.threshold)
+        if any(regression for *_, regression in comparison):
+            sys.exit(1)
@@ -0,0 +1,235 @@
+import itertools
+import numpy as np
+from enigma import EnigmaMachine
+import compiled_enigma
+import utility
+
+
+# Menu of a Turing-Welchman bombe: the graph built by placing a crib under the encoded message.
+# Each letter of the crib and the encoded letter above it are the two ends of an edge labelled with the message position
+# of the pair. Since Enigma is an involution, the plugboard partners of the two letters are swapped by the scrambler
+# (rotors + reflector) of that position: plug(encoded) = scrambler_i(plug(crib letter)).
+class Menu:
+
+    def __init__(self, encoded_string, crib, offset):
+        encoded_string = utility.check_input_message_formatting(encoded_string, "Input Message")
+        crib = utility.check_input_message_formatting(crib, "Crib Word")
+        if offset < 0 or offset + len(crib) > len(encoded_string):
+            raise ValueError(f"The crib cannot be placed at offset {offset} of the encoded message")
+        if len(crib) == 0:
+            raise ValueError("The crib must contain at least one letter")
+        self.encoded_string = encoded_string            # Encoded message
+        self.crib = crib                                # Crib placed under the encoded message
+        self.offset = offset                            # Position of the first letter of the crib in the message
+        self.edges = []                                 # (crib letter, encoded letter, message position) as integers
+        for idx, (plain_char, encoded_char) in enumerate(zip(crib, encoded_string[offset:])):
+            # Enigma never encodes a letter into itself
+            if plain_char == encoded_char:
+                raise ValueError(f"Letter {plain_char} of the crib is encoded into itself at position {offset + idx}")
+            self.edges.append((compiled_enigma.char2num(plain_char), compiled_enigma.char2num(encoded_char), offset + idx))
+        self.connections = {}                           # Letter -> number of edges ending in the letter
+        for plain_letter, encoded_letter, _ in self.edges:
+            self.connections[plain_letter] = self.connections.get(plain_letter, 0) + 1
+            self.connections[encoded_letter] = self.connections.get(encoded_letter, 0) + 1
+        self.components = self.__find_components()     # Connected groups of letters, the most connected one first
+        # Number of independent loops (closed chains of letters), each of them makes a wrong hypothesis much more
+        # likely to spread to all the letters and be rejected
+        self.loops = len(self.edges) - len(self.connections) + len(self.components)
+        # The hypotheses are made on the most connected letter of the most connected group
+        self.test_letter = max(self.components[0], key=lambda letter: (self.connections[letter], -letter))
+
+    # Group the letters connected by the edges (union-find)
+    def __find_components(self):
+        parents = dict((letter, letter) for letter in self.connections)
+
+        def root(letter):
+            while parents[letter] != letter:
+                parents[letter] = parents[parents[letter]]
+                letter = parents[letter]
+            return letter
+        for plain_letter, encoded_letter, _ in self.edges:
+            parents[root(plain_letter)] = root(encoded_letter)
+        components = {}
+        for letter in sorted(self.connections):
+            components.setdefault(root(letter), []).append(letter)
+        return sorted(components.values(), key=lambda letters: (-sum(self.connections[x] for x in letters), letters))
+
+
+# Turing-Welchman bombe for a given rotor order, reflector and ring settings.
+# For each rotor start position the hypothesis "the test letter of the menu is plugged to X" is spread through the
+# scramblers of the menu edges and through the diagonal board (A plugged to B <=> B plugged to A) until nothing changes.
+# A wrong hypothesis usually ends up implying that the test letter is plugged to every letter. The position is a stop
+# when some hypotheses on the test letter survive, and it is reported only if one of them implies a consistent partial
+# plugboard (every letter plugged to at most one letter).
+# rotors, ring_settings = lists from the leftmost to the rightmost rotor as in EnigmaMachine (ring settings 1 - 26).
+# The ring settings only matter through the rotors turnovers: if unknown, keep the default ones and the stops report
+# the rotor positions relative to the rings as long as the middle rotor does not rotate under the crib.
+class Bombe:
+
+    def __init__(self, rotors, reflector, ring_settings=None):
+        if ring_settings is None:
+            ring_settings = [1 for _ in rotors]
+        self.rotors = list(rotors)                      # Rotor names from the leftmost to the rightmost rotor
+        self.reflector = reflector                      # Reflector name
+        self.ring_settings = list(ring_settings)        # Ring settings from the leftmost to the rightmost rotor
+        self.batch_size = 1024                          # Number of rotor start positions tested at once
+        # Rotor wirings, reflector table and notches taken from the existing components
+        self.__em = EnigmaMachine()
+        self.__em.configure({"rotors": self.rotors, "ring_settings": self.ring_settings, "reflector": reflector})
+        compiled = self.__em.compile()
+        self.__forward = compiled.forward
+        self.__backward = compiled.backward
+        self.__reflector = compiled.reflector
+        self.__notches = compiled.notches
+        self.__rings = np.array(compiled.ring_settings, dtype=np.intp)
+        self.__max_num_plugleads = self.__em.plugboard.max_num_plugleads
+
+    # Test all the rotor start positions (or the given list of positions, e.g. [("A", "D", "Q"), ...]) against the menu.
+    # Returns a list of stops (rotor positions from the leftmost rotor, implied plug leads e.g. ["AB", "CF"]).
+    # Letters of the menu implied to be plugged to themselves are not reported as plug leads.
+    def run(self, menu, positions=None):
+        if positions is None:
+            positions = itertools.product([chr(x) for x in range(65, 65 + 26)], repeat=len(self.rotors))
+        positions = list(positions)
+        stops = []
+        for batch_start in range(0, len(positions), self.batch_size):
+            batch = positions[batch_start: batch_start + self.batch_size]
+            # Positions ordered from the rightmost rotor as in the compiled machine
+            pos_arr = np.array([[compiled_enigma.char2num(p) for p in reversed(pos)] for pos in batch], dtype=np.intp)
+            scramblers = self.menu_scramblers(menu, pos_arr)
+            # Hypothesis: the test letter is plugged to A
+            hypotheses = np.zeros((len(batch), 26), dtype=bool)
+            hypotheses[:, 0] = True
+            live = spread_hypotheses(menu.edges, scramblers, menu.test_letter, hypotheses)
+            test_row = live[:, menu.test_letter, :]
+            for idx in np.flatnonzero(test_row.sum(axis=1) < 26):
+                # If only A is live the hypothesis is confirmed, otherwise the right partner can only be among the
+                # letters which are not live
+                if test_row[idx].sum() == 1:
+                    candidates = [live[idx]]
+                else:
+                    partners = np.flatnonzero(~test_row[idx])
+                    single = np.zeros((len(partners), 26), dtype=bool)
+                    single[np.arange(len(partners)), partners] = True
+                    candidates = spread_hypotheses(menu.edges, np.repeat(scramblers[idx: idx + 1], len(partners), axis=0),
+                                                   menu.test_letter, single)
+                for candidate in candidates:
+                    leads = implied_plugleads(candidate)
+                    if leads is not None and len(leads) <= self.__max_num_plugleads:
+                        stops.append((tuple(batch[idx]), leads))
+        return stops
+
+    # Scrambler permutation (rotors + reflector) of each menu edge for each rotor start position.
+    # pos_arr = array (n x num_rotors) of start positions ordered from the rightmost rotor.
+    # Returns an array (n x num_edges x 26)
+    def menu_scramblers(self, menu, pos_arr):
+        keystrokes = np.array([position + 1 for _, _, position in menu.edges], dtype=np.intp)
+        trajectory = compiled_enigma.rotor_positions_at([pos_arr[:, idx: idx + 1] for idx in range(pos_arr.shape[1])],
+                                                        self.__notches, keystrokes[None, :])
+        offsets = np.stack(np.broadcast_arrays(*trajectory), axis=-1) - self.__rings
+        contacts = np.broadcast_to(np.arange(26), (offsets.shape[0] * offsets.shape[1], 26))
+        scramblers = compiled_enigma.scramble(self.__forward, self.__backward, self.__reflector,
+                                              offsets.reshape(-1, pos_arr.shape[1]), contacts)
+        return scramblers.reshape(offsets.shape[0], offsets.shape[1], 26)
+
+    # Confirm a stop on an EnigmaMachine: the encoded message is decoded with the stop rotor positions and the implied
+    # plug leads, and the stop is confirmed if the crib appears under the encoded message where the menu placed it.
+    # Returns the decoded message, or None if the stop is not confirmed
+    def confirm(self, menu, stop):
+        positions, leads = stop
+        self.__em.configure({"positions": positions, "plugleads": leads})
+        decoded_string = self.__em.encode(menu.encoded_string)
+        if decoded_string[menu.offset: menu.offset + len(menu.crib)] != menu.crib:
+            return None
+        return decoded_string
+
+
+# Spread plugboard hypotheses through the menu edges and the diagonal board until nothing changes.
+# scramblers = array (n x num_edges x 26) as returned by Bombe.menu_scramblers, hypotheses = boolean array (n x 26)
+# with the letters the test letter is supposed to be plugged to.
+# Returns a boolean array (n x 26 x 26) where [k, a, b] is True if "a is plugged to b" follows from hypothesis k
+def spread_hypotheses(edges, scramblers, test_letter, hypotheses):
+    live = np.zeros((len(hypotheses), 26, 26), dtype=bool)
+    live[:, test_letter, :] = hypotheses
+    num_live = -1
+    while live.sum() != num_live:
+        num_live = live.sum()
+        for edge_idx, (plain_letter, encoded_letter, _) in enumerate(edges):
+            # plug(encoded letter) = scrambler(plug(crib letter)), the scrambler is its own inverse
+            scrambler = scramblers[:, edge_idx, :]
+            live[:, encoded_letter, :] |= np.take_along_axis(live[:, plain_letter, :], scrambler, axis=1)
+            live[:, plain_letter, :] |= np.take_along_axis(live[:, encoded_letter, :], scrambler, axis=1)
+        # diagonal board
+        live |= live.transpose(0, 2, 1)
+    return live
+
+
+# Plug leads implied by a spread hypothesis (26 x 26 boolean array, see spread_hypotheses).
+# Returns the list of plug leads, or None if a letter is plugged to more than one letter
+def implied_plugleads(live):
+    if (live.sum(axis=1) > 1).any():
+        return None
+    plain_letters, partners = np.nonzero(live)
+    return [compiled_enigma.num2char(int(a)) + compiled_enigma.num2char(int(b))
+            for a, b in zip(plain_letters, partners) if a < b]
+
+
+# Search the settings of an encoded message with a bombe, trying every rotor order and every possible crib offset
+# (or the given one). rotor_orders = list of rotor names lists, e.g. [["I", "II", "III"], ["II", "I", "III"]]
+# Returns a list of (rotors, reflector, rotor positions, plug leads, decoded message) for each stop confirmed on an
+# EnigmaMachine
+def bombe_search(encoded_string, crib, rotor_orders, reflectors, ring_settings=None, offset=None):
+    encoded_string = utility.check_input_message_formatting(encoded_string, "Input Message")
+    crib = utility.check_input_message_formatting(crib, "Crib Word")
+    if offset is None:
+        offsets = [idx for idx in range(len(encoded_string) - len(crib) + 1)
+                   if all(a != b for a, b in zip(crib, encoded_string[idx:]))]
+    else:
+        offsets = [offset]
+    solutions = []
+    for crib_offset in offsets:
+        menu = Menu(encoded_string, crib, crib_offset)
+        for rotors in rotor_orders:
+            for reflector in reflectors:
+                bombe = Bombe(rotors, reflector, ring_settings)
+                for stop in bombe.run(menu):
+                    decoded_string = bombe.confirm(menu, stop)
+                    if decoded_string is not None:
+                        solutions.append((list(rotors), reflector, stop[0], stop[1], decoded_string))
+    return solutions
+
+
+if __name__ == '__main__':
+    import time
+
+    # The menu of a crib with one loop (E - X - T - E)
+    menu = Menu("XTEQQ", "TEXAB", 0)
+    assert (menu.loops == 1 and menu.test_letter == compiled_enigma.char2num("E"))
+    assert (len(menu.components) == 2)
+
+    plaintext = "WETTERVORHERSAGEFUERDIEREGIONNORDSEEHEUTEMORGENREGENUNDWIND"
+    leads = ["AZ", "BY", "CX", "DW", "EV", "FU", "GT", "HS", "IR", "JQ"]
+    em = EnigmaMachine()
+    em.add_rotors(["II", "IV", "V"])
+    em.set_rotors_initial_pos(["B", "L", "A"])
+    em.set_rotors_ring_setting([1, 1, 1])
+    em.add_reflector("B")
+    em.add_plugleads(list(leads))
+    encoded = em.encode(plaintext)
+    crib = "WETTERVORHERSAGE"
+    menu = Menu(encoded, crib, 0)
+    t_start = time.time()
+    bombe = Bombe(["II", "IV", "V"], "B")
+    stops = bombe.run(menu)
+    print(f"{len(stops)} stops out of {26 ** 3} positions in {round(time.time() - t_start, 3)} seconds")
+    confirmed = [(stop, bombe.confirm(menu, stop)) for stop in stops]
+    confirmed = [(stop, decoded) for stop, decoded in confirmed if decoded is not None]
+    assert (any(stop[0] == ("B", "L", "A") for stop, _ in confirmed))
+    # The implied plug leads are a subset of the real ones
+    for stop, decoded in confirmed:
+        if stop[0] == ("B", "L", "A"):
+            assert (set(stop[1]) <= set(leads))
+            print(f"Stop {stop[0]} plug leads {stop[1]} decoded message {decoded}")
+    solutions = bombe_search(encoded, crib, [["II", "IV", "V"], ["IV", "II", "V"]], ["B"], offset=0)
+    assert (any(solution[2] == ("B", "L", "A") for solution in solutions))
+    print("Bombe tests passed")
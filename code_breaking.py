@@ -1,9 +1,29 @@
 from enigma import *
+import compiled_enigma
+from word_automaton import WordAutomaton
+import plugboard_solver
+import scoring
+import search_planner
+import search_metrics
+import search_space
+import key_equivalence
+import result_store
+import scrambler_cache
+import shared_scrambler_tables
+import numpy as np
 import itertools
+import concurrent.futures
+import multiprocessing
+import heapq
 import time
 import math
+import os
+import pickle
 import utility
 
+# Common words DB and their automaton, by file path: the file is read and the automaton built once per process
+_common_words_cache = {}
+
 
 class CodeBreaking():
 
@@ -22,19 +42,44 @@ class CodeBreaking():
         self.__reflector_name = self.__available_reflectors
         self.__plugboard_connection = ["??", "??"]
         self.__rotor_name_comb = []
-        self.__rotor_pos_comb = []
-        self.__rotor_ring_setting_comb = []
         self.__plugboard_connection_comb = []
         self.__reflectors_comb = []
         self.__reflector_wiring_comb = []
+        self.search_space = None            # search_space.SearchSpace of the constraints (see generate_combination)
         self.allow_reflector_modifications = False
         self.reflector_pairs_to_swap = 0
         # Words DB taken from the github repository shown below:
         # https://github.com/first20hours/google-10000-english/blob/master/google-10000-english-no-swears.txt
         self.__common_words_DB = []
         self.load_common_words_DB("google-10000-english-no-swears.txt")
-        self.decoded_string_DB = {}
-        self.settings_DB = {}
+        self.__scorer = None        # Plaintext scorer (None = common words analysis)
+        self.__scorer_name = "common_words"
+        self.max_results = 100      # Number of best decoded messages kept by the search (see result_store)
+        self.score_threshold = None         # Decoded messages scoring less are discarded (None = keep all)
+        self.results_export_path = None     # JSON lines file where every kept decoded message is streamed (None = off)
+        self.results = None                 # result_store.ResultStore with the best results of the last search
+        self.batch_size = 4096      # Maximum number of rotor position/ring setting candidates decoded at once
+        self.num_workers = 1        # Number of worker processes used by break_code (1 = run in this process)
+        self.crib_pruning_min_batch = 64    # Smaller batches are fully decoded instead of using crib placement pruning
+        self.prune_equivalent_keys = True   # Decode one candidate of each class of equivalent rotor positions/ring
+                                            # settings and give its result to the whole class (see key_equivalence)
+        self.scrambler_cache = scrambler_cache.ScramblerTableCache()   # Scrambler tables reused by the plugboard
+                                            # candidates of break_code (None = off, see scrambler_cache)
+        self.scrambler_table_min_plugboards = 26    # Smaller plugboard loops do not use the scrambler tables: the
+                                            # tables of a candidate cost about as much as decoding 26 messages
+        self.shared_tables_max_bytes = 512 * 2 ** 20   # Memory of the scrambler tables of the rotor states shared by
+                                            # the break_code worker processes (0 = off, see shared_scrambler_tables)
+        self.state_tables = None            # shared_scrambler_tables.SharedScramblerTables used by search_shard
+        self.hill_climbing_candidates = 20  # Number of best ranked rotor settings whose plug leads are hill climbed
+        self.search_strategy = None         # "brute_force" or "batched" (None = chosen by plan_search)
+        self.loop_order = None              # Order of the search loops, e.g. ("rotors", "reflector", "plugboard")
+                                            # (None = chosen by plan_search)
+        self.allow_heuristic_search = False  # plan_search may choose hill climbing (not exhaustive) for unknown leads
+        self.__search_plan = None
+        self.checkpoint_path = None         # File where break_code saves its progress (None = no checkpoints)
+        self.checkpoint_interval = 60       # Seconds between two checkpoints
+        self.resume = False                 # Continue the search saved in checkpoint_path, if any
+        self.metrics = None                 # search_metrics.SearchMetrics which instruments break_code (None = off)
 
     def set_number_of_rotors(self, n):
         self.__rotor_num = n
@@ -117,25 +162,36 @@ class CodeBreaking():
                 raise ValueError(f"reflector {this_reflector} is not a valid reflector name")
         self.__reflector_name = reflectors
 
+    # Select how the decoded messages are scored:
+    # "common_words" (default) = common_words_analysis, "bigrams", "trigrams", "quadgrams" = n-grams log-likelihood,
+    # "ioc" = index of coincidence, "chi_squared" = distance from the English letter frequencies.
+    # All scorers but "common_words" score a whole batch of candidates at once.
+    def set_scorer(self, scorer_name):
+        if type(scorer_name) is not str:
+            raise TypeError("Scorer name must be a string: e.g. 'quadgrams'")
+        if scorer_name == "common_words":
+            self.__scorer = None
+        else:
+            self.__scorer = scoring.scorer_from_name(scorer_name, self.__common_words_DB)
+        self.__scorer_name = scorer_name
+
     # Helper method to load the common words Data base.
+    # The file is only read the first time it is loaded in this process, later CodeBreaking objects reuse it.
     def load_common_words_DB(self, file_path):
-        with open(file_path, 'r') as file:
-            DB = file.readlines()
-        words_DB = map(lambda s: s.strip("\n"), DB)
-        words_BB = map(lambda s: s.upper(), words_DB)
-        self.__common_words_DB = list(words_BB)
+        if file_path not in _common_words_cache:
+            with open(file_path, 'r') as file:
+                DB = file.readlines()
+            words_DB = map(lambda s: s.strip("\n"), DB)
+            words_BB = list(map(lambda s: s.upper(), words_DB))
+            # Do not score words with length less than 3 e.g. IS, TO, AT, IN, etc...
+            # they are more likely to be found in a randomly generated string
+            _common_words_cache[file_path] = (words_BB, WordAutomaton([word for word in words_BB if len(word) > 2]))
+        words_DB, self.__common_words_automaton = _common_words_cache[file_path]
+        self.__common_words_DB = list(words_DB)
 
+    # Build the search space of the constraints. The rotor positions and ring settings combinations are not
+    # materialized: search_space computes them from their index.
     def generate_combination(self):
-        # Calculate possible combinations for Rotor Position
-        all_comb = itertools.product(*[self.__available_rotor_pos for _ in range(self.__rotor_num)])
-        # Filter the Rotor position Combination to only keep those ones which satisfy the constraints
-        self.__rotor_pos_comb = CodeBreaking.filter_combinations(self.__rotors_positions, all_comb)
-
-        # Calculate possible combination for Rotor Ring Setting
-        all_comb = itertools.product(*[self.__available_ring_setting for _ in range(self.__rotor_num)])
-        # Filter the Rotor Ring Setting Combination to only keep those ones which satisfy the constraints
-        self.__rotor_ring_setting_comb = CodeBreaking.filter_combinations(self.__rotors_ring_setting, all_comb)
-
         # Calculate possible combination for Rotors nName
         comb = list(itertools.permutations(self.__available_rotors, self.__rotor_num))
         # Filter the Rotor combination to only keep those ones which satisfy the constraints
@@ -146,21 +202,27 @@ class CodeBreaking():
         comb_list = [x for x, in comb if x in self.__reflector_name]
         self.__reflectors_comb = comb_list
 
+        # Allowed rotor positions and ring settings of each rotor, in enumeration order
+        positions = [[x for x in self.__available_rotor_pos if x in constraint] for constraint in self.__rotors_positions]
+        ring_settings = [[x for x in self.__available_ring_setting if x in constraint]
+                         for constraint in self.__rotors_ring_setting]
+        self.search_space = search_space.SearchSpace(self.__rotor_name_comb, positions, ring_settings,
+                                                     self.__reflectors_comb,
+                                                     self.reflector_pairs_to_swap if self.allow_reflector_modifications else 0,
+                                                     self.__plugboard_connection)
+
     # Method to compute the total number of comination possible for any given input settings
     def calculate_combinations_number(self):
-        comb_num_rotors = len(self.__rotor_name_comb)
-        comb_num_rotor_pos = len(self.__rotor_pos_comb)
-        comb_num_ring_set = len(self.__rotor_ring_setting_comb)
-        comb_num_reflector = len(self.__reflectors_comb)
-        comb_num_plugboard = self.calc_plugboard_comb_num()
-        if self.allow_reflector_modifications:
-            n = self.reflector_pairs_to_swap
-            comb_reflector_wire = int(math.factorial(13) / math.factorial(13 - n) / math.factorial(n) * utility.doubleFactorial(n-1))
-        else:
-            comb_reflector_wire = 1
-        tot_comb_num = comb_num_rotors * comb_num_rotor_pos * comb_num_ring_set * comb_num_reflector * comb_num_plugboard * comb_reflector_wire
-        return tot_comb_num
+        return self.search_space.num_keys
+
+    # Number of reflector wirings searched for each reflector
+    def calc_reflector_wiring_comb_num(self):
+        if not self.allow_reflector_modifications:
+            return 1
+        n = self.reflector_pairs_to_swap
+        return math.comb(13, n) * utility.doubleFactorial(n - 1)
 
+    # Number of plugboards yielded by plugboard_combinations_gen
     def calc_plugboard_comb_num(self):
         plugboard_connections = self.__plugboard_connection
         letters = "".join(plugboard_connections)
@@ -170,24 +232,79 @@ class CodeBreaking():
         known_letters = letters.replace("?", "")
         num_know_letters = len(known_letters)
         letters_rem = 26 - num_know_letters
-        if num_full_pairs == 0:
-            ncomb_full_pair = 1
+        # Contacts of the half defined plug leads (in any order), then the undefined plug leads from the other contacts
+        ncomb_half_pairs = math.perm(letters_rem, num_half_pairs)
+        ncomb_full_pair = search_space.full_pair_combination_num(letters_rem - num_half_pairs, num_full_pairs)
+        return ncomb_half_pairs * ncomb_full_pair
+
+    # Choose the search strategy and loop order of break_code with the shortest estimated time (see search_planner).
+    # The costs are calibrated by timing the reconfiguration of the machine and the decoding of "encoded_string" (and
+    # the search of the cribs in crib_list) with the first combination. search_strategy and loop_order, when set, are
+    # used instead of being chosen.
+    # Returns a SearchPlan. generate_combination must have been called beforehand.
+    def plan_search(self, encoded_string, crib_list=()):
+        encoded_string = utility.check_input_message_formatting(encoded_string, "Input Message")
+        crib_list = [utility.check_input_message_formatting(crib, "Crib Word") for crib in crib_list]
+        crib_automaton = WordAutomaton(crib_list) if len(crib_list) > 0 else None
+        encoded_letters = compiled_enigma.message2array(encoded_string)
+        num_candidates = self.search_space.num_candidates
+        loop_sizes = self.search_space.loop_sizes
+        if self.search_strategy is not None:
+            strategies = [self.search_strategy]
+        elif self.allow_heuristic_search and "?" in "".join(self.__plugboard_connection):
+            strategies = ["brute_force", "batched", "hill_climbing"]
         else:
-            ncomb_full_pair = math.factorial(letters_rem) / (math.factorial(letters_rem - num_full_pairs * 2) * 2 ** num_full_pairs * math.factorial(num_full_pairs))
-        letters_rem = letters_rem - num_full_pairs * 2
-        ncomb_half_pairs = math.factorial(letters_rem) / math.factorial(letters_rem - num_half_pairs)
-        ncomb_tot = int(ncomb_full_pair * ncomb_half_pairs)
-        return ncomb_tot
+            strategies = ["brute_force", "batched"]
+        # Calibrate the costs with the first reflector and rotors of the search and the fully known plug leads
+        plug_setting = [lead for lead in self.__plugboard_connection if "?" not in lead]
+        this_reflector = self.__reflectors_comb[0]
+        rotors = self.__rotor_name_comb[0]
+        reflector_wiring = get_wiring_by_ReflectorType(reflectorType_from_name(this_reflector))
+        costs = {"reconfigure_plugboard": search_planner.measure_cost(lambda: self.__apply_plugboard(plug_setting)),
+                 "reconfigure_reflector": search_planner.measure_cost(
+                     lambda: self.__apply_reflector(this_reflector, reflector_wiring)),
+                 "reconfigure_rotors": search_planner.measure_cost(lambda: self.__apply_rotors(rotors))}
+        forward, backward, notches = self.__apply_rotors(rotors)
+        if self.prune_equivalent_keys and num_candidates > 1:
+            # Only one candidate of each class of equivalent candidates is decoded
+            num_candidates = key_equivalence.CandidateClasses(self.search_space, notches, len(encoded_letters)).num_classes
+        reflector, _ = self.__apply_reflector(this_reflector, reflector_wiring)
+        plugboard = self.__apply_plugboard(plug_setting)
+        sample = np.arange(min(num_candidates, self.batch_size, 256))
+        pos_arr, ring_arr = self.search_space.candidate_arrays(sample)
+
+        def decode(num):
+            decoded = compiled_enigma.decode_candidates(forward, backward, reflector, notches, plugboard,
+                                                        pos_arr[:num], ring_arr[:num], encoded_letters)
+            if crib_automaton is not None:
+                crib_automaton.contains_any(decoded)
+
+        def decode_with_machine():
+            decoded_string = self.__decode_with_machine(encoded_string, *self.search_space.candidate(0))
+            return any(crib in decoded_string for crib in crib_list)
+        single = search_planner.measure_cost(lambda: decode(1))
+        costs["batched_candidate"] = (max(search_planner.measure_cost(lambda: decode(len(sample))) - single, 0) /
+                                      (len(sample) - 1) if len(sample) > 1 else single)
+        costs["batch"] = max(single - costs["batched_candidate"], 0)
+        costs["brute_force_candidate"] = search_planner.measure_cost(decode_with_machine)
+        return search_planner.plan_search(loop_sizes, num_candidates, costs, strategies, self.batch_size,
+                                          self.hill_climbing_candidates, len(self.__plugboard_connection),
+                                          self.loop_order)
 
     # Apply all possible combinations to the enigma machina to decode the "encoded_sting".
     # If the string contains one or more words specified in crib_list, the decoded message gets stored and scored based
-    # on how many common words it contains.
+    # on how many common words it contains. Only the max_results best decoded messages are kept in results, the ones
+    # scoring less than score_threshold are discarded and the others streamed to results_export_path if it is set.
     # The function returns the decoded message with the highest score plus the enigma machine settings.
+    # The search strategy and loop order are chosen by plan_search, the plan is printed before searching.
+    # If checkpoint_path is set, each shard of the search periodically saves the candidates searched so far and their
+    # results (see search_shard). With resume = True the search continues from the saved checkpoints with the same plan
+    # and gives the same result as an uninterrupted search. The checkpoints are deleted once the search is complete.
+    # Searches planned with the hill climbing strategy are not checkpointed.
     def break_code(self, encoded_string, crib_list):
         # Calculate the possible combinations for the enigma machine settings
         self.generate_combination()
-        self.decoded_string_DB = {}
-        self.settings_DB = {}
+        self.results = result_store.ResultStore(self.max_results, self.score_threshold)
         comb_num = self.calculate_combinations_number()
         if not self.allow_reflector_modifications:
             self.reflector_pairs_to_swap = 0
@@ -196,65 +313,423 @@ class CodeBreaking():
             crib_list = ["A"]
             no_crib_given = True
         crib_list = list(map(lambda l: utility.check_input_message_formatting(l, "Crib Word"), crib_list))
+        encoded_string = utility.check_input_message_formatting(encoded_string, "Input Message")
         print(f"The number of total possible combinations is {comb_num}")
-        for plug_setting in plugboard_combinations_gen(self.__plugboard_connection, self.__available_plugs):
-            # Remove the previously applied plug leads
-            self.__em.remove_plugleads()
-            # Insert new ones
-            self.__em.add_plugleads(plug_setting)
-            for this_reflector in self.__reflectors_comb:
-                # Replace reflector
-                self.__em.replace_reflector(this_reflector)
-                # Generate all allowed reflector wiring combination, if reflector_pairs_to_swap = 0 it generates the
-                # standard configuration based on the reflector name
-                reflector_wiring_comb = reflector_wiring_comb_gen(get_wiring_by_ReflectorType(reflectorType_from_name(this_reflector)), self.reflector_pairs_to_swap)
-                for reflector_wiring in reflector_wiring_comb:
-                    # Apply reflector wiring combination
-                    self.__em.reflector.swap_wiring(reflector_wiring)
-                    for rotors in self.__rotor_name_comb:
-                        # Add the new rotors combination
-                        self.__em.add_rotors(list(rotors))
-                        for pos in self.__rotor_pos_comb:
-                            # Apply new rotor initial position
-                            self.__em.set_rotors_initial_pos(list(pos))
-                            for setting in self.__rotor_ring_setting_comb:
-                                # Apply new ring settings
-                                self.__em.set_rotors_ring_setting(list(setting))
-                                # Before decoding the string reset the rotors to their default initial position
-                                self.__em.reset_default_rotor_position()
-                                decoded_string = self.__em.encode(encoded_string)
-                                for crib in crib_list:
-                                    if crib in decoded_string or no_crib_given:
-                                        # Score the decoded string based on its common word content
-                                        string_score = self.common_words_analysis(decoded_string)
-                                        self.decoded_string_DB[decoded_string] = string_score
-                                        # Report only the differences between the standard and the modified reflector configurations
-                                        wiring_diff = self.__em.reflector.find_wiring_changes()
-                                        self.settings_DB[decoded_string] = [rotors, pos, setting, plug_setting,
-                                                                            this_reflector, wiring_diff]
-        # Find the decoded message with the highest score.
-        if len(self.decoded_string_DB.keys()) == 0:
-            bretval = False
-            out_string = ""
-            best_score = []
-            settings = [[] for _ in range(6)]
+        checkpoint_file = None
+        if self.checkpoint_path is not None:
+            checkpoint_file = shard_file_path(self.checkpoint_path, 0, self.num_workers)
+        if self.resume and checkpoint_file is not None and os.path.isfile(checkpoint_file):
+            # The enumeration order of the saved search must be kept
+            self.__search_plan = load_checkpoint(checkpoint_file)["plan"]
+            print(f"Resuming the search saved in {self.checkpoint_path}")
         else:
-            bretval = True
-            best_score, out_string = max([(v, k) for k, v in self.decoded_string_DB.items()])
-            # Retrieve the Enigma Machine setting which generated the decoded message.
-            settings = self.settings_DB[out_string]
-        return bretval, out_string, best_score, settings
+            self.__search_plan = self.plan_search(encoded_string, [] if no_crib_given else crib_list)
+        print(self.__search_plan)
+        self.search_space = self.search_space.replace(loop_order=self.__search_plan.loop_order)
+        if self.__search_plan.strategy == "hill_climbing":
+            return self.break_code_hill_climbing(encoded_string, [] if no_crib_given else crib_list)
+        if self.metrics is not None:
+            self.metrics.start(comb_num)
+        if self.num_workers > 1:
+            # Each worker process searches one shard of the search space, the scrambler tables are computed once here
+            # and the workers attach to them. The workers relay their measurements to a queue which is polled here to
+            # report the progress of the whole search
+            self.state_tables = self.__shared_state_tables(len(encoded_string))
+            manager = multiprocessing.Manager() if self.metrics is not None else None
+            progress_queue = manager.Queue() if manager is not None else None
+            try:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                    futures = [executor.submit(search_shard_worker, self, shard, self.num_workers, encoded_string,
+                                               crib_list, no_crib_given, progress_queue)
+                               for shard in range(self.num_workers)]
+                    searching = True
+                    while searching:
+                        timeout = max(self.metrics.progress_interval, 0.1) if self.metrics is not None else None
+                        searching = len(concurrent.futures.wait(futures, timeout).not_done) > 0
+                        if self.metrics is not None:
+                            self.metrics.receive(progress_queue)
+                    shards_results = [future.result() for future in futures]
+            finally:
+                if self.state_tables is not None:
+                    self.state_tables.close()
+                    self.state_tables = None
+                if manager is not None:
+                    manager.shutdown()
+        else:
+            shards_results = [self.search_shard(0, 1, encoded_string, crib_list, no_crib_given)]
+        # The results are ranked by their enumeration index in the default loop order on equal scores, so that the
+        # outcome depends neither on the number of workers nor on the loop order of the plan
+        for shard_results in shards_results:
+            self.results.merge(shard_results)
+        if self.checkpoint_path is not None:
+            for shard in range(self.num_workers):
+                if os.path.isfile(shard_file_path(self.checkpoint_path, shard, self.num_workers)):
+                    os.remove(shard_file_path(self.checkpoint_path, shard, self.num_workers))
+        if self.metrics is not None:
+            self.metrics.finish()
+        return self.__best_result()
+
+    # Scrambler tables of the rotor states of each rotor order and reflector wiring of the search, shared by the worker
+    # processes (see shared_scrambler_tables). They are only built if each configuration decodes at least as many
+    # letters as its tables have entries, and for as many configurations as fit in shared_tables_max_bytes (the other
+    # ones are decoded through the rotor wirings). Returns None if no tables are built
+    def __shared_state_tables(self, message_length):
+        if self.__search_plan.strategy != "batched":
+            return None
+        table_bytes = 26 ** (self.__rotor_num + 1)
+        loop_sizes = self.search_space.loop_sizes
+        num_configurations = min(loop_sizes["reflector"] * loop_sizes["rotors"], self.shared_tables_max_bytes // table_bytes)
+        if num_configurations == 0 or self.__search_plan.num_candidates * loop_sizes["plugboard"] * message_length < table_bytes:
+            return None
+        # The first units of a plugboard outermost loop visit each reflector wiring and rotor order once
+        space = self.search_space.replace(loop_order=("plugboard", "reflector", "rotors"))
+        configurations = {}
+        for unit_idx in range(num_configurations):
+            _, this_reflector, reflector_swaps, rotors = space.unit(unit_idx)
+            forward, backward, _ = self.__apply_rotors(rotors)
+            reflector, _ = self.__apply_reflector(this_reflector, space.reflector_wiring(this_reflector, reflector_swaps))
+            configurations[(tuple(rotors), reflector.tobytes())] = (forward, backward, reflector)
+        return shared_scrambler_tables.SharedScramblerTables(configurations)
+
+    # Return the decoded message with the highest score stored in results plus the enigma machine settings
+    def __best_result(self):
+        best = self.results.best()
+        if best is None:
+            return False, "", [], [[] for _ in range(6)]
+        best_score, out_string, _, settings = best
+        return True, out_string, best_score, settings
+
+    # Break a code whose plug leads are mostly unknown (e.g. ["??", "??", ..., "??"] up to 10 leads) without
+    # enumerating the plugboard combinations:
+    # 1) every rotors/reflector/rotor position/ring setting candidate decodes the message with only the fully known
+    #    plug leads and is ranked by the index of coincidence of the decoded message, which is hardly affected by the
+    #    missing plug leads
+    # 2) the plug leads of the best hill_climbing_candidates candidates are recovered by hill climbing (see
+    #    plugboard_solver), first on the index of coincidence and then on the selected scorer (quadgrams if the scorer
+    #    is "common_words")
+    # If crib_list is not empty only the decoded messages containing one of the cribs are kept.
+    # Returns the same results as break_code, the score is the one of the scorer used for hill climbing.
+    def break_code_hill_climbing(self, encoded_string, crib_list):
+        self.generate_combination()
+        self.results = result_store.ResultStore(self.max_results, self.score_threshold)
+        if not self.allow_reflector_modifications:
+            self.reflector_pairs_to_swap = 0
+        crib_list = list(map(lambda l: utility.check_input_message_formatting(l, "Crib Word"), crib_list))
+        encoded_string = utility.check_input_message_formatting(encoded_string, "Input Message")
+        encoded_letters = compiled_enigma.message2array(encoded_string)
+        known_leads = [lead for lead in self.__plugboard_connection if "?" not in lead]
+        fixed_letters = set(compiled_enigma.char2num(char) for char in "".join(known_leads))
+        required_letters = set(compiled_enigma.char2num(char) for char in "".join(self.__plugboard_connection)
+                               if char != "?") - fixed_letters
+        # Candidates ranked with only the fully known plug leads
+        space = self.search_space.replace(plugboard_connection=known_leads)
+        num_candidates = space.num_candidates
+        num_ranked = space.num_keys
+        print(f"Ranking {num_ranked} rotor settings by index of coincidence....")
+        if self.metrics is not None:
+            self.metrics.start(num_ranked)
+        # Heap of the best ranked candidates: (index of coincidence, canonical unit index, candidate, unit description)
+        ioc_scorer = scoring.IndexOfCoincidenceScorer()
+        best_candidates = []
+        for unit_idx, plug_setting, this_reflector, wiring_diff, rotors, machine_arrays in \
+                self.__configured_units(space, range(space.num_units)):
+            forward, backward, reflector, notches, plugboard = machine_arrays
+            for batch_start in range(0, num_candidates, self.batch_size):
+                candidates = np.arange(batch_start, min(batch_start + self.batch_size, num_candidates))
+                pos_arr, ring_arr = space.candidate_arrays(candidates)
+                with self.__stage("decode"):
+                    decoded = compiled_enigma.decode_candidates(forward, backward, reflector, notches, plugboard,
+                                                                pos_arr, ring_arr, encoded_letters)
+                with self.__stage("scoring"):
+                    batch_scores = ioc_scorer.score_batch(decoded)
+                # Only the best hill_climbing_candidates of the batch can enter the heap
+                top = np.argsort(-batch_scores, kind="stable")[:self.hill_climbing_candidates]
+                for idx in top:
+                    item = (float(batch_scores[idx]), -space.canonical_unit_index(unit_idx), -int(candidates[idx]),
+                            (this_reflector, wiring_diff, rotors, machine_arrays))
+                    if len(best_candidates) < self.hill_climbing_candidates:
+                        heapq.heappush(best_candidates, item)
+                    elif item[:3] > best_candidates[0][:3]:
+                        heapq.heapreplace(best_candidates, item)
+                if self.metrics is not None:
+                    self.metrics.batch_done(len(candidates))
+        scorer = self.__scorer if self.__scorer is not None else scoring.scorer_from_name("quadgrams", self.__common_words_DB)
+        if self.results_export_path is not None:
+            self.results.open_export(self.results_export_path)
+        crib_automaton = WordAutomaton(crib_list)
+        identity = np.arange(26, dtype=np.uint8)
+        # The climbs are ranked by their order on equal results
+        for climb_idx, (_, unit_idx, candidate, (this_reflector, wiring_diff, rotors, machine_arrays)) in \
+                enumerate(sorted(best_candidates, reverse=True)):
+            forward, backward, reflector, notches, plugboard = machine_arrays
+            pos_arr, ring_arr = space.candidate_arrays([-candidate])
+            # Rotors and reflector permutation of each letter of the message, the plugboard is applied while climbing
+            trajectory = compiled_enigma.stepping_trajectory(pos_arr[0], notches, len(encoded_letters))
+            tables = compiled_enigma.scrambler_tables(forward, backward, reflector, identity, trajectory - ring_arr[0])
+            solution = plugboard
+            with self.__stage("hill_climbing"):
+                for climbing_scorer in (ioc_scorer, scorer):
+                    solution, string_score = plugboard_solver.hill_climb_plugboard(tables, encoded_letters,
+                                                                                   climbing_scorer, solution,
+                                                                                   fixed_letters, required_letters,
+                                                                                   len(self.__plugboard_connection))
+            if self.metrics is not None:
+                self.metrics.count("hill_climbs")
+            decoded = plugboard_solver.decode_with_plugboards(tables, encoded_letters, solution[None, :])
+            if len(crib_list) > 0 and not crib_automaton.contains_any(decoded)[0]:
+                continue
+            decoded_string = compiled_enigma.array2message(decoded[0])
+            plug_setting = fill_plugboard_connections(self.__plugboard_connection, solution)
+            positions, ring_settings = space.candidate(-candidate)
+            self.results.add(string_score, decoded_string, climb_idx,
+                             [rotors, positions, ring_settings, plug_setting, this_reflector, wiring_diff])
+        self.results.close_export()
+        if self.metrics is not None:
+            self.metrics.finish()
+        return self.__best_result()
+
+    # Search one shard of the search space. The search space is enumerated as a sequence of batches of rotor
+    # position/ring setting candidates and the shard takes a contiguous range of them (see search_space.shard_range).
+    # Returns a result_store.ResultStore with the best (score, decoded string, (canonical unit index, candidate),
+    # settings) of the candidates matching the cribs (see SearchSpace.canonical_unit_index); if results_export_path is
+    # set they are also streamed to the shard export file (see shard_file_path).
+    # The loops are nested and the candidates decoded (batched or brute force) as in the search plan of break_code.
+    # With prune_equivalent_keys only the representative of each class of equivalent candidates is decoded, its result
+    # is added for every candidate of the class (wherever they are in the search space) so that the results are the
+    # same as without pruning.
+    # If checkpoint_path is set, the position of the next batch and the results are saved every checkpoint_interval
+    # seconds (see shard_file_path); with resume = True a saved shard continues from its next batch.
+    # generate_combination must have been called beforehand.
+    def search_shard(self, shard, num_shards, encoded_string, crib_list, no_crib_given):
+        results = result_store.ResultStore(self.max_results, self.score_threshold)
+        cursor = (0, 0)     # (unit index, batch index) of the next batch to search
+        export_offset = 0   # size of the export file when the next batch is searched
+        checkpoint_file = None
+        if self.checkpoint_path is not None:
+            checkpoint_file = shard_file_path(self.checkpoint_path, shard, num_shards)
+            search_key = self.__checkpoint_key(encoded_string, crib_list, no_crib_given, num_shards)
+            if self.resume and os.path.isfile(checkpoint_file):
+                checkpoint = load_checkpoint(checkpoint_file)
+                if checkpoint["key"] != search_key:
+                    raise ValueError(f"The checkpoint {checkpoint_file} has been saved by a different search")
+                cursor, results = checkpoint["cursor"], checkpoint["results"]
+                if cursor is None:
+                    # the shard had already been searched
+                    return results
+                export_offset = checkpoint["export_offset"]
+            last_save = time.time()
+        if self.results_export_path is not None:
+            # The results exported after the last checkpoint are searched again and replace the ones in the file
+            results.open_export(shard_file_path(self.results_export_path, shard, num_shards), export_offset)
+        encoded_letters = compiled_enigma.message2array(encoded_string)
+        crib_automaton = WordAutomaton(crib_list)
+        # Offsets at which each crib can be placed under the encoded message
+        crib_placements = [(crib, crib_offsets(encoded_letters, crib))
+                           for crib in map(compiled_enigma.message2array, crib_list)]
+        space = self.search_space
+        num_candidates = space.num_candidates
+        batch_starts = range(0, num_candidates, self.batch_size)
+        brute_force = self.__search_plan is not None and self.__search_plan.strategy == "brute_force"
+        candidate_classes = {}      # key_equivalence.CandidateClasses of the rotor notches
+        use_tables = self.__use_scrambler_tables(space, len(batch_starts), len(encoded_letters)) and not brute_force
+        if use_tables:
+            cache_hits, cache_misses = self.scrambler_cache.hits, self.scrambler_cache.misses
+        # Range of the batches of the shard, from the next batch to search
+        first_batch, stop_batch = search_space.shard_range(space.num_units * len(batch_starts), shard, num_shards)
+        first_batch = max(first_batch, cursor[0] * len(batch_starts) + cursor[1])
+        units = range(first_batch // len(batch_starts), -(-stop_batch // len(batch_starts)) if first_batch < stop_batch else 0)
+
+        # Batches of a unit which belong to the shard
+        def shard_batches(unit_idx):
+            unit_start = unit_idx * len(batch_starts)
+            return [(batch_idx, batch_starts[batch_idx]) for batch_idx in
+                    range(max(first_batch - unit_start, 0), min(stop_batch - unit_start, len(batch_starts)))]
+        for unit_idx, plug_setting, this_reflector, wiring_diff, rotors, machine_arrays in self.__configured_units(space, units):
+            forward, backward, reflector, notches, plugboard = machine_arrays
+            unit_key = space.canonical_unit_index(unit_idx)
+            # Scrambler tables of the rotor states shared by break_code, if any
+            state_tables = self.state_tables.get((tuple(rotors), reflector.tobytes())) if self.state_tables is not None else None
+            if state_tables is not None and self.metrics is not None:
+                self.metrics.count("shared_table_units")
+            classes = None
+            if self.prune_equivalent_keys and num_candidates > 1:
+                if tuple(notches) not in candidate_classes:
+                    candidate_classes[tuple(notches)] = key_equivalence.CandidateClasses(space, notches,
+                                                                                         len(encoded_letters))
+                classes = candidate_classes[tuple(notches)]
+            # Decode the message with a batch of rotor position/ring setting candidates at the time (see search_space)
+            for batch_idx, batch_start in shard_batches(unit_idx):
+                candidates = np.arange(batch_start, min(batch_start + self.batch_size, num_candidates))
+                batch_size = len(candidates)
+                pos_arr, ring_arr = space.candidate_arrays(candidates)
+                class_sizes = np.ones(len(candidates), dtype=np.int64)
+                if classes is not None:
+                    # Only search the representatives, the other candidates get their results
+                    representative = classes.representatives(pos_arr, ring_arr) == candidates
+                    candidates, pos_arr, ring_arr = candidates[representative], pos_arr[representative], ring_arr[representative]
+                    class_sizes = classes.class_sizes(pos_arr, ring_arr)
+                if brute_force:
+                    # Decode each candidate with the machine objects
+                    with self.__stage("decode"):
+                        decoded_strings = [self.__decode_with_machine(encoded_string, *space.candidate(int(candidate)))
+                                           for candidate in candidates]
+                    with self.__stage("crib_check"):
+                        matches = [idx for idx, decoded_string in enumerate(decoded_strings)
+                                   if no_crib_given or any(crib in decoded_string for crib in crib_list)]
+                    decoded = np.array([compiled_enigma.message2array(decoded_strings[idx]) for idx in matches],
+                                       dtype=np.uint8).reshape(len(matches), len(encoded_letters))
+                else:
+                    if use_tables:
+                        # The scrambler tables of the batch are computed for the first plugboard and reused by the
+                        # next ones, and by any other search of the same candidates
+                        with self.__stage("scrambler_tables"):
+                            tables = self.scrambler_cache.get(
+                                (tuple(rotors), reflector.tobytes(), pos_arr.tobytes(), ring_arr.tobytes(),
+                                 len(encoded_letters)),
+                                lambda: compiled_enigma.candidate_scrambler_tables(forward, backward, reflector, notches,
+                                                                                   pos_arr, ring_arr, len(encoded_letters),
+                                                                                   state_tables))
+
+                        # Decode one letter for each of the given (candidate, column) pairs
+                        def decode(subset, columns):
+                            return compiled_enigma.decode_with_tables(tables, plugboard, encoded_letters, subset, columns)
+
+                        # Decode the whole message for each of the given candidates
+                        def decode_all(subset):
+                            return compiled_enigma.decode_with_tables(tables[subset], plugboard, encoded_letters)
+                    else:
+                        def decode(subset, columns):
+                            return compiled_enigma.decode_letters(forward, backward, reflector, notches, plugboard,
+                                                                  pos_arr[subset], ring_arr[subset], encoded_letters,
+                                                                  columns, state_tables)
+
+                        def decode_all(subset):
+                            return compiled_enigma.decode_candidates(forward, backward, reflector, notches, plugboard,
+                                                                     pos_arr[subset], ring_arr[subset], encoded_letters,
+                                                                     state_tables=state_tables)
+                    with self.__stage("crib_check"):
+                        if no_crib_given:
+                            matches = np.arange(len(candidates))
+                        elif len(candidates) < self.crib_pruning_min_batch:
+                            # Not worth pruning: decode the whole message and look for the cribs in one pass
+                            decoded = decode_all(np.arange(len(candidates)))
+                            matches = np.flatnonzero(crib_automaton.contains_any(decoded))
+                        else:
+                            matches = np.flatnonzero(crib_filter(decode, len(candidates), crib_placements))
+                    # Fully decode only the candidates matching the cribs
+                    with self.__stage("decode"):
+                        decoded = decode_all(matches)
+                with self.__stage("scoring"):
+                    if self.__scorer is not None:
+                        # Score the whole batch at once
+                        batch_scores = self.__scorer.score_batch(decoded)
+                    for decoded_idx, (decoded_letters, idx) in enumerate(zip(decoded, matches)):
+                        decoded_string = compiled_enigma.array2message(decoded_letters)
+                        if self.__scorer is None:
+                            # Score the decoded string based on its common word content
+                            string_score = self.common_words_analysis(decoded_string)
+                        else:
+                            string_score = float(batch_scores[decoded_idx])
+                        members = [candidates[idx]] if class_sizes[idx] == 1 else classes.members(pos_arr[idx], ring_arr[idx])
+                        for member in members:
+                            positions, ring_settings = space.candidate(int(member))
+                            settings = [rotors, positions, ring_settings, plug_setting, this_reflector, wiring_diff]
+                            results.add(string_score, decoded_string, (unit_key, int(member)), settings)
+                if self.metrics is not None:
+                    self.metrics.count("crib_matches", len(matches))
+                    self.metrics.count("equivalent_candidates", batch_size - len(candidates))
+                    self.metrics.batch_done(batch_size)
+                if checkpoint_file is not None and time.time() - last_save >= self.checkpoint_interval:
+                    save_checkpoint(checkpoint_file, {"key": search_key, "plan": self.__search_plan,
+                                                      "cursor": (unit_idx, batch_idx + 1), "results": results,
+                                                      "export_offset": results.export_offset()})
+                    last_save = time.time()
+        if use_tables and self.metrics is not None:
+            self.metrics.count("scrambler_table_hits", self.scrambler_cache.hits - cache_hits)
+            self.metrics.count("scrambler_table_misses", self.scrambler_cache.misses - cache_misses)
+        if checkpoint_file is not None:
+            save_checkpoint(checkpoint_file, {"key": search_key, "plan": self.__search_plan, "cursor": None,
+                                              "results": results, "export_offset": results.export_offset()})
+        results.close_export()
+        return results
+
+    # True if search_shard should decode with cached scrambler tables (see scrambler_cache): the plugboard loop must
+    # reuse the tables often enough and the cache must hold all the tables used between two plugboards, i.e. the
+    # tables of every batch of the loops nested in the plugboard loop
+    def __use_scrambler_tables(self, space, num_batches, message_length):
+        if self.scrambler_cache is None or space.loop_sizes["plugboard"] < max(self.scrambler_table_min_plugboards, 2):
+            return False
+        num_entries = num_batches * math.prod(space.loop_sizes[name] for name in
+                                              space.loop_order[space.loop_order.index("plugboard") + 1:])
+        return self.scrambler_cache.fits(num_entries, num_entries * min(self.batch_size, space.num_candidates) *
+                                         message_length * 26)
+
+    # Description of a search which must be the same to resume it from a checkpoint
+    def __checkpoint_key(self, encoded_string, crib_list, no_crib_given, num_shards):
+        return (encoded_string, tuple(crib_list), no_crib_given, num_shards, self.batch_size, self.__scorer_name,
+                self.max_results, self.score_threshold, self.results_export_path,
+                self.__search_plan.strategy, self.prune_equivalent_keys, self.search_space.constraints())
+
+    # Generator which configures the machine for each unit index of "units" in a search space (plugboard, reflector
+    # with its wiring and rotors, see SearchSpace.unit) and yields
+    # (unit index, plug setting, reflector name, reflector wiring changes, rotors, machine integer arrays) where the
+    # machine arrays are (forward rotor wirings, backward rotor wirings, reflector, rotor notches, plugboard).
+    def __configured_units(self, space, units):
+        current_plug_setting, current_reflector, current_rotors = None, None, None
+        for unit_idx in units:
+            plug_setting, this_reflector, reflector_swaps, rotors = space.unit(unit_idx)
+            # Only reconfigure the parts of the machine which have changed since the previous unit
+            with self.__stage("reconfigure"):
+                if plug_setting != current_plug_setting:
+                    current_plug_setting = plug_setting
+                    plugboard = self.__apply_plugboard(plug_setting)
+                if (this_reflector, reflector_swaps) != current_reflector:
+                    current_reflector = (this_reflector, reflector_swaps)
+                    reflector, wiring_diff = self.__apply_reflector(this_reflector,
+                                                                    space.reflector_wiring(this_reflector, reflector_swaps))
+                if rotors != current_rotors:
+                    current_rotors = rotors
+                    forward, backward, notches = self.__apply_rotors(rotors)
+            if self.metrics is not None:
+                self.metrics.count("units")
+            yield unit_idx, plug_setting, this_reflector, wiring_diff, rotors, (forward, backward, reflector, notches, plugboard)
+
+    # Context manager which times a stage of the search in metrics, if any
+    def __stage(self, name):
+        return self.metrics.stage(name) if self.metrics is not None else search_metrics.NO_STAGE
+
+    # Replace the previously applied plug leads. Returns the plugboard integer array
+    def __apply_plugboard(self, plug_setting):
+        self.__em.configure({"plugleads": plug_setting})
+        return compiled_enigma.plugboard_array(self.__em.plugboard)
+
+    # Switch reflector in place and apply reflector wiring combination.
+    # Returns (reflector integer array, differences between the standard and the modified reflector wirings)
+    def __apply_reflector(self, this_reflector, reflector_wiring):
+        self.__em.configure({"reflector": this_reflector})
+        self.__em.reflector.swap_wiring(reflector_wiring)
+        return compiled_enigma.reflector_array(self.__em.reflector), self.__em.reflector.find_wiring_changes()
+
+    # Switch the rotors to the new combination in place.
+    # Returns (forward rotor wirings, backward rotor wirings, rotor notches)
+    def __apply_rotors(self, rotors):
+        self.__em.configure({"rotors": rotors})
+        rotors_list = self.__em.rotorcase.rotors
+        forward = np.array([compiled_enigma.rotor_wiring_array(r, 0) for r in rotors_list], dtype=np.uint8)
+        backward = np.array([compiled_enigma.rotor_wiring_array(r, 1) for r in rotors_list], dtype=np.uint8)
+        return forward, backward, self.__em.rotorcase.notches()
+
+    # Decode a message with the machine objects, from the given rotor positions and ring settings (brute force search)
+    def __decode_with_machine(self, encoded_string, positions, ring_settings):
+        self.__em.configure({"positions": positions, "ring_settings": ring_settings})
+        return self.__em.encode(encoded_string)
 
     # Method to score an input string based on how many common words it contains. longer words are given higher score.
     # Standard common_words_DB contains the most common 10000 words in english language excluding swear words
+    # All the words are searched at once by scanning the phrase with the common words automaton.
     def common_words_analysis(self, phrase):
-        score = 0
-        for word in self.__common_words_DB:
-            # Do not score words with length less than 3 e.g. IS, TO, AT, IN, etc...
-            # they are more likely to be found in a randomly generated string
-            if word in phrase and len(word) > 2:
-                score += len(word)
-        return score
+        automaton = self.__common_words_automaton
+        return sum(len(automaton.words[word_id]) for word_id in automaton.find(phrase))
 
     # Helper methods which filters out the elements in all_comb if the ith sub-element of the element
     # is not present in the i(ith) element of constraints
@@ -431,6 +906,108 @@ class CodeBreaking():
         print(f"Total execution time: {round(t_elapsed,3)}")
 
 
+# Entry point of the break_code worker processes: search one shard of the search space.
+# Returns the results of the shard. If the search has metrics, the worker only measures its own shard and relays its
+# measurements to progress_queue (see SearchMetrics.relay)
+def search_shard_worker(code_breaker, shard, num_shards, encoded_string, crib_list, no_crib_given, progress_queue=None):
+    if code_breaker.metrics is not None:
+        code_breaker.metrics.reset()
+        code_breaker.metrics.relay_queue = progress_queue
+    try:
+        results = code_breaker.search_shard(shard, num_shards, encoded_string, crib_list, no_crib_given)
+        if code_breaker.metrics is not None:
+            code_breaker.metrics.relay()
+        return results
+    finally:
+        # Detach from the scrambler tables shared by the main process
+        if code_breaker.state_tables is not None:
+            code_breaker.state_tables.close()
+
+
+# Checkpoint or results export file of a shard of a break_code search: file_path itself if the search is not sharded
+def shard_file_path(file_path, shard, num_shards):
+    return file_path if num_shards == 1 else f"{file_path}.{shard}"
+
+
+# Save a checkpoint (dictionary) with pickle. The file is replaced at once, so that an interrupted save never leaves a
+# partially written checkpoint behind
+def save_checkpoint(file_path, checkpoint):
+    with open(file_path + ".tmp", 'wb') as file:
+        pickle.dump(checkpoint, file)
+    os.replace(file_path + ".tmp", file_path)
+
+
+# Load a checkpoint saved by save_checkpoint. Checkpoints are pickle files: only load the ones written by this program
+def load_checkpoint(file_path):
+    with open(file_path, 'rb') as file:
+        return pickle.load(file)
+
+
+# Offsets at which a crib can be placed under the encoded message.
+# Enigma never encodes a letter into itself, so the crib cannot be placed where one of its letters is above the same
+# letter of the encoded message.
+def crib_offsets(encoded_letters, crib):
+    num_windows = len(encoded_letters) - len(crib) + 1
+    if num_windows <= 0:
+        return []
+    clashes = np.zeros(num_windows, dtype=bool)
+    for idx, letter in enumerate(crib):
+        clashes |= encoded_letters[idx: idx + num_windows] == letter
+    return list(np.flatnonzero(~clashes))
+
+
+# Check which candidates decode at least one crib at one of its possible offsets.
+# decode(candidates, columns) returns one decoded letter for each (candidate, column) pair
+# crib_placements = list of (crib letters, list of offsets) as returned by crib_offsets
+# Letters are only decoded under the crib windows and a (candidate, window) pair is dropped at its first mismatch.
+# Returns a boolean array with one element per candidate
+def crib_filter(decode, num_candidates, crib_placements):
+    found = np.zeros(num_candidates, dtype=bool)
+    first_columns = sorted(set(offset for _, offsets in crib_placements for offset in offsets))
+    if len(first_columns) == 0:
+        return found
+    # The first letter of every window is needed by all the candidates: decode them all at once
+    first_letters = decode(np.repeat(np.arange(num_candidates), len(first_columns)),
+                           np.tile(first_columns, num_candidates)).reshape(num_candidates, len(first_columns))
+    column_index = dict((column, idx) for idx, column in enumerate(first_columns))
+    for crib, offsets in crib_placements:
+        if len(offsets) == 0:
+            continue
+        if len(crib) == 0:
+            found[:] = True
+            continue
+        # (candidate, window) pairs still matching the crib
+        candidates, windows = np.nonzero(first_letters[:, [column_index[offset] for offset in offsets]] == crib[0])
+        window_offsets = np.array(offsets, dtype=np.intp)[windows]
+        for idx in range(1, len(crib)):
+            if len(candidates) == 0:
+                break
+            keep = decode(candidates, window_offsets + idx) == crib[idx]
+            candidates, window_offsets = candidates[keep], window_offsets[keep]
+        found[candidates] = True
+    return found
+
+
+# Fill the unknown contacts of the plug board connections constraints (e.g. ["AB", "C?", "??"]) with the plug leads of
+# a plugboard array. Unknown leads left without a plug lead are removed. Returns the list of plug leads
+def fill_plugboard_connections(plugboard_connection, plugboard):
+    leads = []
+    used_letters = set()
+    for lead in plugboard_connection:
+        if "?" in lead and lead != "??":
+            letter = lead.replace("?", "")
+            partner = compiled_enigma.num2char(int(plugboard[compiled_enigma.char2num(letter)]))
+            lead = lead.replace("?", partner)
+        if lead != "??" and not set(lead) & used_letters:
+            leads.append(lead)
+            used_letters.update(lead)
+    for lead in plugboard_solver.plugboard_to_leads(plugboard):
+        if "??" in plugboard_connection and not set(lead) & used_letters:
+            leads.append(lead)
+            used_letters.update(lead)
+    return leads
+
+
 # Generator which creates all possible combinations of plug board connections from given constraints
 # plugboard_connection = list which specifies the number of plug_leads and their definition e.g. ["AB", "X?", "??"]
 # each pair can be fully defined "AB", partially defined "X?" or not defined "??"
@@ -441,14 +1018,14 @@ def plugboard_combinations_gen(plugboard_connection, all_available_plugs):
     num_missing_letter = letters.count("?")
     num_full_pairs = plugboard_connection.count("??")
     num_half_pairs = num_missing_letter - num_full_pairs * 2
-    letters = sorted(letters)
     known_letter_set = set(letters) - {"?"}
-    remaining_plugs = set(all_available_plugs) - known_letter_set
+    # The contacts are kept in alphabetical order, so that the enumeration order is always the same (see SearchSpace)
+    remaining_plugs = sorted(set(all_available_plugs) - known_letter_set)
     # Generating all combination of contacts to fill in the half defined plug leads
     # e.g.["AB", "C?", "??", "?H"] --> [("D", "E"), ("D", "F"), ("D", "G"), ("D", "H").....("E","Z")....]
     half_pairs = itertools.combinations(remaining_plugs, num_half_pairs)
     for half_pair in half_pairs:
-        updated_remaining_letters = remaining_plugs - set(half_pair)
+        updated_remaining_letters = [plug for plug in remaining_plugs if plug not in half_pair]
         # Generating all combination of contacts to fill in the undefined plug leads
         # e.g.["AB", "C?", "??", "?H"] --> [("D", "E"), ("D", "F"), ("D", "G"), ("D", "H").....("E","Z")....]
         full_pairs = full_pair_combination_gen(updated_remaining_letters, num_full_pairs)
@@ -469,66 +1046,50 @@ def plugboard_combinations_gen(plugboard_connection, all_available_plugs):
                 yield out_plug_board_connection
 
 
-# Generator to create n unique plug leads (pair of letter) from a list of available contacts in the plugboard
+# Generator to create n unique plug leads (pair of letter) from a list of available contacts in the plugboard.
+# The pairings are yielded in the order of itertools.combinations(itertools.combinations(plug_board_contacts, 2), n)
+# without its pairings which repeat a contact: the first contacts of the pairs are increasing and each pair is only
+# started if enough free contacts follow it, so no pairing is generated and then discarded.
 def full_pair_combination_gen(plug_board_contacts, n):
-    # generate all possible n pairs of letters
-    all_full_pair_comb = itertools.combinations(itertools.combinations(plug_board_contacts, 2), n)
-    # iterate over the possible combination and only yield the ones where no contacts are repeated.
-    for pair in all_full_pair_comb:
-        if len(set("".join([x + y for x, y in pair]))) == n * 2:
-            yield pair
+    contacts = list(plug_board_contacts)
+    used = [False] * len(contacts)
+    pairs = []
+
+    # Add the remaining pairs, whose first contacts come after index "start"
+    def add_pairs(start):
+        if len(pairs) == n:
+            yield tuple(pairs)
+            return
+        num_free = used[start:].count(False)
+        for i in range(start, len(contacts)):
+            if used[i]:
+                continue
+            # both contacts of every remaining pair must come after i
+            if num_free < 2 * (n - len(pairs)):
+                return
+            num_free -= 1
+            used[i] = True
+            for j in range(i + 1, len(contacts)):
+                if not used[j]:
+                    used[j] = True
+                    pairs.append((contacts[i], contacts[j]))
+                    yield from add_pairs(i + 1)
+                    pairs.pop()
+                    used[j] = False
+            used[i] = False
+    yield from add_pairs(0)
 
 
 # Generator which yields all possible reflector wiring combinations by swapping n pairs of contacts
 def reflector_wiring_comb_gen(std_wiring, n):
-    all_right_contacts = [x for (_, x) in std_wiring]
-    all_left_contacts = [y for (y, _) in std_wiring]
-    all_right_contacts_unique = []
-    all_left_contacts_unique = []
-    for idx, rc in enumerate(all_right_contacts):
-        lc = all_left_contacts[idx]
-        if lc in all_right_contacts_unique:
-            continue
-        # List that contains the reflector contacts which receive the input char
-        all_right_contacts_unique.append(rc)
-        # List that contains the respective contacts the input char is mapped to by the reflector
-        all_left_contacts_unique.append(lc)
-    # Generate all possible combination of right contact to swap
-    right_contact_to_swap_comb = itertools.combinations(all_right_contacts_unique, n)
+    # Only swap wires in pairs
+    if n % 2 == 1:
+        raise ValueError("Pairs of contacts to swap must be an even number")
+    # Generate all possible combination of right contact to swap, the right contact receives the input char
+    right_contact_to_swap_comb = itertools.combinations(search_space.reflector_wire_contacts(std_wiring), n)
     for right_contacts_list in right_contact_to_swap_comb:
-        # Only swap wires in pairs
-        if n % 2 == 1:
-            raise ValueError("Pairs of contacts to swap must be an even number")
-        right_contacts_pairs_comb = full_pair_combination_gen(right_contacts_list, n // 2)
-        for right_contact_pairs in right_contacts_pairs_comb:
-            # Pre create a copy of the input wiring which will be later on modified with the new contact pairs
-            new_wiring = std_wiring.copy()
-            new_left_contact_pairs = []
-            # Iterate over the possible right pairs
-            for a_right_contact_pair in right_contact_pairs:
-                # Find the correspondent left contact
-                this_wire_pair_left_contact = [y for (y, x) in std_wiring if x in a_right_contact_pair]
-                # Swap the left contacts
-                new_left_contact_pairs.append((this_wire_pair_left_contact[1], this_wire_pair_left_contact[0]))
-            # Merge the right contact pairs with the swapped left contact pairs
-            new_connections = list(zip(join_iterable_2_tuple(new_left_contact_pairs), join_iterable_2_tuple(right_contact_pairs)))
-            # Replace old connections with new ones in new_wiring
-            for conn in new_connections:
-                left_cont, right_cont = conn
-                idx = Rotor.char2num_static(right_cont)
-                assert (right_cont != new_wiring[idx][0])
-                new_wiring[idx] = conn
-                idx_complementary = Rotor.char2num_static(left_cont)
-                new_wiring[idx_complementary] = conn[1], conn[0]
-            # From the second call onwards return the modified wiring
-            yield new_wiring
-
-
-def join_iterable_2_tuple(iterable):
-    out = ()
-    for x, y in iterable:
-        out = out + (x,) + (y,)
-    return out
+        for right_contact_pairs in full_pair_combination_gen(right_contacts_list, n // 2):
+            yield search_space.swap_reflector_wiring(std_wiring, right_contact_pairs)
 
 
 # Helper function which prints the results
@@ -550,4 +1111,210 @@ def print_results(solution, t_elapsed, n):
 
 if __name__ == '__main__':
 
+    # Test that a search sharded over worker processes gives the same result as a single process
+    def sharded_search(num_workers):
+        cb = CodeBreaking()
+        cb.set_rotors([["Beta"], ["I"], ["III"]])
+        cb.set_ring_settings([[23], [2], [10]])
+        cb.set_reflectors(["B"])
+        cb.set_plugboard_connections(["VH", "PT", "ZG", "BJ", "EY", "FS"])
+        cb.num_workers = num_workers
+        return cb.break_code("CMFSUPKNCBMUYEQVVDYKLRQZTPUFHSWWAKTUGXMPAMYAFITXIJKMH", ["UNIVERSITY"])
+    assert (sharded_search(2) == sharded_search(1))
+    print("Sharded search test passed")
+
+    # The workers relay their progress while searching, a metrics object reused for another search starts from zero
+    snapshots = []
+    metrics = search_metrics.SearchMetrics(snapshots.append, progress_interval=0)
+    for _ in range(2):
+        cb = CodeBreaking()
+        cb.set_rotors([["Beta"], ["I"], ["III"]])
+        cb.set_ring_settings([[23], [2], [10]])
+        cb.set_reflectors(["B"])
+        cb.set_plugboard_connections(["VH", "PT", "ZG", "BJ", "EY", "FS"])
+        cb.num_workers = 2
+        cb.batch_size = 1024
+        cb.metrics = metrics
+        cb.break_code("CMFSUPKNCBMUYEQVVDYKLRQZTPUFHSWWAKTUGXMPAMYAFITXIJKMH", ["UNIVERSITY"])
+        assert (snapshots[-1]["progress"] == 1.0 and snapshots[-1]["counters"]["batches"] == 18)
+        # at least one progress report from the relayed measurements before the final one
+        assert (len(snapshots) >= 2)
+        snapshots.clear()
+    print("Sharded search metrics test passed")
+
+    # The results, and the keys ranking the equal ones, do not depend on the loop order of the search
+    loop_order_results = []
+    for loop_order in (("plugboard", "reflector", "rotors"), ("rotors", "reflector", "plugboard")):
+        cb = CodeBreaking()
+        cb.set_rotors([["II"], ["IV"], ["I", "V"]])
+        cb.set_ring_settings([[24], [12], [10]])
+        cb.set_rotor_positions([["S"], ["W"], ["U"]])
+        cb.set_plugboard_connections(["WP", "RJ", "A?", "VF", "I?", "HN", "CG", "BS"])
+        cb.set_reflectors(["A", "B"])
+        cb.loop_order = loop_order
+        cb.max_results = 50
+        cb.break_code("SDNTVTPHRBNWTLMZTQKZGADDQYPFNHBPNHCQGBGMZPZLUAVGDQVYRBFYYEIXQWVTHXGNW", [])
+        loop_order_results.append(cb.results.sorted())
+    assert (loop_order_results[0] == loop_order_results[1])
+    print("Loop order independence test passed")
+
+    # The pairings are the disjoint combinations of pairs, in the same order, and their number is exact
+    for num_contacts, n in [(0, 0), (5, 0), (6, 3), (7, 2), (9, 3), (4, 3)]:
+        expected_pairings = [pairing for pairing in itertools.combinations(itertools.combinations("ABCDEFGHI"[:num_contacts], 2), n)
+                             if len(set(itertools.chain(*pairing))) == 2 * n]
+        assert (list(full_pair_combination_gen("ABCDEFGHI"[:num_contacts], n)) == expected_pairings)
+        assert (search_space.full_pair_combination_num(num_contacts, n) == len(expected_pairings))
+    cb = CodeBreaking()
+    for connections in [["??", "??"], ["AB", "C?", "??", "?H"], ["A?", "B?", "C?"], ["??"] * 10]:
+        cb.set_plugboard_connections(connections)
+        if connections.count("??") < 10:
+            assert (cb.calc_plugboard_comb_num() == sum(1 for _ in plugboard_combinations_gen(connections, cb._CodeBreaking__available_plugs)))
+    assert (cb.calc_plugboard_comb_num() == 150738274937250)
+    print("Pairing enumeration test passed")
+
+    # The search space enumerates the plugboards and reflector wirings in the order of the generators
+    cb.set_plugboard_connections(["AB", "C?", "??", "?H"])
+    cb.allow_reflector_modifications = True
+    cb.reflector_pairs_to_swap = 4
+    cb.generate_combination()
+    space = cb.search_space
+    assert ([space.plugleads(idx) for idx in range(space.num_plugboards)] ==
+            list(plugboard_combinations_gen(["AB", "C?", "??", "?H"], cb._CodeBreaking__available_plugs)))
+    std_wiring = get_wiring_by_ReflectorType(reflectorType_from_name("B"))
+    assert ([space.reflector_wiring("B", space.reflector_swaps("B", idx)) for idx in range(space.num_reflector_wirings)] ==
+            list(reflector_wiring_comb_gen(std_wiring, 4)))
+    assert (cb.calculate_combinations_number() == space.num_keys == 210 * 26 ** 6 * 3 * 2145 * space.num_plugboards)
+    print("Search space test passed")
+
+    # Search with the given constraints (name of the set_ method -> value, e.g. "rotors") and CodeBreaking attributes
+    def configured_search(encoded_string, crib_list, constraints, **attributes):
+        cb = CodeBreaking()
+        for name, value in constraints.items():
+            getattr(cb, "set_" + name)(value)
+        for name, value in attributes.items():
+            setattr(cb, name, value)
+        cb.break_code(encoded_string, crib_list)
+        return cb
+
+    # Pruning the equivalent rotor positions/ring settings gives the same results
+    all_positions = [chr(x) for x in range(65, 91)]
+    pruned_results = [configured_search("DMEXBMKYCVPNQBEDHXVPZGKMTFFBJRPJTLHLCHOTKOYXGGHZ", ["SECRETS"],
+                                        {"rotors": [["Beta"], ["Gamma"], ["V"]],
+                                         "rotor_positions": [all_positions, all_positions, ["M"]],
+                                         "ring_settings": [list(range(1, 27)), [2], [14]],
+                                         "reflectors": ["C"], "plugboard_connections": ["KI", "NX", "FL"]},
+                                        prune_equivalent_keys=prune_equivalent_keys, max_results=50).results.sorted()
+                      for prune_equivalent_keys in (True, False)]
+    assert (pruned_results[0] == pruned_results[1] and len(pruned_results[0]) == 26)
+    print("Equivalent keys pruning test passed")
+
+    # Decoding the plugboard candidates with the cached scrambler tables gives the same results
+    cached_results = [configured_search("DMEXBMKYCVPNQBEDHXVPZGKMTFFBJRPJTLHLCHOTKOYXGGHZ", ["SECRETS"],
+                                        {"rotors": [["Beta"], ["Gamma"], ["V"]],
+                                         "rotor_positions": [all_positions, all_positions, ["M"]],
+                                         "ring_settings": [[4], [2], [14]],
+                                         "reflectors": ["C"], "plugboard_connections": ["KI", "N?", "FL"]},
+                                        scrambler_cache=cache, scrambler_table_min_plugboards=2).results.sorted()
+                      for cache in (scrambler_cache.ScramblerTableCache(), None)]
+    assert (cached_results[0] == cached_results[1] and cached_results[0][0][1].startswith("NICEWORK"))
+    # The tables are identified by their candidates: a search of other ring settings does not reuse them, the same
+    # search does
+    cache = scrambler_cache.ScramblerTableCache()
+    for ring_settings in ([[4], [2], [14]], [[5], [2], [14]], [[4], [2], [14]]):
+        misses = cache.misses
+        cb = configured_search("DMEXBMKYCVPNQBEDHXVPZGKMTFFBJRPJTLHLCHOTKOYXGGHZ", ["SECRETS"],
+                               {"rotors": [["Beta"], ["Gamma"], ["V"]],
+                                "rotor_positions": [all_positions, all_positions, ["M"]],
+                                "ring_settings": ring_settings,
+                                "reflectors": ["C"], "plugboard_connections": ["KI", "N?", "FL"]},
+                               scrambler_cache=cache, scrambler_table_min_plugboards=2)
+        assert (ring_settings != [[4], [2], [14]] or cb.results.sorted() == cached_results[1])
+    assert (cache.misses == misses and len(cache) == 2)
+    print("Scrambler table cache test passed")
+
+    # Workers decoding with the scrambler tables shared by the main process give the same results as a single process
+    worker_searches = [configured_search("CMFSUPKNCBMUYEQVVDYKLRQZTPUFHSWWAKTUGXMPAMYAFITXIJKMH", ["UNIVERSITY"],
+                                         {"rotors": [["Beta"], ["I"], ["III"]], "ring_settings": [[23], [2], [10]],
+                                          "reflectors": ["B"],
+                                          "plugboard_connections": ["VH", "PT", "ZG", "BJ", "EY", "FS"]},
+                                         num_workers=num_workers, metrics=search_metrics.SearchMetrics())
+                       for num_workers in (1, 2)]
+    worker_results = [cb.results.sorted() for cb in worker_searches]
+    assert (worker_results[0] == worker_results[1] and "UNIVERSITYOFBATH" in worker_results[0][0][1])
+    assert (worker_searches[1].metrics.counters["shared_table_units"] == 2 and worker_searches[1].state_tables is None)
+    print("Shared scrambler tables test passed")
+
+    # Test that an interrupted search resumed from its checkpoint gives the same result as an uninterrupted one
+    class InterruptedCodeBreaking(CodeBreaking):
+        def __init__(self, max_scored):
+            super().__init__()
+            self.max_scored = max_scored
+            self.num_scored = 0
+
+        def common_words_analysis(self, phrase):
+            self.num_scored += 1
+            if self.num_scored > self.max_scored:
+                raise KeyboardInterrupt
+            return super().common_words_analysis(phrase)
+
+    def reflector_search(max_scored):
+        cb = InterruptedCodeBreaking(max_scored)
+        cb.set_rotors([["V"], ["II"], ["IV"]])
+        cb.set_ring_settings([[6], [18], [7]])
+        cb.set_rotor_positions([["A"], ["J"], ["L"]])
+        cb.set_plugboard_connections(["UG", "IE", "PO", "NX", "WT"])
+        cb.allow_reflector_modifications = True
+        cb.reflector_pairs_to_swap = 2
+        cb.checkpoint_path = "code_breaking_test.checkpoint"
+        cb.checkpoint_interval = 0
+        cb.resume = True
+        cb.max_results = 10
+        cb.results_export_path = "code_breaking_test.jsonl"
+        return cb
+    cb = reflector_search(10 ** 9)
+    cb.checkpoint_path = None
+    cb.results_export_path = "code_breaking_test_expected.jsonl"
+    expected = cb.break_code("HWREISXLGTTBYVXRCWWJAKZDTVZWKBDJPVQYNEQIOTIFX", [])
+    expected_results = cb.results.sorted()
+    cb = reflector_search(100)
+    try:
+        cb.break_code("HWREISXLGTTBYVXRCWWJAKZDTVZWKBDJPVQYNEQIOTIFX", [])
+    except KeyboardInterrupt:
+        pass
+    cb = reflector_search(10 ** 9)
+    assert (cb.break_code("HWREISXLGTTBYVXRCWWJAKZDTVZWKBDJPVQYNEQIOTIFX", []) == expected)
+    # the candidates searched before the interruption are not searched again
+    assert (cb.num_scored == 3 * 78 - 100)
+    assert (not os.path.isfile("code_breaking_test.checkpoint"))
+    # the store only keeps the best results, every result is exported exactly once
+    assert (cb.results.sorted() == expected_results and len(expected_results) == 10)
+    with open("code_breaking_test.jsonl") as file, open("code_breaking_test_expected.jsonl") as expected_file:
+        exported = file.readlines()
+        assert (exported == expected_file.readlines() and len(exported) == 3 * 78)
+    os.remove("code_breaking_test.jsonl")
+    os.remove("code_breaking_test_expected.jsonl")
+    print("Checkpoint and result store test passed")
+
+    # Hill climbing recovers unknown plug leads and rotor positions
+    plaintext = ("THEENIGMAMACHINEISACIPHERDEVICEDEVELOPEDANDUSEDINTHEEARLYTOMIDTWENTIETHCENTURYTOPROTECTCOMMERCIAL"
+                 "DIPLOMATICANDMILITARYCOMMUNICATIONITWASEMPLOYEDEXTENSIVELYBYNAZIGERMANYDURINGWORLDWARIIINALL"
+                 "BRANCHESOFTHEGERMANMILITARYTHEENIGMAHASANELECTROMECHANICALROTORMECHANISMTHATSCRAMBLESTHELETTERS")
+    leads = ["AZ", "BY", "CX", "DW", "EV", "FU", "GT", "HS", "IR", "JQ"]
+    em = EnigmaMachine()
+    em.add_rotors(["II", "IV", "V"])
+    em.set_rotors_initial_pos(["B", "L", "A"])
+    em.set_rotors_ring_setting([2, 21, 12])
+    em.add_reflector("B")
+    em.add_plugleads(list(leads))
+    cb = CodeBreaking()
+    cb.set_rotors([["II"], ["IV"], ["V"]])
+    cb.set_rotor_positions([["B"], ["L"], [chr(x) for x in range(65, 65 + 26)]])
+    cb.set_ring_settings([[2], [21], [12]])
+    cb.set_reflectors(["B"])
+    cb.set_plugboard_connections(["AZ", "B?"] + ["??"] * 8)
+    found, decoded, score, settings = cb.break_code_hill_climbing(em.encode(plaintext), ["ENIGMA"])
+    assert (found and decoded == plaintext)
+    assert (settings[1] == ("B", "L", "A") and sorted(settings[3]) == sorted(leads))
+    print("Plugboard hill climbing test passed")
+
     CodeBreaking.all_codes()
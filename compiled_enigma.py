@@ -0,0 +1,387 @@
+import numpy as np
+import utility
+from rotorscase import stepping_trajectory, rotor_positions_at
+
+
+# Compiled version of an EnigmaMachine.
+# All components are turned into integer lookup arrays (A=0 ... Z=25) and every possible rotor state is turned into a
+# single 26 entries permutation table (plugboard -> rotors -> reflector -> rotors -> plugboard).
+# A whole message is then encoded with one array gather instead of walking each letter through the component objects.
+class CompiledEnigma:
+
+    def __init__(self, machine):
+        # check that all components of the enigma machine are properly set up
+        if not machine.check_machine_components():
+            raise ValueError("The Enigma Machine is not property set up. Check your inputs")
+        rotors = machine.rotorcase.rotors                                   # rotors from right to left
+        self.num_rotors = len(rotors)                                       # number of rotors
+        self.num_stepping_rotors = min(self.num_rotors, 3)                  # the fourth rotor never rotates
+        self.forward = np.array([rotor_wiring_array(r, 0) for r in rotors], dtype=np.uint8)   # right to left wiring
+        self.backward = np.array([rotor_wiring_array(r, 1) for r in rotors], dtype=np.uint8)  # left to right wiring
+        self.ring_settings = [r.ringSet for r in rotors]                    # rotors ring settings (0 - 25)
+        self.notches = [r.num_Notch for r in rotors]                        # rotors notch positions
+        self.default_positions = [r.default_pos for r in rotors]            # rotors initial positions
+        self.positions = [r.pos for r in rotors]                            # rotors current positions
+        self.reflector = reflector_array(machine.reflector)                 # reflector mapping
+        self.plugboard = plugboard_array(machine.plugboard)                 # plugboard mapping
+        self.tables = self.__build_state_tables()                           # one permutation table per rotor state
+
+    # Encode a message, the rotors state is carried over from one call to the next exactly as in EnigmaMachine.encode
+    def encode(self, message_in):
+        message_in = utility.check_input_message_formatting(message_in, "Input Message")
+        return array2message(self.encode_letters(message2array(message_in)))
+
+    # Encode an array of integers (A=0 ... Z=25), the rotors state is carried over as in encode.
+    # The encoded letters are written into "out" (uint8 array of the same length) if given.
+    # Long inputs are encoded with the tables of the rotors stepping cycle (see stepping_cycle), one period at the time.
+    def encode_letters(self, letters, out=None):
+        if out is None:
+            out = np.empty(len(letters), dtype=np.uint8)
+        if len(letters) == 0:
+            return out
+        if len(letters) < 2 * 26 ** self.num_stepping_rotors:
+            trajectory = stepping_trajectory(self.positions, self.notches, len(letters))
+            # the last visited state is where the next message starts from
+            self.positions = [int(x) for x in trajectory[-1]]
+            out[:] = self.tables[self.state_ids(trajectory), letters]
+            return out
+        head_ids, cycle_ids = self.stepping_cycle()
+        out[:len(head_ids)] = self.tables[head_ids, letters[:len(head_ids)]]
+        # row k of the cycle table encodes the letters k, k + period, k + 2 * period, ... after the head
+        cycle_table = self.tables[cycle_ids].ravel()
+        period = len(cycle_ids)
+        row_offsets = np.arange(period, dtype=np.int32) * 26
+        rows_per_block = max(1, (1 << 22) // period)
+        body_letters, body_out = letters[len(head_ids):], out[len(head_ids):]
+        for start in range(0, len(body_letters), rows_per_block * period):
+            block = body_letters[start: start + rows_per_block * period]
+            num_rows = len(block) // period
+            full = num_rows * period
+            indexes = (block[:full].reshape(num_rows, period) + row_offsets).ravel()
+            np.take(cycle_table, indexes, out=body_out[start: start + full])
+            # last incomplete period
+            tail = block[full:]
+            np.take(cycle_table, row_offsets[:len(tail)] + tail, out=body_out[start + full: start + len(block)])
+        self.positions = [int(x) for x in rotor_positions_at(self.positions, self.notches, len(letters))]
+        return out
+
+    # The rotors stepping is a deterministic function of the rotors state, so after a short head the states repeat
+    # with a fixed period (26 * 25 * 26 key strokes for three rotors with one notch each).
+    # Returns (state ids of the head, state ids of one period) for the key strokes from the current positions
+    def stepping_cycle(self):
+        head_length = 2
+        trajectory = stepping_trajectory(self.positions, self.notches, head_length + 26 ** self.num_stepping_rotors + 1)
+        ids = self.state_ids(trajectory)
+        period = int(np.flatnonzero(ids[head_length + 1:] == ids[head_length])[0]) + 1
+        return ids[:head_length], ids[head_length: head_length + period]
+
+    # Reset the current rotors positions to the initial default values
+    def reset_default_rotor_position(self):
+        self.positions = list(self.default_positions)
+
+    # Move the rotors to their state after "offset" key strokes from the default initial positions
+    def seek(self, offset):
+        self.positions = rotor_positions_at(self.default_positions, self.notches, offset)
+
+    # Map an array of rotor positions (n x num_rotors) to the index of their permutation table
+    def state_ids(self, positions):
+        positions = np.asarray(positions, dtype=np.intp)[:, :self.num_stepping_rotors]
+        return positions @ (26 ** np.arange(self.num_stepping_rotors))
+
+    # Build the permutation table of all the 26^3 states the stepping rotors can be in.
+    def __build_state_tables(self):
+        num_states = 26 ** self.num_stepping_rotors
+        states = np.arange(num_states)
+        positions = np.empty((num_states, self.num_rotors), dtype=np.intp)
+        for idx in range(self.num_rotors):
+            if idx < self.num_stepping_rotors:
+                positions[:, idx] = (states // 26 ** idx) % 26
+            else:
+                positions[:, idx] = self.positions[idx]
+        offsets = positions - np.array(self.ring_settings, dtype=np.intp)
+        return scrambler_tables(self.forward, self.backward, self.reflector, self.plugboard, offsets)
+
+
+# Compute the permutation tables of a plugboard/rotors/reflector stack for many rotors states at once.
+# forward, backward = rotor wirings (num_rotors x 26) ordered from the rightmost rotor to the leftmost one
+# offsets = array (n x num_rotors) of rotor position minus ring setting for each state
+# Returns an array (n x 26) where row i maps each input letter to its encoded letter in the i-th state
+def scrambler_tables(forward, backward, reflector, plugboard, offsets):
+    contacts = np.broadcast_to(plugboard.astype(np.intp), (len(offsets), 26))
+    return plugboard[scramble(forward, backward, reflector, offsets, contacts)]
+
+
+# Pass contacts through the rotors, the reflector and back through the rotors (plugboard excluded).
+# contacts = array (n) or (n x m) of input contacts, row i is encoded with the rotors offsets of row i of offsets
+# state_tables = optional scrambler tables of every rotor state of these rotors and reflector (see
+# state_scrambler_tables), which replace the pass through the wirings by a single lookup
+def scramble(forward, backward, reflector, offsets, contacts, state_tables=None):
+    offsets = np.asarray(offsets, dtype=np.intp) % 26
+    contacts = np.asarray(contacts, dtype=np.intp)
+    shape = (-1,) + (1,) * (contacts.ndim - 1)
+    if state_tables is not None:
+        return state_tables[state_index(offsets).reshape(shape), contacts]
+    # Wirings repeated twice so that they can be indexed by contact + offset (0 - 50) without a modulo, and lookup
+    # table of x % 26 for x between -26 and 51 (shifted by 26)
+    forward = np.concatenate([forward, forward], axis=1)
+    backward = np.concatenate([backward, backward], axis=1)
+    mod26 = np.arange(78, dtype=np.intp) % 26
+    # right to left through the rotors
+    for idx in range(forward.shape[0]):
+        offset = offsets[:, idx].reshape(shape)
+        contacts = mod26[forward[idx][contacts + offset] + (26 - offset)]
+    contacts = reflector[contacts]
+    # left to right through the rotors
+    for idx in reversed(range(backward.shape[0])):
+        offset = offsets[:, idx].reshape(shape)
+        contacts = mod26[backward[idx][contacts + offset] + (26 - offset)]
+    return contacts
+
+
+# Scrambler permutation (rotors and reflector, plugboard excluded) of every rotor state, i.e. of every combination of
+# rotor offsets (position - ring setting), so that one table serves all the rotor positions and ring settings.
+# The tables are computed by blocks of 26^3 states into "out" if given.
+# Returns an array (26^num_rotors x 26) whose row state_index(offsets) is the permutation of a rotor state
+def state_scrambler_tables(forward, backward, reflector, out=None):
+    num_states = 26 ** forward.shape[0]
+    if out is None:
+        out = np.empty((num_states, 26), dtype=np.uint8)
+    contacts = np.broadcast_to(np.arange(26, dtype=np.intp), (min(num_states, 26 ** 3), 26))
+    for start in range(0, num_states, 26 ** 3):
+        states = np.arange(start, min(start + 26 ** 3, num_states))
+        offsets = np.column_stack(np.unravel_index(states, (26,) * forward.shape[0])[::-1])
+        out[states] = scramble(forward, backward, reflector, offsets, contacts[:len(states)])
+    return out
+
+
+# Row of state_scrambler_tables of each rotor state.
+# offsets = array (n x num_rotors) of rotor position minus ring setting ordered from the rightmost rotor
+def state_index(offsets):
+    offsets = np.asarray(offsets, dtype=np.intp) % 26
+    return offsets @ (26 ** np.arange(offsets.shape[1], dtype=np.intp))
+
+
+# Encode many messages at once. All messages share the same rotors and reflector but each one of them has its own
+# initial positions, ring settings and plugboard.
+# positions, ring_settings = arrays (num_messages x num_rotors) ordered from the rightmost rotor (ring settings 0 - 25)
+# plugboards = array (num_messages x 26) with the plugboard mapping of each message
+def encode_messages(forward, backward, reflector, notches, positions, ring_settings, plugboards, messages):
+    lengths = np.array([len(message) for message in messages], dtype=np.intp)
+    if lengths.sum() == 0:
+        return ["" for _ in messages]
+    letters = message2array("".join(messages))
+    # index of the message each letter belongs to and number of key strokes since the beginning of that message
+    message_ids = np.repeat(np.arange(len(messages)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    key_strokes = np.arange(len(letters)) - starts[message_ids] + 1
+    positions = np.asarray(positions, dtype=np.intp)[message_ids]
+    trajectory = rotor_positions_at([positions[:, idx] for idx in range(positions.shape[1])], notches, key_strokes)
+    offsets = np.column_stack(np.broadcast_arrays(*trajectory)) - np.asarray(ring_settings, dtype=np.intp)[message_ids]
+    plugboards = np.asarray(plugboards, dtype=np.uint8)
+    contacts = scramble(forward, backward, reflector, offsets, plugboards[message_ids, letters])
+    message_out = array2message(plugboards[message_ids, contacts])
+    return [message_out[start: start + length] for start, length in zip(starts, lengths)]
+
+
+# Decode the same message with many rotors positions and ring settings at once (rotors, reflector and plugboard shared).
+# positions, ring_settings = arrays (num_candidates x num_rotors) ordered from the rightmost rotor (ring settings 0 - 25)
+# letters = array of integers (A=0 ... Z=25) of the message
+# columns = optional array of indexes of the letters to decode, by default the whole message is decoded
+# state_tables = optional scrambler tables of the rotor states (see scramble)
+# Returns an array (num_candidates x len(columns)), row i is the message encoded with the settings of candidate i
+def decode_candidates(forward, backward, reflector, notches, plugboard, positions, ring_settings, letters, columns=None,
+                      state_tables=None):
+    positions = np.asarray(positions, dtype=np.intp)
+    num_candidates = positions.shape[0]
+    if columns is None:
+        columns = np.arange(len(letters), dtype=np.intp)
+    rows = np.repeat(np.arange(num_candidates), len(columns))
+    decoded = decode_letters(forward, backward, reflector, notches, plugboard, positions[rows],
+                             np.asarray(ring_settings, dtype=np.intp)[rows], letters, np.tile(columns, num_candidates),
+                             state_tables)
+    return decoded.reshape(num_candidates, len(columns))
+
+
+# Decode one letter of a message for each candidate setting.
+# positions, ring_settings = arrays (n x num_rotors) ordered from the rightmost rotor (ring settings 0 - 25)
+# letters = array of integers (A=0 ... Z=25) of the message, columns = array (n) with the letter index of each candidate
+# state_tables = optional scrambler tables of the rotor states (see scramble)
+# Returns an array (n) with the decoded letters
+def decode_letters(forward, backward, reflector, notches, plugboard, positions, ring_settings, letters, columns,
+                   state_tables=None):
+    positions = np.asarray(positions, dtype=np.intp)
+    columns = np.asarray(columns, dtype=np.intp)
+    if len(columns) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    trajectory = rotor_positions_at([positions[:, idx] for idx in range(positions.shape[1])], notches, columns + 1)
+    offsets = np.column_stack(np.broadcast_arrays(*trajectory)) - ring_settings
+    contacts = scramble(forward, backward, reflector, offsets, plugboard[letters[columns]], state_tables)
+    return plugboard[contacts]
+
+
+# Scrambler tables (rotors and reflector, plugboard excluded) of many rotors positions and ring settings candidates at
+# each key stroke of a message of "length" letters.
+# positions, ring_settings = arrays (num_candidates x num_rotors) ordered from the rightmost rotor (ring settings 0 - 25)
+# state_tables = optional scrambler tables of the rotor states (see scramble)
+# Returns an array (num_candidates x length x 26), see decode_with_tables
+def candidate_scrambler_tables(forward, backward, reflector, notches, positions, ring_settings, length,
+                               state_tables=None):
+    positions = np.asarray(positions, dtype=np.intp)
+    key_strokes = np.arange(1, length + 1, dtype=np.intp).reshape(1, -1)
+    trajectory = rotor_positions_at([positions[:, idx].reshape(-1, 1) for idx in range(positions.shape[1])], notches,
+                                    key_strokes)
+    offsets = np.stack(np.broadcast_arrays(*trajectory), axis=2) - np.asarray(ring_settings, dtype=np.intp)[:, None, :]
+    contacts = np.broadcast_to(np.arange(26, dtype=np.intp), (positions.shape[0] * length, 26))
+    tables = scramble(forward, backward, reflector, offsets.reshape(-1, positions.shape[1]), contacts, state_tables)
+    return tables.astype(np.uint8).reshape(positions.shape[0], length, 26)
+
+
+# Decode a message with the scrambler tables of many candidates (see candidate_scrambler_tables) and a plugboard, which
+# conjugates each scrambler permutation: the letter c at key stroke t is decoded as plugboard[tables[t, plugboard[c]]].
+# rows, columns = optional arrays (n) of (candidate, letter index) pairs to decode, by default the whole message is
+# decoded for every candidate. Returns an array (num_candidates x length), or (n) if rows and columns are given
+def decode_with_tables(tables, plugboard, letters, rows=None, columns=None):
+    if rows is None:
+        columns = np.arange(len(letters), dtype=np.intp)
+        return plugboard[tables[:, columns, plugboard[letters]]]
+    columns = np.asarray(columns, dtype=np.intp)
+    return plugboard[tables[rows, columns, plugboard[letters[columns]]]]
+
+
+# Integer wiring of a rotor: direction 0 = right to left, direction 1 = left to right
+def rotor_wiring_array(rotor, direction):
+    return list(rotor.backward if direction else rotor.forward)
+
+
+# Integer mapping of a reflector
+def reflector_array(reflector):
+    return np.array(reflector.mapping, dtype=np.uint8)
+
+
+# Integer mapping of a plugboard
+def plugboard_array(plugboard):
+    return np.array(plugboard.mapping, dtype=np.uint8)
+
+
+# Format a message as utility.check_input_message_formatting does (UPPERCASE, letters A - Z only) straight into an
+# array of integers (A=0 ... Z=25). Returns (array, True if the message has been modified by the formatting)
+def format_message_array(message):
+    upper_message = message.upper()
+    chars = np.frombuffer(upper_message.encode("ascii", "ignore"), dtype=np.uint8)
+    letters = chars[(chars >= 65) & (chars <= 90)] - 65
+    return letters, len(letters) != len(message) or upper_message != message
+
+
+# Convert an UPPERCASE string into an array of integers (A=0 ... Z=25)
+def message2array(message):
+    return np.frombuffer(message.encode("ascii"), dtype=np.uint8) - 65
+
+
+# Convert an array of integers (A=0 ... Z=25) into an UPPERCASE string
+def array2message(array):
+    return (np.asarray(array, dtype=np.uint8) + 65).tobytes().decode("ascii")
+
+
+# Map chars A - Z to ints 0 - 25
+def char2num(char):
+    return ord(char) - 65
+
+
+# Map ints 0 - 25 to chars A - Z
+def num2char(num):
+    return chr(num + 65)
+
+
+if __name__ == '__main__':
+    from enigma import EnigmaMachine
+    import random
+
+    # Test that the compiled machine and the object path produce identical outputs
+    random.seed(0)
+    rotor_sets = [["I", "II", "III"], ["IV", "V", "Beta"], ["I", "II", "III", "IV"], ["IV", "V", "Beta", "I"],
+                  ["II", "IV", "V"], ["Gamma", "III", "I", "V"]]
+    for rotor_names in rotor_sets:
+        for _ in range(5):
+            settings = [[chr(65 + random.randint(0, 25)) for _ in rotor_names],
+                        [random.randint(1, 26) for _ in rotor_names]]
+            message = "".join(chr(65 + random.randint(0, 25)) for _ in range(2000))
+            machines = []
+            for _ in range(2):
+                em = EnigmaMachine()
+                em.add_rotors(list(rotor_names))
+                em.set_rotors_initial_pos(list(settings[0]))
+                em.set_rotors_ring_setting(list(settings[1]))
+                em.add_reflector(random.choice(["A", "B", "C"]) if not machines else machines[0].reflector.eType.name)
+                em.add_plugleads(["HL", "MO", "AJ", "CX", "BZ", "SR", "NI", "YW", "DG", "PK"])
+                machines.append(em)
+            compiled = machines[1].compile()
+            # encode in two calls to check that the rotors state is carried over
+            assert (compiled.encode(message[:777]) + compiled.encode(message[777:]) == machines[0].encode(message))
+            compiled.reset_default_rotor_position()
+            machines[0].reset_default_rotor_position()
+            encoded = machines[0].encode(message)
+            assert (compiled.encode(message) == encoded)
+            # decrypt a slice of the message without replaying what comes before it
+            compiled.seek(1234)
+            assert (compiled.encode(message[1234:1300]) == encoded[1234:1300])
+            machines[0].seek(1234)
+            assert (machines[0].encode(message[1234:1300]) == encoded[1234:1300])
+
+    # Test the stepping cycle encoding of long messages against the stepping trajectory
+    for rotor_names in rotor_sets[:4]:
+        em = EnigmaMachine()
+        em.add_rotors(list(rotor_names))
+        em.set_rotors_initial_pos(["A", "D", "U", "Q"][:len(rotor_names)])
+        em.set_rotors_ring_setting([3, 7, 11, 2][:len(rotor_names)])
+        em.add_reflector("B")
+        compiled = em.compile()
+        letters = np.random.default_rng(0).integers(0, 26, 100003).astype(np.uint8)
+        encoded = compiled.encode_letters(letters)
+        trajectory = stepping_trajectory(compiled.default_positions, compiled.notches, len(letters))
+        assert ((encoded == compiled.tables[compiled.state_ids(trajectory), letters]).all())
+        assert (compiled.positions == [int(x) for x in trajectory[-1]])
+
+    # Test the message formatting against utility.check_input_message_formatting
+    for message in ["HELLO", "Hello World!", "straße 9", "ÉCOLE", ""]:
+        letters, modified = format_message_array(message)
+        formatted = utility.check_input_message_formatting(message, "Input Message")
+        assert (array2message(letters) == formatted and modified == (formatted != message))
+
+    # Test the batch encoding against one machine per message
+    messages, settings, expected = [], [], []
+    for _ in range(300):
+        rotor_names = random.choice(rotor_sets)
+        setting = {"rotors": list(rotor_names),
+                   "positions": [chr(65 + random.randint(0, 25)) for _ in rotor_names],
+                   "ring_settings": [random.randint(1, 26) for _ in rotor_names],
+                   "reflector": random.choice(["A", "B", "C"]),
+                   "plugleads": random.choice([[], ["HL", "MO", "AJ"], ["PC", "XZ", "FM", "QA", "ST", "NB"]])}
+        message = "".join(chr(65 + random.randint(0, 25)) for _ in range(random.randint(0, 800)))
+        em = EnigmaMachine()
+        em.add_rotors(list(setting["rotors"]))
+        em.set_rotors_initial_pos(list(setting["positions"]))
+        em.set_rotors_ring_setting(list(setting["ring_settings"]))
+        em.add_reflector(setting["reflector"])
+        em.add_plugleads(list(setting["plugleads"]))
+        messages.append(message)
+        settings.append(setting)
+        expected.append(em.encode(message))
+    assert (EnigmaMachine.encode_batch(messages, settings) == expected)
+
+    # Test the scrambler tables of the rotor states against the pass through the wirings
+    for rotor_names in [["I", "II", "III"], ["Beta", "IV", "V", "I"]]:
+        em = EnigmaMachine()
+        em.configure({"rotors": rotor_names, "reflector": "C", "plugleads": ["HL", "MO", "AJ"]})
+        rotors_list = em.rotorcase.rotors
+        forward = np.array([rotor_wiring_array(r, 0) for r in rotors_list], dtype=np.uint8)
+        backward = np.array([rotor_wiring_array(r, 1) for r in rotors_list], dtype=np.uint8)
+        reflector, plugboard = reflector_array(em.reflector), plugboard_array(em.plugboard)
+        state_tables = state_scrambler_tables(forward, backward, reflector)
+        positions = np.array([[random.randint(0, 25) for _ in rotor_names] for _ in range(200)])
+        ring_settings = np.array([[random.randint(0, 25) for _ in rotor_names] for _ in range(200)])
+        letters = message2array("".join(chr(65 + random.randint(0, 25)) for _ in range(100)))
+        assert ((decode_candidates(forward, backward, reflector, em.rotorcase.notches(), plugboard, positions,
+                                   ring_settings, letters, state_tables=state_tables) ==
+                 decode_candidates(forward, backward, reflector, em.rotorcase.notches(), plugboard, positions,
+                                   ring_settings, letters)).all())
+    print("Compiled Enigma Machine tests passed")
@@ -4,9 +4,8 @@ from rotorscase import *
 from reflector import *
 import utility
 import time
-import random
-import matplotlib.pyplot as plt
-import numpy as np
+# numpy, matplotlib and compiled_enigma (which needs numpy) are only imported by the methods which use them, so that
+# plain encoding starts fast (see enigma_cli.py)
 
 
 class EnigmaMachine:
@@ -59,6 +58,11 @@ class EnigmaMachine:
     def reset_default_rotor_position(self):
         self.rotorcase.reset_to_default_position()
 
+    # Move the rotors to the state they reach after "offset" characters have been encoded from the default initial
+    # positions, e.g. to decode a slice of a long message or to resume from a given character.
+    def seek(self, offset):
+        self.rotorcase.seek(offset)
+
     def add_reflector(self, name):
         if self.reflector is not None:
             raise ValueError(f"One reflector has already been added, to swap reflector use: replace_reflector(name) instead")
@@ -72,22 +76,117 @@ class EnigmaMachine:
         # check that all components of the enigma machine are properly set up
         if not self.check_machine_components():
             raise ValueError("The Enigma Machine is not property set up. Check your inputs")
-        # Check the formatting of the input message
+        # Check the formatting of the input message, once for the whole message: the components are then walked with
+        # integer contacts (A=0 ... Z=25) without any further validation
         message_in = utility.check_input_message_formatting(message_in, "Input Message")
-        message_out = ""
+        plugboard = self.plugboard.mapping
+        reflector = self.reflector.mapping
+        message_out = []
         # iteratively loop over the input message and encode one letter at the time
         for char_in in message_in:
             # rotate the rotors first
             self.rotorcase.rotate()
             # encode the input char
-            char_out = self.plugboard.encode(char_in)
-            char_out = self.rotorcase.encode_right_to_left(char_out)
-            char_out = self.reflector.encode(char_out)
-            char_out = self.rotorcase.encode_left_to_right(char_out)
-            char_out = self.plugboard.encode(char_out)
+            num_out = plugboard[ord(char_in) - 65]
+            num_out = self.rotorcase.encode_right_to_left_num(num_out)
+            num_out = reflector[num_out]
+            num_out = self.rotorcase.encode_left_to_right_num(num_out)
             # append the encoded char to the end of the output string
-            message_out += char_out
-        return message_out
+            message_out.append(chr(plugboard[num_out] + 65))
+        return "".join(message_out)
+
+    # Encode a stream of text chunks (any iterable of strings, e.g. a file opened in text mode) and yield one encoded
+    # chunk per input chunk. The rotors state is carried over from one chunk to the next, so the concatenated output is
+    # identical to encoding the concatenated input with encode, and only one chunk at the time is held in memory.
+    # Chunks are formatted as in encode; the formatting warning is only raised once per stream.
+    # The rotors of this machine are kept in step with the stream after each chunk.
+    def encode_stream(self, chunks):
+        # check that all components of the enigma machine are properly set up
+        if not self.check_machine_components():
+            raise ValueError("The Enigma Machine is not property set up. Check your inputs")
+        import compiled_enigma
+        compiled = self.compile()
+        warned = False
+        for chunk in chunks:
+            if type(chunk) is not str:
+                raise TypeError("Input Message chunks must be strings")
+            letters, modified = compiled_enigma.format_message_array(chunk)
+            if modified and not warned:
+                warned = True
+                utility.check_input_message_formatting(chunk, "Input Message")
+            chunk_out = compiled_enigma.array2message(compiled.encode_letters(letters))
+            for this_rotor, pos in zip(self.rotorcase.rotors, compiled.positions):
+                this_rotor.pos = pos
+            yield chunk_out
+
+    # Turn the current machine configuration into a CompiledEnigma which encodes whole messages with integer
+    # permutation tables. The compiled machine starts from the current rotor positions and keeps its own state.
+    def compile(self):
+        from compiled_enigma import CompiledEnigma
+        return CompiledEnigma(self)
+
+    # Encode many messages, each one with its own settings, e.g.
+    # settings = [{"rotors": ["I", "II", "III"], "positions": ["A", "A", "Z"], "ring_settings": [1, 1, 1],
+    #              "reflector": "B", "plugleads": ["HL", "MO"]}, ....]
+    # Messages sharing rotors and reflector are encoded together with array operations.
+    # Each message is encoded from its initial positions; the encoded messages are returned in input order.
+    @staticmethod
+    def encode_batch(messages, settings):
+        if type(messages) != list or type(settings) != list:
+            raise TypeError("Messages and settings must be specified as lists")
+        if len(messages) != len(settings):
+            raise ValueError("The number of settings must match the number of messages")
+        import numpy as np
+        import compiled_enigma
+        messages = [utility.check_input_message_formatting(message, "Input Message") for message in messages]
+        # group the messages by rotors and reflector
+        groups = {}
+        for idx, setting in enumerate(settings):
+            groups.setdefault((tuple(setting["rotors"]), setting["reflector"]), []).append(idx)
+        messages_out = [""] * len(messages)
+        for (rotors, reflector), indexes in groups.items():
+            # the machine is only used to validate and convert the settings of each message of the group
+            em = EnigmaMachine()
+            em.configure({"rotors": rotors, "reflector": reflector})
+            positions, ring_settings, plugboards = [], [], []
+            for idx in indexes:
+                em.configure({"positions": settings[idx]["positions"], "ring_settings": settings[idx]["ring_settings"],
+                              "plugleads": settings[idx].get("plugleads", [])})
+                positions.append(em.rotorcase.default_positions())
+                ring_settings.append([this_rotor.ringSet for this_rotor in em.rotorcase.rotors])
+                plugboards.append(compiled_enigma.plugboard_array(em.plugboard))
+            rotors_list = em.rotorcase.rotors
+            group_out = compiled_enigma.encode_messages(
+                np.array([compiled_enigma.rotor_wiring_array(r, 0) for r in rotors_list], dtype=np.uint8),
+                np.array([compiled_enigma.rotor_wiring_array(r, 1) for r in rotors_list], dtype=np.uint8),
+                compiled_enigma.reflector_array(em.reflector), em.rotorcase.notches(),
+                positions, ring_settings, plugboards, [messages[idx] for idx in indexes])
+            for idx, message_out in zip(indexes, group_out):
+                messages_out[idx] = message_out
+        return messages_out
+
+    # Configure the machine in place from a settings dictionary in the same format as encode_batch, e.g.
+    # {"rotors": ["I", "II", "III"], "positions": ["A", "A", "Z"], "ring_settings": [1, 1, 1], "reflector": "B",
+    #  "plugleads": ["HL", "MO"]}
+    # Only the given settings are changed. Rotors and reflector are switched to the new types in place, with the wirings
+    # taken from the precompiled registries, and the lists in settings are never modified.
+    def configure(self, settings):
+        if type(settings) is not dict:
+            raise TypeError("Settings must be a dictionary with rotors, positions, ring_settings, reflector and/or plugleads")
+        if "rotors" in settings:
+            self.rotorcase.configure_rotors(settings["rotors"])
+        if "positions" in settings:
+            self.rotorcase.configure_positions(settings["positions"])
+        if "ring_settings" in settings:
+            self.rotorcase.configure_ring_settings(settings["ring_settings"])
+        if "reflector" in settings:
+            if self.reflector is None:
+                self.reflector = reflector_from_name(settings["reflector"])
+            else:
+                self.reflector.set_type(settings["reflector"])
+        if "plugleads" in settings:
+            self.remove_plugleads()
+            self.add_plugleads(list(settings["plugleads"]))
 
     def check_machine_components(self):
         # there must be one reflector
@@ -102,8 +201,14 @@ class EnigmaMachine:
 
     # Method to plot Enigma machine time complexity from input size varying from  1 to "n" with step size "step"
     # To average the measurements noise, each  measurement  is taken "rep" time for a single string of lenght x.
+    # The input strings are seeded so that plots can be compared. For headless, repeatable measurements with JSON
+    # output and regression checks use benchmark.py instead.
     @staticmethod
-    def time_complexity(n, step, rep):
+    def time_complexity(n, step, rep, seed=0):
+        import random
+        import matplotlib.pyplot as plt
+        import numpy as np
+        rng = random.Random(seed)
         em = EnigmaMachine()
         em.add_rotors(["I", "II", "III", "IV"])
         em.set_rotors_initial_pos(["A", "A", "Z", "A"])
@@ -113,13 +218,13 @@ class EnigmaMachine:
         nchar_arr = np.zeros(n // step)
         time_arr = np.zeros(n // step)
         for i in range(0, n//step, 1):
-            string = string + "".join([Rotor.num2Char_static(random.randint(0, 25)) for _ in range(step)])
+            string = string + "".join([Rotor.num2Char_static(rng.randint(0, 25)) for _ in range(step)])
             t_tot = 0
             for _ in range(rep):
                 em.reset_default_rotor_position()
-                t_start = time.time()
+                t_start = time.perf_counter()
                 _ = em.encode(string)
-                t_elapsed = time.time() - t_start
+                t_elapsed = time.perf_counter() - t_start
                 t_tot = t_tot + t_elapsed
             t_avg = t_tot / rep
             time_arr[i] = round(t_avg * 10**3, 3)  # time in ms
@@ -199,4 +304,41 @@ if __name__ == '__main__':
     encoded_string = em6.encode("BUPXWJCDPFASXBDHLBBIBSRNWCSZXQOLBNXYAXVHOGCUUIBCVMPUZYUUKHI")
     print(f"The encoded message is {encoded_string}")
 
+    # Test that encoding a stream of chunks matches encoding the whole message at once
+    message = "The Enigma machine is a cipher device, developed and used in the early- to mid-20th century. " * 50
+    em7 = EnigmaMachine()
+    em7.add_rotors(["IV", "V", "Beta", "I"])
+    em7.set_rotors_initial_pos(["E", "Z", "G", "P"])
+    em7.set_rotors_ring_setting([18, 24, 3, 5])
+    em7.add_reflector("A")
+    em7.add_plugleads(["PC", "XZ", "FM", "QA", "ST", "NB", "HY", "OR", "EV", "IU"])
+    chunks = [message[idx: idx + 97] for idx in range(0, len(message), 97)] + [""]
+    encoded_chunks = list(em7.encode_stream(iter(chunks)))
+    assert (len(encoded_chunks) == len(chunks))
+    # the machine continues from where the stream stopped
+    encoded_string = "".join(encoded_chunks) + em7.encode("HELLO")
+    em7.reset_default_rotor_position()
+    assert (em7.encode(message + "HELLO") == encoded_string)
+    print("Stream encoding test passed")
+
+    # Test the in place reconfiguration against a newly built machine
+    em8 = EnigmaMachine()
+    settings = {"rotors": ["IV", "V", "Beta", "I"], "positions": ["E", "Z", "G", "P"], "ring_settings": [18, 24, 3, 5],
+                "reflector": "A", "plugleads": ["PC", "XZ", "FM", "QA", "ST", "NB", "HY", "OR", "EV", "IU"]}
+    em8.configure(settings)
+    assert (settings["rotors"] == ["IV", "V", "Beta", "I"] and settings["positions"] == ["E", "Z", "G", "P"])
+    assert (em8.encode("BUPXWJCDPFASXBDHLBBIBSRNWCSZXQOLBNXYAXVHOGCUUIBCVMPUZYUUKHI") ==
+            "CONGRATULATIONSONPRODUCINGYOURWORKINGENIGMAMACHINESIMULATOR")
+    rotors = list(em8.rotorcase.rotors)
+    em8.configure({"rotors": ("I", "II", "III", "Gamma"), "positions": ["Q", "E", "V", "Z"],
+                   "ring_settings": [7, 11, 15, 19], "reflector": "C", "plugleads": []})
+    assert (all(r1 is r2 for r1, r2 in zip(rotors, em8.rotorcase.rotors)))
+    em9 = EnigmaMachine()
+    em9.add_rotors(["I", "II", "III", "Gamma"])
+    em9.set_rotors_initial_pos(["Q", "E", "V", "Z"])
+    em9.set_rotors_ring_setting([7, 11, 15, 19])
+    em9.add_reflector("C")
+    assert (em8.encode("HELLOWORLD" * 100) == em9.encode("HELLOWORLD" * 100))
+    print("Configure test passed")
+
     # EnigmaMachine.time_complexity(2000,10,20)
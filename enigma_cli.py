@@ -0,0 +1,130 @@
+import argparse
+import sys
+import time
+import utility
+from enigma import EnigmaMachine
+
+# Command line entry point to encode, decode and break Enigma messages, e.g.
+#   python enigma_cli.py encode --rotors I II III --positions A A Z --rings 1 1 1 --reflector B --plugleads "HL MO" HELLO
+#   python enigma_cli.py break DMEXBMKYCVPNQBEDHXVPZGKMTFFBJRPJTLHLCHOTKOYXGGHZ --crib SECRETS --rotors Beta Gamma V \
+#       --positions M J M --rings 4 2 14 --plugleads "KI NX FL"
+# Only the pure Python machine is imported at start up: encoding a message does not load numpy or matplotlib, and the
+# code breaking modules (numpy, word list, scorers) are only imported by the break command.
+
+
+# Settings dictionary (see EnigmaMachine.configure) from the --settings JSON, overridden by the single options
+def settings_from_args(args):
+    settings = utility.load_settings(args.settings) if args.settings else {}
+    for key, value in [("rotors", args.rotors), ("positions", args.positions), ("ring_settings", args.rings),
+                       ("reflector", args.reflector), ("plugleads", args.plugleads)]:
+        if value is not None:
+            settings[key] = value
+    for key in ["rotors", "positions", "ring_settings", "reflector"]:
+        if key not in settings:
+            raise ValueError(f"Settings {key} is missing")
+    return settings
+
+
+# Plug leads from a command line value, e.g. "HL MO" or "HL,MO"
+def plugleads_list(value):
+    return value.replace(",", " ").split()
+
+
+# Encode (or decode, Enigma is reciprocal) each message from the initial rotor positions.
+# Messages are read from standard input, one per line, if none is given on the command line
+def run_encode(args):
+    em = EnigmaMachine()
+    em.configure(settings_from_args(args))
+    messages = args.messages if args.messages else (line.rstrip("\n") for line in sys.stdin)
+    for message in messages:
+        em.reset_default_rotor_position()
+        print(em.encode(message))
+
+
+# Break a message with the given constraints. Each rotor constraint is "*" (any value) or a comma separated list of
+# the allowed values, e.g. "I,II"
+def run_break(args):
+    from code_breaking import CodeBreaking, print_results
+    t_start = time.time()
+    cb = CodeBreaking()
+    num_rotors = max(len(x) for x in [args.rotors or [], args.positions or [], args.rings or [], ["*"] * 3])
+    cb.set_number_of_rotors(num_rotors)
+    constraints = [(args.rotors, str, cb.set_rotors, ["I", "II", "III", "IV", "V", "Beta", "Gamma"]),
+                   (args.positions, str, cb.set_rotor_positions, [chr(x) for x in range(65, 65 + 26)]),
+                   (args.rings, int, cb.set_ring_settings, list(range(1, 27)))]
+    for values, convert, setter, any_value in constraints:
+        if values is None:
+            continue
+        if len(values) != num_rotors:
+            raise ValueError(f"Rotor constraints must be given for all the {num_rotors} rotors")
+        setter([any_value if value == "*" else [convert(x) for x in value.split(",")] for value in values])
+    if args.reflectors is not None:
+        cb.set_reflectors(args.reflectors)
+    if args.plugleads is not None:
+        cb.set_plugboard_connections(args.plugleads)
+    if args.scorer is not None:
+        cb.set_scorer(args.scorer)
+    cb.num_workers = args.workers
+    cb.checkpoint_path = args.checkpoint
+    cb.resume = args.resume
+    cb.max_results = args.max_results
+    cb.score_threshold = args.threshold
+    cb.results_export_path = args.export
+    if args.metrics is not None:
+        import search_metrics
+        cb.metrics = search_metrics.SearchMetrics(jsonl_path=args.metrics)
+    if args.hill_climbing:
+        solution = cb.break_code_hill_climbing(args.message, args.crib)
+    else:
+        solution = cb.break_code(args.message, args.crib)
+    print_results(solution, time.time() - t_start, "")
+
+
+def add_machine_arguments(parser):
+    parser.add_argument("--settings", help='JSON settings or path of a JSON settings file, e.g. \'{"rotors": ["I", "II", '
+                                           '"III"], "positions": ["A", "A", "Z"], "ring_settings": [1, 1, 1], '
+                                           '"reflector": "B", "plugleads": ["HL", "MO"]}\'')
+    parser.add_argument("--rotors", nargs="+", help="rotors from the leftmost one, e.g. I II III")
+    parser.add_argument("--positions", nargs="+", help="initial rotor positions, e.g. A A Z")
+    parser.add_argument("--rings", type=int, nargs="+", help="ring settings, e.g. 1 1 1")
+    parser.add_argument("--reflector", help="reflector, e.g. B")
+    parser.add_argument("--plugleads", type=plugleads_list, help='plug leads, e.g. "HL MO"')
+    parser.add_argument("messages", nargs="*", help="messages to encode (default: read standard input)")
+    parser.set_defaults(function=run_encode)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Enigma Machine command line")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_machine_arguments(commands.add_parser("encode", help="encode messages"))
+    add_machine_arguments(commands.add_parser("decode", help="decode messages (same as encode)"))
+    break_parser = commands.add_parser("break", help="break a message with optional constraints on the settings")
+    break_parser.add_argument("message", help="encoded message")
+    break_parser.add_argument("--crib", nargs="*", default=[], help="words known to be in the decoded message")
+    break_parser.add_argument("--rotors", nargs="+",
+                              help="rotor choices from the leftmost rotor, e.g. Beta I,II,III * (* = any rotor)")
+    break_parser.add_argument("--positions", nargs="+", help="rotor position choices, e.g. M J,K * (* = any)")
+    break_parser.add_argument("--rings", nargs="+", help="ring setting choices, e.g. 4 2 1,2,3 (* = any)")
+    break_parser.add_argument("--reflectors", nargs="+", help="reflector choices, e.g. B C")
+    break_parser.add_argument("--plugleads", type=plugleads_list,
+                              help='known plug leads, ? = unknown contact, e.g. "KI N? ??"')
+    break_parser.add_argument("--scorer", help="common_words, bigrams, trigrams, quadgrams, ioc or chi_squared")
+    break_parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    break_parser.add_argument("--checkpoint", help="file where the progress of the search is periodically saved")
+    break_parser.add_argument("--resume", action="store_true", help="continue the search saved in --checkpoint")
+    break_parser.add_argument("--max-results", type=int, default=100, help="number of best decoded messages kept")
+    break_parser.add_argument("--threshold", type=float, help="minimum score of the kept decoded messages")
+    break_parser.add_argument("--export", help="JSON lines file where every kept decoded message is written")
+    break_parser.add_argument("--metrics", help="JSON lines file where the search progress and metrics are appended")
+    break_parser.add_argument("--hill-climbing", action="store_true",
+                              help="recover mostly unknown plug leads by hill climbing")
+    break_parser.set_defaults(function=run_break)
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    try:
+        args.function(args)
+    except (TypeError, ValueError) as error:
+        sys.exit(f"error: {error}")
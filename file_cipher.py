@@ -0,0 +1,79 @@
+import argparse
+import mmap
+import os
+import numpy as np
+from enigma import EnigmaMachine
+from utility import load_settings
+
+# Create an EnigmaMachine from a settings dictionary, e.g.
+# {"rotors": ["I", "II", "III"], "positions": ["A", "A", "Z"], "ring_settings": [1, 1, 1], "reflector": "B",
+#  "plugleads": ["HL", "MO"]}
+def machine_from_settings(settings):
+    if type(settings) is not dict:
+        raise TypeError("Settings must be a dictionary with rotors, positions, ring_settings, reflector and plugleads")
+    for key in ["rotors", "positions", "ring_settings", "reflector"]:
+        if key not in settings:
+            raise ValueError(f"Settings {key} is missing")
+    em = EnigmaMachine()
+    em.configure(settings)
+    return em
+
+
+# Map the bytes A-Z and a-z to 0 - 25 and every other byte to a value greater than 25.
+# Setting bit 5 turns UPPERCASE ASCII letters into lowercase ones, and only letters end up between 97 and 122
+def bytes_to_letters(data):
+    letters = data | 32
+    letters -= 97
+    return letters
+
+
+# Encode (or decode, Enigma is reciprocal) a file into another one.
+# The input file is formatted as EnigmaMachine.encode does with ASCII text: lowercase letters are turned into UPPERCASE
+# and all other bytes are dropped. Both files are memory mapped and processed "block_size" bytes at the time: each
+# block is encoded with the compiled machine tables straight into the output mapping.
+# Returns the number of encoded letters
+def encode_file(input_path, output_path, settings, block_size=1 << 24):
+    compiled = machine_from_settings(settings).compile()
+    with open(input_path, 'rb') as input_file, open(output_path, 'w+b') as output_file:
+        input_size = os.fstat(input_file.fileno()).st_size
+        if input_size == 0:
+            return 0
+        with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as input_map:
+            data = np.frombuffer(input_map, dtype=np.uint8)
+            # First pass: count the letters to size the output file
+            num_letters = 0
+            for start in range(0, input_size, block_size):
+                num_letters += int(np.count_nonzero(bytes_to_letters(data[start: start + block_size]) < 26))
+            output_file.truncate(num_letters)
+            if num_letters > 0:
+                with mmap.mmap(output_file.fileno(), num_letters, access=mmap.ACCESS_WRITE) as output_map:
+                    output = np.frombuffer(output_map, dtype=np.uint8)
+                    # Second pass: encode block by block, the rotors state is carried over by the compiled machine
+                    position = 0
+                    for start in range(0, input_size, block_size):
+                        letters = bytes_to_letters(data[start: start + block_size])
+                        valid = letters < 26
+                        if not valid.all():
+                            letters = letters[valid]
+                        compiled.encode_letters(letters, out=output[position: position + len(letters)])
+                        output[position: position + len(letters)] += 65
+                        position += len(letters)
+                    # the mappings can only be closed once no array refers to them
+                    del output
+                    output_map.flush()
+            del data
+    return num_letters
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Encode or decode a file with an Enigma Machine")
+    parser.add_argument("input", help="path of the file to encode or decode")
+    parser.add_argument("output", help="path of the output file")
+    parser.add_argument("--settings", required=True,
+                        help='JSON settings or path of a JSON settings file, e.g. \'{"rotors": ["I", "II", "III"], '
+                             '"positions": ["A", "A", "Z"], "ring_settings": [1, 1, 1], "reflector": "B", '
+                             '"plugleads": ["HL", "MO"]}\'')
+    parser.add_argument("--block-size", type=int, default=1 << 24, help="number of bytes processed at once")
+    args = parser.parse_args()
+    num_letters = encode_file(args.input, args.output, load_settings(args.settings), args.block_size)
+    print(f"{num_letters} letters written to {args.output}")
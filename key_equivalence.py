@@ -0,0 +1,136 @@
+import numpy as np
+from rotorscase import rotor_positions_at
+
+
+# Classes of equivalent rotor positions/ring settings candidates of a search space (see search_space.SearchSpace) for
+# rotors with the given notches (from the rightmost rotor) and a message of message_length letters.
+# Each letter is encoded with the rotor offsets (position - ring setting) of its key stroke, so two candidates whose
+# offsets are the same at every key stroke decode the message in the same way. The offsets only depend on:
+# - the starting offset of each rotor
+# - the steps of the middle and left rotors during the message, which only depend on the starting positions of the
+#   rightmost and middle rotors (the left rotor and the fourth rotor never make another rotor step)
+# Candidates with the same starting offsets and the same steps form a class. The left (and fourth) rotor positions and
+# ring settings always collapse into their offset, the rightmost and middle ones collapse as well when they do not
+# reach a notch during the message.
+# The representative of a class is its first candidate in the enumeration order of the search space.
+class CandidateClasses:
+
+    def __init__(self, space, notches, message_length):
+        self.space = space
+        num_rotors = len(space.positions)
+        # Allowed rotor positions and ring settings (0 - 25) of each rotor, from the rightmost one
+        self.__pos_allowed = np.zeros((num_rotors, 26), dtype=bool)
+        self.__ring_allowed = np.zeros((num_rotors, 26), dtype=bool)
+        for column, (positions, ring_settings) in enumerate(zip(reversed(space.positions), reversed(space.ring_settings))):
+            self.__pos_allowed[column, [ord(position) - 65 for position in positions]] = True
+            self.__ring_allowed[column, [ring - 1 for ring in ring_settings]] = True
+        # Steps of the middle and left rotors at each key stroke for each (rightmost, middle) starting positions.
+        # A message of length 0 is given the classes of a single letter.
+        right, middle = [x.reshape(-1, 1) for x in np.divmod(np.arange(26 * 26), 26)]
+        key_strokes = np.arange(1, max(message_length, 1) + 1).reshape(1, -1)
+        trajectory = rotor_positions_at([right, middle, np.zeros_like(right)], notches[:3], key_strokes)
+        steps = np.concatenate([(trajectory[1] - middle) % 26, trajectory[2] % 26], axis=1).astype(np.uint8)
+        pattern_ids = {}
+        self.__pattern = np.array([pattern_ids.setdefault(row.tobytes(), len(pattern_ids)) for row in steps],
+                                  dtype=np.intp).reshape(26, 26)    # [rightmost position, middle position]
+        num_patterns = len(pattern_ids)
+        # Representative (rightmost, middle) positions of each (pattern, rightmost offset, middle offset), -1 if no
+        # allowed candidate has them. The candidates are visited in enumeration order (middle position first)
+        self.__best_pair = np.full((num_patterns, 26, 26, 2), -1, dtype=np.intp)
+        self.__pair_count = np.zeros((num_patterns, 26, 26), dtype=np.int64)     # allowed candidates of each of them
+        for middle_pos in np.flatnonzero(self.__pos_allowed[1]):
+            for right_pos in np.flatnonzero(self.__pos_allowed[0]):
+                right_offsets = (right_pos - np.flatnonzero(self.__ring_allowed[0])) % 26
+                middle_offsets = (middle_pos - np.flatnonzero(self.__ring_allowed[1])) % 26
+                block = self.__best_pair[self.__pattern[right_pos, middle_pos]][np.ix_(right_offsets, middle_offsets)]
+                block[block[..., 0] < 0] = (right_pos, middle_pos)
+                self.__best_pair[self.__pattern[right_pos, middle_pos]][np.ix_(right_offsets, middle_offsets)] = block
+                self.__pair_count[self.__pattern[right_pos, middle_pos]][np.ix_(right_offsets, middle_offsets)] += 1
+        # Representative position of each offset of the left (and fourth) rotor, -1 if no allowed candidate has it
+        self.__best_position = np.full((num_rotors, 26), -1, dtype=np.intp)
+        self.__position_count = np.zeros((num_rotors, 26), dtype=np.int64)
+        for column in range(2, num_rotors):
+            for position in reversed(np.flatnonzero(self.__pos_allowed[column])):
+                self.__best_position[column, (position - np.flatnonzero(self.__ring_allowed[column])) % 26] = position
+                self.__position_count[column, (position - np.flatnonzero(self.__ring_allowed[column])) % 26] += 1
+        # Number of classes of the search space candidates
+        self.num_classes = int((self.__best_pair[..., 0] >= 0).sum())
+        for column in range(2, num_rotors):
+            self.num_classes *= int((self.__best_position[column] >= 0).sum())
+
+    # Representative candidate of the candidates with the given rotor positions and ring settings arrays (see
+    # SearchSpace.candidate_arrays)
+    def representatives(self, pos_arr, ring_arr):
+        offsets = (pos_arr - ring_arr) % 26
+        pairs = self.__best_pair[self.__pattern[pos_arr[:, 0], pos_arr[:, 1]], offsets[:, 0], offsets[:, 1]]
+        rep_pos = np.empty_like(pos_arr)
+        rep_pos[:, :2] = pairs
+        for column in range(2, pos_arr.shape[1]):
+            rep_pos[:, column] = self.__best_position[column, offsets[:, column]]
+        return self.space.candidate_indices(rep_pos, (rep_pos - offsets) % 26)
+
+    # Number of candidates of the classes of the candidates with the given rotor positions and ring settings arrays
+    def class_sizes(self, pos_arr, ring_arr):
+        offsets = (pos_arr - ring_arr) % 26
+        sizes = self.__pair_count[self.__pattern[pos_arr[:, 0], pos_arr[:, 1]], offsets[:, 0], offsets[:, 1]]
+        for column in range(2, pos_arr.shape[1]):
+            sizes = sizes * self.__position_count[column, offsets[:, column]]
+        return sizes
+
+    # Candidates (in enumeration order) equivalent to the candidate with the given rotor positions and ring settings
+    # (arrays ordered from the rightmost rotor)
+    def members(self, positions, ring_settings):
+        offsets = (np.asarray(positions) - np.asarray(ring_settings)) % 26
+        right, middle = np.divmod(np.arange(26 * 26), 26)
+        pairs = np.flatnonzero((self.__pattern[right, middle] == self.__pattern[positions[0], positions[1]]) &
+                               self.__pos_allowed[0, right] & self.__pos_allowed[1, middle] &
+                               self.__ring_allowed[0, (right - offsets[0]) % 26] &
+                               self.__ring_allowed[1, (middle - offsets[1]) % 26])
+        # every allowed pair of (rightmost, middle) positions is combined with every allowed left (and fourth) position
+        choices = [pairs] + [np.flatnonzero(self.__pos_allowed[column] &
+                                            self.__ring_allowed[column, (np.arange(26) - offsets[column]) % 26])
+                             for column in range(2, len(positions))]
+        grid = [x.ravel() for x in np.meshgrid(*choices, indexing="ij")]
+        member_pos = np.column_stack([right[grid[0]], middle[grid[0]]] + grid[1:])
+        return np.sort(self.space.candidate_indices(member_pos, (member_pos - offsets) % 26))
+
+
+if __name__ == '__main__':
+    import random
+    import compiled_enigma
+    from enigma import EnigmaMachine
+    from search_space import SearchSpace
+
+    # Equivalent candidates decode a message in the same way, the classes partition the search space
+    rng = random.Random(0)
+    letters = compiled_enigma.message2array("THEQUICKBROWNFOXJUMPSOVERTHELAZYDOGTHEQUICKBROWNFOX")
+    em = EnigmaMachine()
+    em.configure({"plugleads": ["AB", "CD"]})
+    plugboard = compiled_enigma.plugboard_array(em.plugboard)
+    for rotors in [("I", "II", "III"), ("V", "IV", "II"), ("Beta", "III", "I", "V"), ("II", "Gamma", "I")]:
+        for message_length in [1, 10, 51]:
+            alphabet = [chr(x) for x in range(65, 91)]
+            space = SearchSpace([rotors], [sorted(rng.sample(alphabet, rng.randint(1, 8))) for _ in rotors],
+                                [sorted(rng.sample(range(1, 27), rng.randint(1, 6))) for _ in rotors], ["B"])
+            em.configure({"rotors": list(rotors), "reflector": "B"})
+            rotors_list = em.rotorcase.rotors
+            forward = np.array([compiled_enigma.rotor_wiring_array(r, 0) for r in rotors_list], dtype=np.uint8)
+            backward = np.array([compiled_enigma.rotor_wiring_array(r, 1) for r in rotors_list], dtype=np.uint8)
+            reflector = compiled_enigma.reflector_array(em.reflector)
+            notches = em.rotorcase.notches()
+            classes = CandidateClasses(space, notches, message_length)
+            candidates = np.arange(space.num_candidates)
+            pos_arr, ring_arr = space.candidate_arrays(candidates)
+            decoded = compiled_enigma.decode_candidates(forward, backward, reflector, notches, plugboard, pos_arr,
+                                                        ring_arr, letters[:message_length])
+            reps = classes.representatives(pos_arr, ring_arr)
+            assert ((decoded == decoded[reps]).all() and (reps <= candidates).all())
+            assert (len(np.unique(reps)) == classes.num_classes)
+            for candidate in rng.sample(range(space.num_candidates), min(20, space.num_candidates)):
+                members = classes.members(pos_arr[candidate], ring_arr[candidate])
+                assert (members.tolist() == np.flatnonzero(reps == reps[candidate]).tolist())
+                assert (classes.class_sizes(pos_arr[[candidate]], ring_arr[[candidate]])[0] == len(members))
+    # Short messages reach few notches: most rightmost and middle rotor positions/ring settings collapse as well
+    space = SearchSpace([("I", "II", "III")], [alphabet] * 3, [list(range(1, 27))] * 3, ["B"])
+    assert (space.num_candidates > 500 * CandidateClasses(space, [21, 4, 16], 10).num_classes)
+    print("Key equivalence tests passed")
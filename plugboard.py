@@ -1,11 +1,14 @@
 class Plugboard:
+    __slots__ = ("plugleads", "num_plugleads", "max_num_plugleads", "mapping")
+    # Available contacts: shared between all instances
+    contacts = {"A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M", "N", "O", "P", "Q", "R", "S",
+                "T", "U", "V", "W", "X", "Y", "Z"}
 
     def __init__(self):
         self.plugleads = []             # List of plugleads
         self.num_plugleads = 0          # Number of added plugleads
         self.max_num_plugleads = 10     # Maximum number of plug leads allowed (Enigma machine came by default with 10 leads)
-        self.__contact = {"A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M", "N", "O", "P", "Q", "R", "S",
-                          "T", "U", "V", "W", "X", "Y", "Z"}
+        self.mapping = list(range(26))  # Plugboard as a 26 entries involution (A=0 ... Z=25) of all the plug leads
 
     def add(self, a_pluglead):
         # Maximum number of plug leads available is 10
@@ -16,30 +19,30 @@ class Plugboard:
             raise ValueError("1 or more pluglead contacts are already in use. Check your inputs")
         self.plugleads.append(a_pluglead)
         self.num_plugleads += 1
+        self.mapping[a_pluglead.contact_a] = a_pluglead.contact_b
+        self.mapping[a_pluglead.contact_b] = a_pluglead.contact_a
 
     # Remove a specific plug lead by name
     def remove(self, a_pluglead):
         if a_pluglead in self.plugleads:
+            removed = self.plugleads[self.plugleads.index(a_pluglead)]
             self.plugleads.remove(a_pluglead)
+            self.mapping[removed.contact_a] = removed.contact_a
+            self.mapping[removed.contact_b] = removed.contact_b
 
     # Remove all plug leads from the plug board
     def clear(self):
         self.plugleads = []
         self.num_plugleads = 0
+        self.mapping = list(range(26))
 
-    # Iterate over all plugleads in the plugboard to encode the input char
+    # Encode the input char with the plugboard mapping
     def encode(self, char_in):
         # Input validation
-        if not isinstance(char_in, str) or char_in not in self.__contact:
+        if not isinstance(char_in, str) or char_in not in self.contacts:
             raise ValueError(f"{char_in} is not a valid input. Input must be an UPPERCASE character between A and Z, included")
-        char_out = char_in
-        for plug_lead in self.plugleads:
-            char_out = plug_lead.encode(char_in)
-            # if the input character has been encoded then return the mapped character, if not keep looking
-            if char_out != char_in:
-                return char_out
         # return an exact copy of the input character if there is no lead that maps it to another char
-        return char_out
+        return chr(self.mapping[ord(char_in) - 65] + 65)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+import itertools
+import numpy as np
+
+
+# Decode a message with many plugboards at once.
+# tables = array (message length x 26) with the rotors/reflector permutation (no plugboard) used for each letter
+# letters = array of integers (A=0 ... Z=25) of the message, plugboards = array (num_plugboards x 26)
+# Returns an array (num_plugboards x message length) with the decoded letters
+def decode_with_plugboards(tables, letters, plugboards):
+    plugboards = np.asarray(plugboards, dtype=np.intp)
+    contacts = plugboards[:, letters]
+    contacts = tables[np.arange(len(letters)), contacts]
+    return np.take_along_axis(plugboards, contacts.astype(np.intp), axis=1)
+
+
+# All the plugboards which differ from "plugboard" by one move: for each pair of letters (a, b), a and b are
+# disconnected from their current partners and connected together, or disconnected if they were already connected.
+# Letters in fixed_letters are never moved. Returns an array (num_moves x 26)
+def plugboard_neighbours(plugboard, fixed_letters):
+    free_letters = [x for x in range(26) if x not in fixed_letters]
+    pairs = np.array(list(itertools.combinations(free_letters, 2)), dtype=np.intp).reshape(-1, 2)
+    a, b = pairs[:, 0], pairs[:, 1]
+    partner_a, partner_b = plugboard[a], plugboard[b]
+    rows = np.arange(len(pairs))
+    neighbours = np.tile(plugboard, (len(pairs), 1))
+    # disconnect a, b and their partners
+    for letter in (a, partner_a, b, partner_b):
+        neighbours[rows, letter] = letter
+    # connect a and b, unless they were connected together
+    connect = partner_a != b
+    neighbours[rows[connect], a[connect]] = b[connect]
+    neighbours[rows[connect], b[connect]] = a[connect]
+    return neighbours
+
+
+# Recover the plug leads of a message by hill climbing.
+# Starting from "plugboard" (array of 26 integers, the fully known leads), the plugboard is changed one move at the
+# time (see plugboard_neighbours) choosing at each step the move which gives the best scoring decoded message, until
+# no move improves the score.
+# fixed_letters = letters of the fully known leads, required_letters = letters which are known to be plugged
+# (e.g. "X?" leads), max_leads = maximum number of plug leads.
+# Returns (plugboard, score)
+def hill_climb_plugboard(tables, letters, scorer, plugboard, fixed_letters, required_letters, max_leads):
+    plugboard = np.array(plugboard, dtype=np.intp)
+    identity = np.arange(26)
+    required_letters = np.array(sorted(required_letters), dtype=np.intp)
+    best_score = scorer.score_batch(decode_with_plugboards(tables, letters, plugboard[None, :]))[0]
+    # Connect first the letters which are known to be plugged
+    for letter in required_letters:
+        if plugboard[letter] != letter:
+            continue
+        free_partners = [x for x in range(26) if x != letter and plugboard[x] == x and x not in fixed_letters]
+        candidates = np.tile(plugboard, (len(free_partners), 1))
+        candidates[np.arange(len(free_partners)), letter] = free_partners
+        candidates[np.arange(len(free_partners)), free_partners] = letter
+        scores = scorer.score_batch(decode_with_plugboards(tables, letters, candidates))
+        plugboard = candidates[np.argmax(scores)]
+        best_score = scores.max()
+    while True:
+        neighbours = plugboard_neighbours(plugboard, fixed_letters)
+        # keep the plugboards with at most max_leads leads and all the required letters plugged
+        valid = (neighbours != identity).sum(axis=1) <= 2 * max_leads
+        valid &= (neighbours[:, required_letters] != required_letters).all(axis=1)
+        neighbours = neighbours[valid]
+        if len(neighbours) == 0:
+            break
+        scores = scorer.score_batch(decode_with_plugboards(tables, letters, neighbours))
+        best = np.argmax(scores)
+        if scores[best] <= best_score:
+            break
+        plugboard, best_score = neighbours[best], scores[best]
+    return plugboard, float(best_score)
+
+
+# Convert a plugboard array into the list of its plug leads, e.g. ["AB", "CF"]
+def plugboard_to_leads(plugboard):
+    return [chr(65 + x) + chr(65 + int(plugboard[x])) for x in range(26) if plugboard[x] > x]
+
+
+if __name__ == '__main__':
+    from enigma import EnigmaMachine
+    from compiled_enigma import scrambler_tables, stepping_trajectory, message2array, array2message
+    import scoring
+
+    # Recover 10 unknown plug leads of a message with known rotors
+    plaintext = ("THEENIGMAMACHINEISACIPHERDEVICEDEVELOPEDANDUSEDINTHEEARLYTOMIDTWENTIETHCENTURYTOPROTECTCOMMERCIAL"
+                 "DIPLOMATICANDMILITARYCOMMUNICATIONITWASEMPLOYEDEXTENSIVELYBYNAZIGERMANYDURINGWORLDWARIIINALL"
+                 "BRANCHESOFTHEGERMANMILITARYTHEENIGMAHASANELECTROMECHANICALROTORMECHANISMTHATSCRAMBLESTHELETTERS")
+    leads = ["AZ", "BY", "CX", "DW", "EV", "FU", "GT", "HS", "IR", "JQ"]
+    em = EnigmaMachine()
+    em.add_rotors(["II", "IV", "V"])
+    em.set_rotors_initial_pos(["B", "L", "A"])
+    em.set_rotors_ring_setting([2, 21, 12])
+    em.add_reflector("B")
+    em.add_plugleads(list(leads))
+    encoded = message2array(em.encode(plaintext))
+    em.remove_plugleads()
+    compiled = em.compile()
+    trajectory = stepping_trajectory(compiled.default_positions, compiled.notches, len(encoded))
+    tables = scrambler_tables(compiled.forward, compiled.backward, compiled.reflector, np.arange(26, dtype=np.uint8),
+                              trajectory - np.array(compiled.ring_settings))
+    words = [line.strip("\n").upper() for line in open("google-10000-english-no-swears.txt")]
+    # Climb first on the index of coincidence, which is improved by any correct lead, and then on quadgrams
+    plugboard = np.arange(26)
+    for scorer in (scoring.IndexOfCoincidenceScorer(), scoring.scorer_from_name("quadgrams", words)):
+        plugboard, score = hill_climb_plugboard(tables, encoded, scorer, plugboard, set(), set(), 10)
+    decoded = array2message(decode_with_plugboards(tables, encoded, plugboard[None, :])[0])
+    assert (decoded == plaintext)
+    assert (sorted(plugboard_to_leads(plugboard)) == sorted(leads))
+    print("Plugboard hill climbing tests passed")
@@ -1,4 +1,5 @@
 class PlugLead:
+    __slots__ = ("contact_a", "contact_b")
     # Available contacts: shared between all instances
     contacts = {"A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M", "N", "O", "P", "Q", "R", "S",
                           "T", "U", "V", "W", "X", "Y", "Z"}
@@ -16,24 +17,34 @@ class PlugLead:
                              f"Plug leads must be specified by two UPPERCASE characters between A and Z included")
         if mapping[0] == mapping[1]:
             raise ValueError(f"Plug lead {mapping[0] + mapping[1]} is not valid. Contacts cannot be duplicated")
-        from_char = mapping[0]
-        to_char = mapping[1]
-        # Create a dictionary with back and forth mapping
-        self.letter_encode = {from_char: to_char, to_char: from_char}
+        # The two contacts connected by the lead as integers (A=0 ... Z=25)
+        self.contact_a = ord(mapping[0]) - 65
+        self.contact_b = ord(mapping[1]) - 65
+
+    # Back and forth mapping of the lead, e.g. {"A": "G", "G": "A"}
+    @property
+    def letter_encode(self):
+        from_char, to_char = chr(self.contact_a + 65), chr(self.contact_b + 65)
+        return {from_char: to_char, to_char: from_char}
 
     def encode(self, char_in):
         # Input validation
         if not isinstance(char_in, str) or char_in not in self.contacts:
             raise ValueError(f"{char_in} is not a valid input. Input must be an UPPERCASE character between A and Z included")
-        char_out = char_in
-        # If the plug lead connects the input char then map it to the other end of the lead.
-        if char_in in self.letter_encode:
-            char_out = self.letter_encode[char_in]
-        return char_out
+        return chr(self.encode_num(ord(char_in) - 65) + 65)
+
+    # Encode an integer contact (A=0 ... Z=25), no input validation
+    def encode_num(self, num_in):
+        # If the plug lead connects the input contact then map it to the other end of the lead.
+        if num_in == self.contact_a:
+            return self.contact_b
+        if num_in == self.contact_b:
+            return self.contact_a
+        return num_in
 
+    # Two plug leads are equal if they share at least one contact
     def __eq__(self, other):
-        return any(x == y for x, y in zip(self.letter_encode.keys(), other.letter_encode.keys())) or\
-               any(x == y for x, y in zip(self.letter_encode.keys(), other.letter_encode.values()))
+        return bool({self.contact_a, self.contact_b} & {other.contact_a, other.contact_b})
 
 
 if __name__ == "__main__":
@@ -1,28 +1,48 @@
 from enum import Enum
 
 
+# Map chars A - Z to ints 0 - 25 and back
+REFLECTOR_CHAR2NUM = dict([(chr(x), x-65) for x in range(65, 91)])
+REFLECTOR_NUM2CHAR = tuple(chr(x) for x in range(65, 91))
+
+
 class Reflector:
+    __slots__ = ("mapping", "wiring_type", "eType")
 
     def __init__(self, etype, wiring):
-        self.wiring = dict(wiring)
+        self.mapping = mapping_array(wiring)        # Integer mapping (A=0 ... Z=25)
+        if self.mapping == get_mapping_by_ReflectorType(etype):
+            # standard reflectors share the same mapping
+            self.mapping = get_mapping_by_ReflectorType(etype)
         self.wiring_type = WiringType.Std
         self.eType = etype
 
+    # Reflector wiring as a dictionary, e.g. {"E": "A", "J": "B", ...}, ordered by the contact each entry is wired to
+    @property
+    def wiring(self):
+        return dict((REFLECTOR_NUM2CHAR[self.mapping[x]], REFLECTOR_NUM2CHAR[x]) for x in range(26))
+
     def encode(self, char_in):
         # Input Validation
-        if not isinstance(char_in, str) or char_in not in self.wiring:
+        if not isinstance(char_in, str) or char_in not in REFLECTOR_CHAR2NUM:
             raise ValueError(f"{char_in} is not a valid input. Input must be an UPPERCASE character between A and Z included")
-        char_out = self.wiring[char_in]
+        char_out = REFLECTOR_NUM2CHAR[self.mapping[REFLECTOR_CHAR2NUM[char_in]]]
         return char_out
 
     def swap_wiring(self, new_wiring):
-        new_wiring_dict = dict(new_wiring)
-        if self.wiring != new_wiring_dict:
-            self.wiring = new_wiring_dict
+        new_mapping = mapping_array(new_wiring)
+        if self.mapping != new_mapping:
+            self.mapping = new_mapping
             self.wiring_type = WiringType.Mod
 
+    # Turn this reflector into another standard reflector (e.g. "B") taking its wiring from the registry.
+    # No object is created.
+    def set_type(self, reflector_name):
+        self.eType = reflectorType_from_name(reflector_name)
+        self.reset_std_wiring()
+
     def reset_std_wiring(self):
-        self.wiring = dict(get_wiring_by_ReflectorType(self.eType))
+        self.mapping = get_mapping_by_ReflectorType(self.eType)
         self.wiring_type = WiringType.Std
 
     # find the swapped pairs in the reflector with respect to the standard wiring
@@ -62,6 +82,19 @@ class WiringType(Enum):
     Mod = 2
 
 
+# Integer mapping of a reflector wiring given as a list (or dictionary) of (contact, contact) pairs.
+# Returns a tuple where element x is the contact wired to contact x (A=0 ... Z=25)
+def mapping_array(wiring):
+    mapping = [0] * 26
+    for contact_in, contact_out in dict(wiring).items():
+        mapping[REFLECTOR_CHAR2NUM[contact_in]] = REFLECTOR_CHAR2NUM[contact_out]
+    return tuple(mapping)
+
+
+def get_mapping_by_ReflectorType(reflector_type):
+    return REFLECTOR_REGISTRY[reflector_type.value - 1][1]
+
+
 def reflectorType_from_name(reflector_name):
     if reflector_name == "A":
         reflector_type = ReflectorType.A
@@ -81,16 +114,30 @@ def reflector_from_name(reflector_name):
     return reflector
 
 
+REFLECTOR_BASE_CONTACTS = ('A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z')
+
+REFLECTOR_WIRING_MATRIX = (
+                   ("E", "J", "M", "Z", "A", "L", "Y", "X", "V", "B", "W", "F", "C", "R", "Q", "U", "O", "N", "T", "S", "P", "I", "K", "H", "G", "D"),  # A
+                   ('Y', 'R', 'U', 'H', 'Q', 'S', 'L', 'D', 'P', 'X', 'N', 'G', 'O', 'K', 'M', 'I', 'E', 'B', 'F', 'Z', 'C', 'W', 'V', 'J', 'A', 'T'),  # B
+                   ('F', 'V', 'P', 'J', 'I', 'A', 'O', 'Y', 'E', 'D', 'R', 'Z', 'X', 'W', 'G', 'C', 'T', 'K', 'U', 'Q', 'S', 'B', 'N', 'M', 'H', 'L'))  # C
+
+
 def get_wiring_by_ReflectorType(reflector_type):
-    base_contact = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z']
+    return list(REFLECTOR_REGISTRY[reflector_type.value - 1][0])
+
+
+# Build the registry of the precompiled reflector wirings, one entry per reflector type in ReflectorType order (A, B, C):
+# (wiring as (contact, contact) pairs, integer mapping)
+def build_reflector_registry():
+    registry = []
+    for wiring_row in REFLECTOR_WIRING_MATRIX:
+        wiring = tuple(zip(wiring_row, REFLECTOR_BASE_CONTACTS))
+        registry.append((wiring, mapping_array(wiring)))
+    return tuple(registry)
 
-    wiring_matrix = [
-                   ["E", "J", "M", "Z", "A", "L", "Y", "X", "V", "B", "W", "F", "C", "R", "Q", "U", "O", "N", "T", "S", "P", "I", "K", "H", "G", "D"],  # A
-                   ['Y', 'R', 'U', 'H', 'Q', 'S', 'L', 'D', 'P', 'X', 'N', 'G', 'O', 'K', 'M', 'I', 'E', 'B', 'F', 'Z', 'C', 'W', 'V', 'J', 'A', 'T'],  # B
-                   ['F', 'V', 'P', 'J', 'I', 'A', 'O', 'Y', 'E', 'D', 'R', 'Z', 'X', 'W', 'G', 'C', 'T', 'K', 'U', 'Q', 'S', 'B', 'N', 'M', 'H', 'L']]  # C
 
-    wiring = list(zip(wiring_matrix[reflector_type.value - 1], base_contact))
-    return wiring
+# Registry built once at import and never modified
+REFLECTOR_REGISTRY = build_reflector_registry()
 
 
 if __name__ == "__main__":
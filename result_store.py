@@ -0,0 +1,124 @@
+import heapq
+import json
+import os
+
+
+# Bounded store of the best results of a code breaking search: at most max_results (score, plaintext, key, settings)
+# are kept in a heap, so that memory does not grow with the size of the search.
+# key = enumeration index of the candidate, e.g. (unit index, candidate index). Results are ranked by score, then by
+# plaintext and then by key (the later candidate wins), so the kept results never depend on the order they are added in.
+# Results scoring less than threshold (if not None) are dropped. If an export file is open, every result which is not
+# dropped is also appended to it as a JSON line.
+class ResultStore:
+
+    def __init__(self, max_results=100, threshold=None):
+        if type(max_results) is not int or max_results < 1:
+            raise ValueError("The maximum number of results must be a positive integer")
+        self.max_results = max_results
+        self.threshold = threshold
+        self.__heap = []            # min heap: the worst kept result is at the top
+        self.__export_file = None
+
+    def __len__(self):
+        return len(self.__heap)
+
+    def add(self, score, plaintext, key, settings):
+        if self.threshold is not None and score < self.threshold:
+            return
+        if self.__export_file is not None:
+            self.__export_file.write(json.dumps({"score": score, "plaintext": plaintext, "key": key,
+                                                 "settings": settings}) + "\n")
+        self.__push((score, plaintext, key, settings))
+
+    # Add the results kept by another store (e.g. the one of another shard of the search)
+    def merge(self, other):
+        for item in other.__heap:
+            self.__push(item)
+
+    # Keep the item if the store is not full or if it ranks better than the worst kept result.
+    # The keys are unique, so that the settings are never compared
+    def __push(self, item):
+        if len(self.__heap) < self.max_results:
+            heapq.heappush(self.__heap, item)
+        elif item[:3] > self.__heap[0][:3]:
+            heapq.heapreplace(self.__heap, item)
+
+    # Best result (score, plaintext, key, settings), None if the store is empty
+    def best(self):
+        return max(self.__heap, key=lambda item: item[:3]) if self.__heap else None
+
+    # Kept results from the best one
+    def sorted(self):
+        return sorted(self.__heap, key=lambda item: item[:3], reverse=True)
+
+    # Append the results to a JSON lines file, from byte "offset" of the file (the rest of the file is discarded, e.g.
+    # the results exported after the last checkpoint of an interrupted search)
+    def open_export(self, file_path, offset=0):
+        self.close_export()
+        mode = 'r+' if offset > 0 and os.path.isfile(file_path) else 'w'
+        self.__export_file = open(file_path, mode)
+        self.__export_file.seek(offset)
+        self.__export_file.truncate()
+
+    # Size in bytes of the exported results (0 if no export file is open)
+    def export_offset(self):
+        if self.__export_file is None:
+            return 0
+        self.__export_file.flush()
+        return self.__export_file.tell()
+
+    def close_export(self):
+        if self.__export_file is not None:
+            self.__export_file.close()
+            self.__export_file = None
+
+    # The export file stays in the process which opened it
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_ResultStore__export_file"] = None
+        return state
+
+
+if __name__ == '__main__':
+    import pickle
+    import random
+    import tempfile
+
+    # The kept results do not depend on the order the results are added in, duplicated plaintexts are all kept
+    results = [(random.Random(idx).randint(0, 20), "ABCDE"[idx % 5] * 3, (idx // 7, idx % 7), [idx]) for idx in range(500)]
+    expected = sorted(results, key=lambda item: item[:3], reverse=True)[:10]
+    store = ResultStore(10)
+    for result in results:
+        store.add(*result)
+    assert (store.sorted() == expected and store.best() == expected[0] and len(store) == 10)
+    shuffled = list(results)
+    random.Random(0).shuffle(shuffled)
+    shards = [ResultStore(10) for _ in range(3)]
+    for idx, result in enumerate(shuffled):
+        shards[idx % 3].add(*result)
+    merged = ResultStore(10)
+    for shard in shards:
+        merged.merge(pickle.loads(pickle.dumps(shard)))
+    assert (merged.sorted() == expected)
+
+    # Threshold and streaming export
+    with tempfile.TemporaryDirectory() as directory:
+        export_path = os.path.join(directory, "results.jsonl")
+        store = ResultStore(5, threshold=15)
+        store.open_export(export_path)
+        for result in results[:250]:
+            store.add(*result)
+        offset = store.export_offset()
+        for result in results[250:260]:
+            store.add(*result)
+        # continue from the offset: the results added after it are exported again only once
+        store.open_export(export_path, offset)
+        for result in results[250:]:
+            store.add(*result)
+        store.close_export()
+        with open(export_path) as file:
+            exported = [json.loads(line) for line in file]
+    assert ([item["key"] for item in exported] == [list(key) for score, _, key, _ in results if score >= 15])
+    assert (all(score >= 15 for score, *_ in store.sorted()) and len(store) == 5)
+    assert (ResultStore(3).best() is None)
+    print("Result store tests passed")
@@ -1,7 +1,16 @@
 from enum import Enum
 
 
+# Contacts A - Z shared between all rotors
+CONTACTS = frozenset(chr(x) for x in range(65, 91))
+# Shared char <-> integer maps (A=0 ... Z=25)
+CHAR2NUM = dict([(chr(x), x-65) for x in range(65, 91)])
+NUM2CHAR = tuple(chr(x) for x in range(65, 91))
+
+
 class Rotor:
+    __slots__ = ("location", "pos", "default_pos", "ringSet", "eType", "forward", "backward", "s_Notch", "num_Notch",
+                 "left_rotor", "right_rotor", "has_rotated")
 
     def __init__(self, etype, wiring, notch):
         self.location = 0                                       # Rotor location in the Rotorcase 0 = rightmost rotor
@@ -9,20 +18,40 @@ class Rotor:
         self.default_pos = 0                                    # Rotor default position (set when the rotor is first added)
         self.ringSet = 0                                        # Rotor ring setting
         self.eType = etype                                      # Rotor Type
-        self.wiring = [dict([(t[1], t[0]) for t in wiring])]    # Rotor wiring right to left
-        self.wiring.append(dict(wiring))                        # Rotor wiring  left to right
+        self.forward, self.backward = wiring_arrays(wiring)     # Rotor wiring right to left and left to right (shared)
         self.s_Notch = notch                                    # Rotor notch string
         self.num_Notch = Rotor.char2num_static(notch)           # Rotor notch integer (base 26)
         self.left_rotor = None                                  # Rotor object on the left side
         self.right_rotor = None                                 # Rotor object on the right side
         self.has_rotated = False                                # Flag to indicate whether or not the rotor has rotated for a given keyboard press
-        self.char2num_dict = dict([(chr(x), x-65) for x in range(65, 91)])
-        self.num2char_dict = dict([(x-65, chr(x)) for x in range(65, 91)])
+
+    # Rotor wiring as [right to left dictionary, left to right dictionary], e.g. [{"A": "E", ...}, {"E": "A", ...}]
+    @property
+    def wiring(self):
+        return [dict((NUM2CHAR[x], NUM2CHAR[y]) for x, y in enumerate(self.forward)),
+                dict((NUM2CHAR[x], NUM2CHAR[y]) for x, y in enumerate(self.backward))]
+
+    # Map chars A - Z to ints 0 - 25 (shared between all rotors)
+    @property
+    def char2num_dict(self):
+        return CHAR2NUM
+
+    # Map ints 0 - 25 to chars A - Z (shared between all rotors)
+    @property
+    def num2char_dict(self):
+        return dict(enumerate(NUM2CHAR))
+
+    # Turn this rotor into another type of rotor (e.g. "IV") taking its wiring from the registry, position and ring
+    # setting are kept. No object is created.
+    def set_type(self, rotor_name):
+        self.eType = rotor_type_from_name(rotor_name)
+        _, (self.forward, self.backward), self.s_Notch = ROTOR_REGISTRY[self.eType]
+        self.num_Notch = Rotor.char2num_static(self.s_Notch)
 
     # Set rotor initial position
     def set_initial_position(self, s_pos):
         # Input validation
-        if not isinstance(s_pos, str) or s_pos not in self.wiring[0].keys():
+        if not isinstance(s_pos, str) or s_pos not in CONTACTS:
             raise ValueError(
                 f"{s_pos} is not a valid initial position. Rotor initial position must be specified as an"
                 f" UPPERCASE character between A and Z included")
@@ -68,36 +97,33 @@ class Rotor:
     # Char_in is the input coming for the previous element(rotor/ reflector/plugboard)
     def encode_right_to_left(self, char_in):
         # Input validation
-        wiring = self.wiring[0]
-        if not isinstance(char_in, str) or char_in not in wiring.keys():
+        if not isinstance(char_in, str) or char_in not in CONTACTS:
             raise ValueError(f"{char_in} is not a valid input. Input must be an UPPERCASE character between A and Z included")
         # Get the correct right contact after adjusting the rotors alignment for position and ring setting
-        right_contact = self.__adjust_rotor_contact_right_to_left(char_in)
-        left_contact = wiring[right_contact]
+        right_contact = self.__adjust_rotor_contact_right_to_left(CHAR2NUM[char_in])
+        left_contact = self.forward[right_contact]
         if self.is_leftmost_rotor():
             # The leftmost rotor needs to pass the reflector the input contact already adjusted for alignment.
-            left_contact = self.num2char((self.char2num(left_contact) - self.pos + self.ringSet) % 26)
-        return left_contact
+            left_contact = (left_contact - self.pos + self.ringSet) % 26
+        return NUM2CHAR[left_contact]
 
     # Encode a letter in the backward direction (left to right).
     # Char_in is the input coming for the previous element(rotor/ reflector/plugboard)
     def encode_left_to_right(self, char_in: str):
-        # get the mapping from left to right
-        wiring = self.wiring[1]
         # Input Validation
-        if not isinstance(char_in, str) or char_in not in wiring.keys():
+        if not isinstance(char_in, str) or char_in not in CONTACTS:
             raise ValueError(f"{char_in} is not a valid input. Input must be an UPPERCASE character between A to Z included")
         # Get the correct left contact after adjusting rotors alignment for position and ring setting
-        left_contact = self.__adjust_rotor_contact_left_to_right(char_in)
+        left_contact = self.__adjust_rotor_contact_left_to_right(CHAR2NUM[char_in])
         # Fetch the rotor right contact wired to the left one
-        right_contact = wiring[left_contact]
+        right_contact = self.backward[left_contact]
         if self.is_rightmost_rotor():
             # The right rotor needs to pass the plugboard the input contact already adjusted for alignment.
-            right_contact = self.num2char((self.char2num(right_contact) - self.pos + self.ringSet) % 26)
-        return right_contact
+            right_contact = (right_contact - self.pos + self.ringSet) % 26
+        return NUM2CHAR[right_contact]
 
     # Get the right alignment between this rotor and the previous element on the right.
-    def __adjust_rotor_contact_right_to_left(self, char_in):
+    def __adjust_rotor_contact_right_to_left(self, num_in):
         right_rotor_pos = 0
         right_rotor_ring_set = 0
         # If this rotor is not the rightmost one, take into account the position and ring setting of the previous rotor
@@ -105,12 +131,10 @@ class Rotor:
         if not self.is_rightmost_rotor():
             right_rotor_pos = self.right_rotor.pos
             right_rotor_ring_set = self.right_rotor.ringSet
-        contact_idx = (self.char2num(char_in) + self.pos - self.ringSet - right_rotor_pos + right_rotor_ring_set) % 26
-        contact = self.num2char(contact_idx)
-        return contact
+        return (num_in + self.pos - self.ringSet - right_rotor_pos + right_rotor_ring_set) % 26
 
     # Get the right alignment between this rotor and the previous element on the left (i.e. rotor/ reflector/ plugboard)
-    def __adjust_rotor_contact_left_to_right(self, char_in):
+    def __adjust_rotor_contact_left_to_right(self, num_in):
         left_rotor_pos = 0
         left_rotor_ring_set = 0
         # If this rotor is not the leftmost one, take into account the position and ring setting of the previous rotor
@@ -118,9 +142,7 @@ class Rotor:
         if not self.is_leftmost_rotor():
             left_rotor_pos = self.left_rotor.pos
             left_rotor_ring_set = self.left_rotor.ringSet
-        contact_idx = (self.char2num(char_in) + self.pos - self.ringSet - left_rotor_pos + left_rotor_ring_set) % 26
-        contact = self.num2char(contact_idx)
-        return contact
+        return (num_in + self.pos - self.ringSet - left_rotor_pos + left_rotor_ring_set) % 26
 
     # Checking if this rotor is at the notch position
     def is_at_notch(self):
@@ -128,11 +150,11 @@ class Rotor:
 
     # Map chars A - Z to ints 0 - 25
     def char2num(self, char):
-        return self.char2num_dict[char]
+        return CHAR2NUM[char]
 
     # Map ints 0 - 25 to chars A - Z
     def num2char(self, num):
-        return self.num2char_dict[num]
+        return NUM2CHAR[num]
 
     # Overwriting the __eq__ inbuilt method: two rotors are considered equal if of the same type
     def __eq__(self, other):
@@ -168,6 +190,24 @@ def rotor_from_name(rotor_name):
     return this_rotor
 
 
+# Integer wirings (right to left, left to right) of each rotor wiring, shared between all the rotors of the same type
+_wiring_arrays_cache = {}
+
+
+# Integer wiring arrays of a rotor wiring given as a list of (left contact, right contact) pairs.
+# Returns (right to left tuple, left to right tuple) where element x is the contact wired to contact x (A=0 ... Z=25)
+def wiring_arrays(wiring):
+    key = tuple(wiring)
+    if key not in _wiring_arrays_cache:
+        forward = [0] * 26
+        backward = [0] * 26
+        for left_contact, right_contact in wiring:
+            forward[CHAR2NUM[right_contact]] = CHAR2NUM[left_contact]
+            backward[CHAR2NUM[left_contact]] = CHAR2NUM[right_contact]
+        _wiring_arrays_cache[key] = (tuple(forward), tuple(backward))
+    return _wiring_arrays_cache[key]
+
+
 def rotor_type_from_name(rotor_name):
     if rotor_name == "I":
         rotor_type = RotorType.I
@@ -188,26 +228,42 @@ def rotor_type_from_name(rotor_name):
     return rotor_type
 
 
-def get_wiring_by_rotorType(rotor_type):
-    base_contact = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z']
+ROTOR_BASE_CONTACTS = ('A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z')
 
-    wiring_matrix = [
-                   ["E", "K", "M", "F", "L", "G", "D", "Q", "V", "Z", "N", "T", "O", "W", "Y", "H", "X", "U", "S", "P", "A", "I", "B", "R", "C", "J"],  # I
-                   ['A', 'J', 'D', 'K', 'S', 'I', 'R', 'U', 'X', 'B', 'L', 'H', 'W', 'T', 'M', 'C', 'Q', 'G', 'Z', 'N', 'P', 'Y', 'F', 'V', 'O', 'E'],  # II
-                   ['B', 'D', 'F', 'H', 'J', 'L', 'C', 'P', 'R', 'T', 'X', 'V', 'Z', 'N', 'Y', 'E', 'I', 'W', 'G', 'A', 'K', 'M', 'U', 'S', 'Q', 'O'],  # III
-                   ['E', 'S', 'O', 'V', 'P', 'Z', 'J', 'A', 'Y', 'Q', 'U', 'I', 'R', 'H', 'X', 'L', 'N', 'F', 'T', 'G', 'K', 'D', 'C', 'M', 'W', 'B'],  # IV
-                   ['V', 'Z', 'B', 'R', 'G', 'I', 'T', 'Y', 'U', 'P', 'S', 'D', 'N', 'H', 'L', 'X', 'A', 'W', 'M', 'J', 'Q', 'O', 'F', 'E', 'C', 'K'],  # V
-                   ['L', 'E', 'Y', 'J', 'V', 'C', 'N', 'I', 'X', 'W', 'P', 'B', 'Q', 'M', 'D', 'R', 'T', 'A', 'K', 'Z', 'G', 'F', 'U', 'H', 'O', 'S'],  # Beta
-                   ['F', 'S', 'O', 'K', 'A', 'N', 'U', 'E', 'R', 'H', 'M', 'B', 'T', 'I', 'Y', 'C', 'W', 'L', 'Q', 'P', 'Z', 'X', 'V', 'G', 'J', 'D']]  # Gamma
+ROTOR_WIRING_MATRIX = (
+                   ("E", "K", "M", "F", "L", "G", "D", "Q", "V", "Z", "N", "T", "O", "W", "Y", "H", "X", "U", "S", "P", "A", "I", "B", "R", "C", "J"),  # I
+                   ('A', 'J', 'D', 'K', 'S', 'I', 'R', 'U', 'X', 'B', 'L', 'H', 'W', 'T', 'M', 'C', 'Q', 'G', 'Z', 'N', 'P', 'Y', 'F', 'V', 'O', 'E'),  # II
+                   ('B', 'D', 'F', 'H', 'J', 'L', 'C', 'P', 'R', 'T', 'X', 'V', 'Z', 'N', 'Y', 'E', 'I', 'W', 'G', 'A', 'K', 'M', 'U', 'S', 'Q', 'O'),  # III
+                   ('E', 'S', 'O', 'V', 'P', 'Z', 'J', 'A', 'Y', 'Q', 'U', 'I', 'R', 'H', 'X', 'L', 'N', 'F', 'T', 'G', 'K', 'D', 'C', 'M', 'W', 'B'),  # IV
+                   ('V', 'Z', 'B', 'R', 'G', 'I', 'T', 'Y', 'U', 'P', 'S', 'D', 'N', 'H', 'L', 'X', 'A', 'W', 'M', 'J', 'Q', 'O', 'F', 'E', 'C', 'K'),  # V
+                   ('L', 'E', 'Y', 'J', 'V', 'C', 'N', 'I', 'X', 'W', 'P', 'B', 'Q', 'M', 'D', 'R', 'T', 'A', 'K', 'Z', 'G', 'F', 'U', 'H', 'O', 'S'),  # Beta
+                   ('F', 'S', 'O', 'K', 'A', 'N', 'U', 'E', 'R', 'H', 'M', 'B', 'T', 'I', 'Y', 'C', 'W', 'L', 'Q', 'P', 'Z', 'X', 'V', 'G', 'J', 'D'))  # Gamma
 
-    wiring = list(zip(wiring_matrix[rotor_type.value - 1], base_contact))
-    return wiring
+ROTOR_NOTCHES = ("Q", "E", "V", "J", "Z", " ", " ")
+
+
+def get_wiring_by_rotorType(rotor_type):
+    return list(ROTOR_REGISTRY[rotor_type][0])
 
 
 def get_notch_by_RotorType(rotor_type):
-    notch_list = ["Q", "E", "V", "J", "Z", " ", " "]
-    notch = notch_list[rotor_type.value-1]
-    return notch
+    return ROTOR_REGISTRY[rotor_type][2]
+
+
+# Build the registry of the precompiled rotor wirings:
+# rotor type -> (wiring as (left contact, right contact) pairs, (right to left, left to right) integer wirings, notch)
+def build_rotor_registry():
+    registry = {}
+    for rotor_type in RotorType:
+        if rotor_type == RotorType.ND:
+            continue
+        wiring = tuple(zip(ROTOR_WIRING_MATRIX[rotor_type.value - 1], ROTOR_BASE_CONTACTS))
+        registry[rotor_type] = (wiring, wiring_arrays(wiring), ROTOR_NOTCHES[rotor_type.value - 1])
+    return registry
+
+
+# Registry built once at import and never modified
+ROTOR_REGISTRY = build_rotor_registry()
 
 
 if __name__ == '__main__':
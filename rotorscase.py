@@ -64,10 +64,82 @@ class Rotorscase:
         self.rotors.reverse()
         return out_char
 
+    # Pass an integer contact (A=0 ... Z=25) through all rotors from right to left, no input validation.
+    # Each rotor shifts the contact by its position minus its ring setting before its wiring and back after it.
+    def encode_right_to_left_num(self, num_in):
+        num_out = num_in
+        for this_rotor in self.rotors:
+            offset = this_rotor.pos - this_rotor.ringSet
+            num_out = (this_rotor.forward[(num_out + offset) % 26] - offset) % 26
+        return num_out
+
+    # Pass an integer contact (A=0 ... Z=25) through all rotors from left to right, no input validation
+    def encode_left_to_right_num(self, num_in):
+        num_out = num_in
+        for this_rotor in reversed(self.rotors):
+            offset = this_rotor.pos - this_rotor.ringSet
+            num_out = (this_rotor.backward[(num_out + offset) % 26] - offset) % 26
+        return num_out
+
     def remove_all_rotors(self):
         self.rotors = []
         self.num_rotors = 0
 
+    # Rotor positions (from right to left) after "offset" key strokes starting from the default initial positions.
+    # Computed directly from the initial positions and notches, no rotation is replayed.
+    def positions_at(self, offset):
+        return rotor_positions_at(self.default_positions(), self.notches(), offset)
+
+    # Move the rotors to the state they would have after "offset" key strokes from their default initial positions.
+    # Encoding from there gives the same output as encoding the message from its beginning and keeping the tail.
+    def seek(self, offset):
+        for this_rotor, pos in zip(self.rotors, self.positions_at(offset)):
+            this_rotor.pos = pos
+
+    # Array (length x num_rotors) with the rotor positions used to encode each character of a message of "length"
+    # characters, starting at character "start" of the message. Positions are given from the rightmost rotor.
+    def stepping_trajectory(self, length, start=0):
+        return stepping_trajectory(self.default_positions(), self.notches(), length, start)
+
+    def default_positions(self):
+        return [this_rotor.default_pos for this_rotor in self.rotors]
+
+    def notches(self):
+        return [this_rotor.num_Notch for this_rotor in self.rotors]
+
+    # Replace the rotors with the ones listed in names (from the leftmost to the rightmost rotor, e.g. ["I", "II", "III"]).
+    # The Rotor objects already in the rotorcase are turned into the new types in place, with their positions and ring
+    # settings; new objects are only created when the number of rotors changes. names is not modified.
+    def configure_rotors(self, names):
+        if type(names) not in (list, tuple):
+            raise TypeError("Rotor names must be specified by a list of string e.g. ['I', 'II', 'III']")
+        if not self.min_rotors <= len(names) <= self.max_rotors:
+            raise ValueError(f"The number of rotors must be between {self.min_rotors} and {self.max_rotors}")
+        rotor_types = [rotor_type_from_name(name) for name in names]
+        if len(set(rotor_types)) != len(rotor_types):
+            raise ValueError(f"Rotors ({names}) cannot be added more than once")
+        if len(names) != self.num_rotors:
+            self.remove_all_rotors()
+            for name in reversed(names):
+                self.add(rotor_from_name(name))
+            return
+        for this_rotor, name in zip(self.rotors, reversed(names)):
+            this_rotor.set_type(name)
+
+    # Set the rotors default initial positions (from the leftmost to the rightmost rotor), positions is not modified
+    def configure_positions(self, positions):
+        if len(positions) != self.num_rotors:
+            raise ValueError("Number of specified rotors positions does not match the number of rotors")
+        for this_rotor, pos in zip(self.rotors, reversed(positions)):
+            this_rotor.set_initial_position(pos)
+
+    # Set the rotors ring settings (from the leftmost to the rightmost rotor), ring_set is not modified
+    def configure_ring_settings(self, ring_set):
+        if len(ring_set) != self.num_rotors:
+            raise ValueError("Number of specified ring settings does not match the number of rotors")
+        for this_rotor, ring in zip(self.rotors, reversed(ring_set)):
+            this_rotor.set_ring_setting(ring)
+
     # set the rotors default initial position
     def set_rotors_initial_positions(self, positions):
         if self.num_rotors == 0:
@@ -91,6 +163,54 @@ class Rotorscase:
             this_rotor.set_ring_setting(ring)
 
 
+# Closed form of Rotorscase.rotate: rotor positions after "offset" key strokes.
+# positions and notches are integers ordered from the rightmost rotor to the leftmost one (at least 3 rotors).
+# The rightmost rotor rotates at every key stroke, the middle one rotates when the rightmost is at its notch or when it
+# is at its own notch (double stepping), in which case the left one rotates as well. The fourth rotor never rotates.
+# offset can be an integer or a numpy array of positive integers, in which case arrays of positions are returned.
+# positions can be numpy arrays as well (one start position per offset), notches must be integers.
+def rotor_positions_at(positions, notches, offset):
+    if isinstance(offset, int) and offset <= 0:
+        return list(positions)
+    right_pos, middle_pos, left_pos = positions[0], positions[1], positions[2]
+    right_notch, middle_notch = notches[0], notches[1]
+    # the middle rotor starting at its notch double steps at the very first key stroke
+    first = (middle_pos == middle_notch) * 1
+    middle_pos = (middle_pos + first) % 26
+    # number of key strokes for which the rightmost rotor is at its notch and makes the middle one rotate
+    if 0 <= right_notch < 26:
+        first_turnover = (right_notch - right_pos) % 26
+        first_turnover = first_turnover + 26 * (first_turnover < first)
+        turnovers = (offset - 1 - first_turnover) // 26 + 1
+    else:
+        first_turnover = 0
+        turnovers = offset * 0
+    # number of double steps: the middle rotor reaches its notch every 25 turnovers and, at the following key stroke,
+    # rotates again together with the left rotor
+    if 0 <= middle_notch < 26:
+        to_notch = (middle_notch - middle_pos) % 26
+        arrivals = 1 + (turnovers - to_notch) // 25
+        last_arrival = first_turnover + 26 * (to_notch + 25 * (arrivals - 1) - 1)
+        double_steps = arrivals - ((arrivals > 0) & (last_arrival + 1 >= offset))
+    else:
+        double_steps = offset * 0
+    out_positions = [(right_pos + offset) % 26,
+                     (middle_pos + turnovers + double_steps) % 26,
+                     (left_pos + first + double_steps) % 26]
+    return out_positions + list(positions[3:])
+
+
+# Array (length x num_rotors) with the rotor positions after each of the key strokes start+1 ... start+length,
+# i.e. the positions used to encode the characters start ... start+length-1 of a message.
+def stepping_trajectory(positions, notches, length, start=0):
+    import numpy as np
+    offsets = np.arange(start + 1, start + length + 1, dtype=np.intp)
+    trajectory = np.empty((length, len(positions)), dtype=np.intp)
+    for idx, pos in enumerate(rotor_positions_at(positions, notches, offsets)):
+        trajectory[:, idx] = pos
+    return trajectory
+
+
 if __name__ == '__main__':
 
     RC = Rotorscase()
@@ -117,3 +237,23 @@ if __name__ == '__main__':
     except ValueError:
         print("Test passed")
 
+    # Test the closed form stepping against the key stroke by key stroke rotation
+    import random
+    random.seed(0)
+    for rotor_names in [["III", "II", "I"], ["I", "V", "IV"], ["II", "Beta", "III"], ["Gamma", "I", "II", "IV"]]:
+        for _ in range(20):
+            RC = Rotorscase()
+            for name in rotor_names:
+                RC.add(rotor_from_name(name))
+            notches = RC.notches()
+            # start often next to the notches to exercise the double stepping
+            RC.set_rotors_initial_positions([random.choice([Rotor.num2Char_static(n % 26), Rotor.num2Char_static(random.randint(0, 25))])
+                                             for n in reversed([x - random.randint(0, 1) for x in notches])])
+            trajectory = RC.stepping_trajectory(1500)
+            for offset in range(1, 1501):
+                RC.rotate()
+                positions = [r.pos for r in RC.rotors]
+                assert (positions == RC.positions_at(offset))
+                assert (positions == list(trajectory[offset - 1]))
+            assert ((RC.stepping_trajectory(500, 1000) == trajectory[1000:]).all())
+    print("Stepping tests passed")
@@ -0,0 +1,158 @@
+import numpy as np
+
+# Relative frequency of the letters A - Z in English text
+ENGLISH_LETTER_FREQUENCIES = np.array([0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015, 0.06094, 0.06966,
+                                       0.00153, 0.00772, 0.04025, 0.02406, 0.06749, 0.07507, 0.01929, 0.00095, 0.05987,
+                                       0.06327, 0.09056, 0.02758, 0.00978, 0.02360, 0.00150, 0.01974, 0.00074])
+
+
+# Plaintext scorers.
+# Every scorer scores a single UPPERCASE phrase with score(phrase) or a whole batch of phrases of the same length with
+# score_batch(letters), where letters is an array (num_phrases x phrase length) of integers (A=0 ... Z=25).
+# The higher the score the more the phrase looks like English text.
+
+
+# Sum of the log10 probabilities of all the n-grams (n consecutive letters) of the phrase
+class NgramScorer:
+
+    def __init__(self, n, log_probs):
+        self.n = n                                                  # Length of the n-grams
+        self.log_probs = np.asarray(log_probs, dtype=np.float32)    # log10 probability of each of the 26^n n-grams
+
+    # Build the n-gram table from a list of words, optionally weighted (e.g. by how common each word is).
+    # N-grams never seen get a probability of 0.01 counts.
+    @staticmethod
+    def from_words(words, n, weights=None):
+        if weights is None:
+            weights = np.ones(len(words))
+        # Words separated by a 26 which marks the n-grams spanning two words
+        letters = np.full(sum(len(word) + 1 for word in words), 26, dtype=np.intp)
+        letter_weights = np.zeros(len(letters))
+        start = 0
+        for word, weight in zip(words, weights):
+            letters[start: start + len(word)] = np.frombuffer(word.encode("ascii"), dtype=np.uint8) - 65
+            letter_weights[start: start + len(word)] = weight
+            start += len(word) + 1
+        num_ngrams = len(letters) - n + 1
+        if num_ngrams <= 0:
+            raise ValueError(f"Not enough letters to build the {n}-grams table")
+        valid = np.ones(num_ngrams, dtype=bool)
+        ngram_ids = np.zeros(num_ngrams, dtype=np.intp)
+        for idx in range(n):
+            window = letters[idx: idx + num_ngrams]
+            valid &= (window >= 0) & (window < 26)
+            ngram_ids = ngram_ids * 26 + window
+        counts = np.bincount(ngram_ids[valid], weights=letter_weights[:num_ngrams][valid], minlength=26 ** n)
+        # Decoded messages have no spaces: add the n-grams spanning two consecutive words, assuming that any word can
+        # follow any other one. Their counts are the product of the word endings and word beginnings frequencies.
+        total_weight = sum(weights)
+        for split in range(1, n):
+            endings = affix_counts(words, weights, split, False)
+            beginnings = affix_counts(words, weights, n - split, True)
+            counts += np.outer(endings, beginnings).ravel() / total_weight
+        total = counts.sum()
+        log_probs = np.log10(np.maximum(counts, 0.01) / total)
+        return NgramScorer(n, log_probs)
+
+    def score(self, phrase):
+        return float(self.score_batch(np.frombuffer(phrase.encode("ascii"), dtype=np.uint8)[None, :] - 65)[0])
+
+    def score_batch(self, letters):
+        letters = np.asarray(letters, dtype=np.intp)
+        num_ngrams = letters.shape[1] - self.n + 1
+        if num_ngrams <= 0:
+            return np.zeros(letters.shape[0])
+        ngram_ids = np.zeros((letters.shape[0], num_ngrams), dtype=np.intp)
+        for idx in range(self.n):
+            ngram_ids = ngram_ids * 26 + letters[:, idx: idx + num_ngrams]
+        return self.log_probs[ngram_ids].sum(axis=1, dtype=np.float64)
+
+
+# Index of coincidence: probability that two letters taken at random from the phrase are the same.
+# Around 0.066 for English text and 0.038 for random letters.
+class IndexOfCoincidenceScorer:
+
+    def score(self, phrase):
+        return float(self.score_batch(np.frombuffer(phrase.encode("ascii"), dtype=np.uint8)[None, :] - 65)[0])
+
+    def score_batch(self, letters):
+        counts = letter_counts(letters)
+        length = letters.shape[1]
+        if length < 2:
+            return np.zeros(letters.shape[0])
+        return (counts * (counts - 1)).sum(axis=1) / (length * (length - 1))
+
+
+# Chi-squared distance between the letter frequencies of the phrase and the English ones.
+# The distance is returned with a negative sign, so that the higher the score the closer the phrase is to English.
+class ChiSquaredScorer:
+
+    def __init__(self, frequencies=ENGLISH_LETTER_FREQUENCIES):
+        self.frequencies = np.asarray(frequencies, dtype=np.float64)
+
+    def score(self, phrase):
+        return float(self.score_batch(np.frombuffer(phrase.encode("ascii"), dtype=np.uint8)[None, :] - 65)[0])
+
+    def score_batch(self, letters):
+        counts = letter_counts(letters)
+        expected = self.frequencies * letters.shape[1]
+        return -((counts - expected) ** 2 / np.maximum(expected, 1e-12)).sum(axis=1)
+
+
+# Weighted counts of the first (beginning = True) or last n letters of the words. Returns an array (26^n)
+def affix_counts(words, weights, n, beginning):
+    counts = np.zeros(26 ** n)
+    for word, weight in zip(words, weights):
+        if len(word) < n:
+            continue
+        affix = word[:n] if beginning else word[-n:]
+        affix_id = 0
+        for char in affix:
+            affix_id = affix_id * 26 + ord(char) - 65
+        if 0 <= affix_id < len(counts) and all(65 <= ord(char) <= 90 for char in affix):
+            counts[affix_id] += weight
+    return counts
+
+
+# Number of occurrences of each letter A - Z in each phrase of a batch. Returns an array (num_phrases x 26)
+def letter_counts(letters):
+    letters = np.asarray(letters, dtype=np.intp)
+    rows = np.arange(letters.shape[0])[:, None] * 26
+    return np.bincount((letters + rows).ravel(), minlength=26 * letters.shape[0]).reshape(letters.shape[0], 26)
+
+
+# Create a scorer by name. words = list of common words in decreasing order of frequency (used for the n-grams tables)
+def scorer_from_name(name, words):
+    # Weight the words as in Zipf's law: the frequency of a word is inversely proportional to its rank
+    weights = 1 / np.arange(1, len(words) + 1)
+    if name == "bigrams":
+        scorer = NgramScorer.from_words(words, 2, weights)
+    elif name == "trigrams":
+        scorer = NgramScorer.from_words(words, 3, weights)
+    elif name == "quadgrams":
+        scorer = NgramScorer.from_words(words, 4, weights)
+    elif name == "ioc":
+        scorer = IndexOfCoincidenceScorer()
+    elif name == "chi_squared":
+        scorer = ChiSquaredScorer()
+    else:
+        raise ValueError(f"Scorer {name} does not exist")
+    return scorer
+
+
+if __name__ == '__main__':
+    import random
+
+    words = [line.strip("\n").upper() for line in open("google-10000-english-no-swears.txt")]
+    english = "NICEWORKYOUVEMANAGEDTODECODETHEFIRSTSECRETSTRING"
+    random.seed(0)
+    randoms = ["".join(random.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(len(english))) for _ in range(50)]
+    letters = np.array([[ord(char) - 65 for char in phrase] for phrase in [english] + randoms], dtype=np.uint8)
+    for scorer_name in ["bigrams", "trigrams", "quadgrams", "ioc", "chi_squared"]:
+        scorer = scorer_from_name(scorer_name, words)
+        scores = scorer.score_batch(letters)
+        # English text must score better than random strings (on average for the single letter statistics)
+        assert (scores[0] > (scores[1:].max() if scorer_name.endswith("grams") else scores[1:].mean()))
+        # Batch and single phrase scores must match
+        assert (abs(scorer.score(randoms[3]) - scores[4]) < 1e-6)
+        print(f"{scorer_name} scorer test passed")
@@ -0,0 +1,117 @@
+import collections
+
+
+# Bounded cache of scrambler tables, i.e. the rotors/reflector permutation (plugboard excluded) of each key stroke of a
+# message (see compiled_enigma.candidate_scrambler_tables). A plugboard P only conjugates these permutations: the
+# letter c at key stroke t is decoded as P[tables[t, P[c]]], so the tables of a rotor order, rotor positions, ring
+# settings and reflector wiring are computed once and reused by every plugboard candidate.
+# At most max_entries tables (None = no limit) taking at most max_bytes are kept, the least recently used tables are
+# evicted first. Tables larger than max_bytes are computed but not kept.
+class ScramblerTableCache:
+
+    def __init__(self, max_entries=None, max_bytes=256 * 2 ** 20):
+        if max_entries is not None and (type(max_entries) is not int or max_entries < 1):
+            raise ValueError("The maximum number of cached tables must be a positive integer")
+        if type(max_bytes) is not int or max_bytes < 0:
+            raise ValueError("The maximum size of the cached tables must be a non negative integer")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.num_bytes = 0
+        self.__tables = collections.OrderedDict()     # from the least recently used tables
+
+    def __len__(self):
+        return len(self.__tables)
+
+    def __contains__(self, key):
+        return key in self.__tables
+
+    # Tables of key (any hashable description of the rotors, positions, ring settings, reflector wiring and message
+    # length), computed by compute() if they are not in the cache
+    def get(self, key, compute):
+        tables = self.__tables.get(key)
+        if tables is not None:
+            self.hits += 1
+            self.__tables.move_to_end(key)
+            return tables
+        self.misses += 1
+        tables = compute()
+        if tables.nbytes <= self.max_bytes:
+            self.__tables[key] = tables
+            self.num_bytes += tables.nbytes
+            while self.num_bytes > self.max_bytes or (self.max_entries is not None and len(self.__tables) > self.max_entries):
+                _, evicted = self.__tables.popitem(last=False)
+                self.num_bytes -= evicted.nbytes
+                self.evictions += 1
+        return tables
+
+    # True if num_entries tables of num_bytes in total can be kept at the same time, e.g. all the tables used between
+    # two uses of the same tables: otherwise they are always evicted before being reused
+    def fits(self, num_entries, num_bytes):
+        return num_bytes <= self.max_bytes and (self.max_entries is None or num_entries <= self.max_entries)
+
+    # Remove the tables, the statistics are kept
+    def clear(self):
+        self.__tables.clear()
+        self.num_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.__tables),
+                "bytes": self.num_bytes, "hit_rate": self.hits / lookups if lookups > 0 else 0.0}
+
+    # The tables stay in the process which computed them: a copy sent to a worker process starts empty
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_ScramblerTableCache__tables"] = collections.OrderedDict()
+        state["num_bytes"] = 0
+        return state
+
+
+if __name__ == '__main__':
+    import pickle
+    import numpy as np
+    import compiled_enigma
+    from enigma import EnigmaMachine
+
+    # Decoding with the cached tables and any plugboard is the same as decoding with the plugboard in the machine
+    em = EnigmaMachine()
+    em.configure({"rotors": ["Beta", "II", "IV", "I"], "reflector": "B"})
+    rotors_list = em.rotorcase.rotors
+    forward = np.array([compiled_enigma.rotor_wiring_array(r, 0) for r in rotors_list], dtype=np.uint8)
+    backward = np.array([compiled_enigma.rotor_wiring_array(r, 1) for r in rotors_list], dtype=np.uint8)
+    reflector = compiled_enigma.reflector_array(em.reflector)
+    notches = em.rotorcase.notches()
+    rng = np.random.default_rng(0)
+    positions, ring_settings = rng.integers(0, 26, (50, 4)), rng.integers(0, 26, (50, 4))
+    letters = compiled_enigma.message2array("NOWISTHETIMEFORALLGOODMENTOCOMETOTHEAIDOFTHEPARTY")
+    cache = ScramblerTableCache(max_entries=2)
+    for plugleads in [[], ["AB", "CD"], ["QW", "ER", "TY", "UI", "OP", "AS", "DF", "GH", "JK", "LZ"]]:
+        em.configure({"plugleads": plugleads})
+        plugboard = compiled_enigma.plugboard_array(em.plugboard)
+        tables = cache.get("tables", lambda: compiled_enigma.candidate_scrambler_tables(
+            forward, backward, reflector, notches, positions, ring_settings, len(letters)))
+        expected = compiled_enigma.decode_candidates(forward, backward, reflector, notches, plugboard, positions,
+                                                     ring_settings, letters)
+        assert (compiled_enigma.decode_with_tables(tables, plugboard, letters).tolist() == expected.tolist())
+        rows, columns = rng.integers(0, 50, 30), rng.integers(0, len(letters), 30)
+        assert (compiled_enigma.decode_with_tables(tables, plugboard, letters, rows, columns).tolist() ==
+                expected[rows, columns].tolist())
+    assert (cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1)
+
+    # Least recently used eviction, size bound and statistics
+    cache = ScramblerTableCache(max_entries=3, max_bytes=1000)
+    for key in [0, 1, 2, 0, 3, 1, 0]:
+        cache.get(key, lambda: np.zeros(100, dtype=np.uint8))
+    # 0 miss, 1 miss, 2 miss, 0 hit, 3 miss (evicts 1), 1 miss (evicts 2), 0 hit
+    assert (cache.stats() == {"hits": 2, "misses": 5, "evictions": 2, "entries": 3, "bytes": 300, "hit_rate": 2 / 7})
+    assert (0 in cache and 1 in cache and 3 in cache and 2 not in cache)
+    cache.get(4, lambda: np.zeros(800, dtype=np.uint8))
+    assert (list(cache.stats().values())[2:5] == [3, 3, 1000] and 4 in cache and 3 not in cache)
+    cache.get(5, lambda: np.zeros(2000, dtype=np.uint8))   # too large to be kept
+    assert (5 not in cache and len(cache) == 3 and cache.fits(3, 1000) and not cache.fits(4, 1000))
+    copy = pickle.loads(pickle.dumps(cache))
+    assert (len(copy) == 0 and copy.num_bytes == 0 and copy.misses == cache.misses)
+    print("Scrambler cache tests passed")
@@ -0,0 +1,218 @@
+import collections
+import contextlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:     # not available on Windows: the peak resident memory is not reported
+    resource = None
+
+# Context manager which does nothing, used for the stages of a search without metrics
+NO_STAGE = contextlib.nullcontext()
+
+
+# Instrumentation of a code breaking search (see CodeBreaking.metrics): counters, time spent in each stage of the
+# search, progress reports, an optional sampling profiler and peak memory tracking.
+# progress_callback(snapshot) is called and a JSON line written to jsonl_path (if given) at most every
+# progress_interval seconds and when the search finishes.
+# profile_interval = seconds between two samples of the stack of the searching thread (None = no profiler), each sample
+# counts the function being run and is passed to profile_hook(frame) if given.
+# track_memory = trace the Python memory allocations (tracemalloc) to report their peak, this slows the search down.
+# A copy in a worker process sends its measurements to relay_queue (if set) instead of reporting them, the process
+# which started the search adds them with receive and reports the progress of all the workers.
+class SearchMetrics:
+
+    def __init__(self, progress_callback=None, jsonl_path=None, progress_interval=1.0, profile_interval=None,
+                 profile_hook=None, track_memory=False):
+        self.progress_callback = progress_callback
+        self.jsonl_path = jsonl_path
+        self.progress_interval = progress_interval
+        self.profile_interval = profile_interval
+        self.profile_hook = profile_hook
+        self.track_memory = track_memory
+        self.counters = collections.Counter()
+        self.timers = collections.Counter()     # seconds spent in each stage
+        self.profile = collections.Counter()    # samples of each function
+        self.total_candidates = 0
+        self.relay_queue = None
+        self.__relayed = (collections.Counter(), collections.Counter(), collections.Counter())
+        self.__t_start = None
+        self.__last_report = 0
+        self.__sampler = None
+        self.__sampling = False
+
+    # Start measuring a search of total_candidates candidates, the measurements of a previous search are cleared
+    def start(self, total_candidates):
+        self.reset()
+        self.total_candidates = total_candidates
+        self.__t_start = self.__last_report = time.perf_counter()
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile_interval is not None:
+            self.__sampling = True
+            self.__sampler = threading.Thread(target=self.__sample, args=(threading.get_ident(),), daemon=True)
+            self.__sampler.start()
+
+    # Stop measuring, report the final snapshot and return it
+    def finish(self):
+        if self.__sampler is not None:
+            self.__sampling = False
+            self.__sampler.join()
+            self.__sampler = None
+        snapshot = self.snapshot()
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.__report("finish", snapshot)
+        return snapshot
+
+    # Context manager which adds the time spent in the "with" block to the stage timer
+    @contextlib.contextmanager
+    def stage(self, name):
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - t_start
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    # Record a searched batch of num_candidates candidates and report the progress (or relay the measurements) if
+    # progress_interval has elapsed
+    def batch_done(self, num_candidates):
+        self.counters["batches"] += 1
+        self.counters["candidates"] += num_candidates
+        if self.__progress_due():
+            if self.relay_queue is not None:
+                self.relay()
+            else:
+                self.__report("progress", self.snapshot())
+
+    # Clear the counters, timers and profile samples
+    def reset(self):
+        for measured in (self.counters, self.timers, self.profile) + self.__relayed:
+            measured.clear()
+
+    # Send the counters, timers and profile samples measured since the previous call to relay_queue
+    def relay(self):
+        measured = (self.counters, self.timers, self.profile)
+        self.relay_queue.put(tuple(dict(current - relayed) for current, relayed in zip(measured, self.__relayed)))
+        self.__relayed = tuple(collections.Counter(current) for current in measured)
+
+    # Add the measurements relayed by the workers to relay_queue (see relay) and report the progress if
+    # progress_interval has elapsed
+    def receive(self, relay_queue):
+        while True:
+            try:
+                counters, timers, profile = relay_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.merge(counters, timers, profile)
+        if self.__progress_due():
+            self.__report("progress", self.snapshot())
+
+    # True (once) every progress_interval seconds
+    def __progress_due(self):
+        if time.perf_counter() - self.__last_report < self.progress_interval:
+            return False
+        self.__last_report = time.perf_counter()
+        return True
+
+    # Add the counters and timers measured by another SearchMetrics (e.g. in a worker process)
+    def merge(self, counters, timers, profile):
+        self.counters.update(counters)
+        self.timers.update(timers)
+        self.profile.update(profile)
+
+    # Dictionary with the current state of the search
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.__t_start if self.__t_start is not None else 0.0
+        candidates = self.counters["candidates"]
+        snapshot = {"elapsed": elapsed,
+                    "candidates": candidates,
+                    "total_candidates": self.total_candidates,
+                    "progress": candidates / self.total_candidates if self.total_candidates > 0 else 1.0,
+                    "candidates_per_second": candidates / elapsed if elapsed > 0 else 0.0,
+                    "counters": dict(self.counters),
+                    "timers": dict(self.timers)}
+        if resource is not None:
+            # kilobytes on Linux, bytes on macOS
+            snapshot["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if self.track_memory and tracemalloc.is_tracing():
+            snapshot["peak_traced_memory"] = tracemalloc.get_traced_memory()[1]
+        if self.profile:
+            snapshot["profile"] = dict(self.profile.most_common(10))
+        return snapshot
+
+    def __report(self, event, snapshot):
+        if self.progress_callback is not None:
+            self.progress_callback(snapshot)
+        if self.jsonl_path is not None:
+            with open(self.jsonl_path, 'a') as file:
+                file.write(json.dumps(dict(snapshot, event=event, time=time.time())) + "\n")
+
+    # Sampling profiler thread: count the function run by the searching thread every profile_interval seconds
+    def __sample(self, thread_id):
+        while self.__sampling:
+            time.sleep(self.profile_interval)
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            self.profile[f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"] += 1
+            if self.profile_hook is not None:
+                self.profile_hook(frame)
+
+    # The callbacks, the profiler thread and the output file stay in the process which created the metrics:
+    # a copy sent to a worker process only collects counters, timers and profile samples (see merge)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["progress_callback"] = None
+        state["profile_hook"] = None
+        state["jsonl_path"] = None
+        state["_SearchMetrics__sampler"] = None
+        state["_SearchMetrics__sampling"] = False
+        return state
+
+
+if __name__ == '__main__':
+    import pickle
+    import tempfile
+
+    snapshots = []
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl_path = os.path.join(directory, "metrics.jsonl")
+        metrics = SearchMetrics(snapshots.append, jsonl_path, progress_interval=0, profile_interval=0.001)
+        metrics.start(100)
+        for _ in range(10):
+            with metrics.stage("decode"):
+                time.sleep(0.002)
+            metrics.batch_done(10)
+        # a copy in a worker process only relays its own measurements
+        copy = pickle.loads(pickle.dumps(metrics))
+        copy.reset()
+        copy.relay_queue = queue.Queue()
+        copy.count("scored", 5)
+        copy.batch_done(0)
+        copy.count("scored", 2)
+        copy.relay()
+        metrics.receive(copy.relay_queue)
+        final = metrics.finish()
+        with open(jsonl_path) as file:
+            records = [json.loads(line) for line in file]
+    # one progress report for each batch and for the relayed measurements, then the final one
+    assert (len(snapshots) == 12 and len(records) == 12 and records[-1]["event"] == "finish")
+    assert (final["candidates"] == 100 and final["progress"] == 1.0 and final["counters"]["scored"] == 7)
+    assert (final["counters"]["batches"] == 11)
+    assert (final["timers"]["decode"] >= 0.02 and final["candidates_per_second"] > 0)
+    assert (sum(final["profile"].values()) > 0)
+    # a new search starts from zero
+    metrics.jsonl_path = None
+    metrics.start(10)
+    metrics.batch_done(10)
+    assert (metrics.finish()["progress"] == 1.0 and "scored" not in metrics.counters)
+    print("Search metrics tests passed")
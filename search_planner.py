@@ -0,0 +1,121 @@
+import itertools
+import math
+import time
+
+# Loops of the code breaking search which reconfigure the machine (in the default order, from the outermost loop).
+# The rotor positions/ring settings candidates are always searched in the innermost loop.
+SEARCH_LOOPS = ("plugboard", "reflector", "rotors")
+
+# brute_force = decode each candidate with the Enigma Machine objects, batched = decode batches of candidates with
+# integer arrays, hill_climbing = rank the candidates without the unknown plug leads and recover them by hill climbing
+# (heuristic, see CodeBreaking.break_code_hill_climbing)
+SEARCH_STRATEGIES = ("brute_force", "batched", "hill_climbing")
+
+# Number of plugboards scored at each hill climbing step (one move for each pair of letters)
+HILL_CLIMBING_NEIGHBOURS = 325
+
+
+# Plan of a code breaking search: strategy, loop order and estimated time (seconds)
+class SearchPlan:
+
+    def __init__(self, strategy, loop_order, loop_sizes, num_candidates, estimated_time):
+        self.strategy = strategy
+        self.loop_order = tuple(loop_order)
+        self.loop_sizes = dict(loop_sizes)
+        self.num_candidates = num_candidates    # rotor positions/ring settings candidates searched in each unit
+        self.estimated_time = estimated_time
+
+    def __str__(self):
+        loops = " > ".join(f"{name} ({self.loop_sizes[name]})" for name in self.loop_order)
+        return (f"Search plan: {self.strategy}, loops {loops} > rotor positions/ring settings ({self.num_candidates}), "
+                f"estimated time {round(self.estimated_time, 3)} seconds")
+
+
+# Shortest time (seconds) of "repeat" calls of function
+def measure_cost(function, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - t_start)
+    return best
+
+
+# Number of times each loop reconfigures the machine. A loop only reconfigures the machine when its value changes, so a
+# loop with a single value configures it once.
+def reconfiguration_counts(loop_order, loop_sizes):
+    counts = {}
+    outer = 1
+    for name in loop_order:
+        outer *= loop_sizes[name]
+        counts[name] = outer if loop_sizes[name] > 1 else 1
+    return counts
+
+
+# Estimated time (seconds) of a search with the given strategy and loop order.
+# costs = calibrated times (seconds) of: "reconfigure_<loop>" = one reconfiguration of each loop, "batch" = fixed
+# cost of decoding one batch, "batched_candidate" = decoding one candidate in a batch, "brute_force_candidate" =
+# decoding one candidate with the machine objects.
+# max_leads = number of plug leads, only used to estimate the hill climbing steps.
+# Hill climbing only applies the fully known plug leads while ranking the candidates: its plugboard loop has size 1
+def estimate_time(strategy, loop_order, loop_sizes, num_candidates, costs, batch_size, hill_climbing_candidates,
+                  max_leads):
+    counts = reconfiguration_counts(loop_order, loop_sizes)
+    num_units = math.prod(loop_sizes.values())
+    total = sum(costs["reconfigure_" + name] * counts[name] for name in loop_order)
+    if strategy == "brute_force":
+        return total + num_units * num_candidates * costs["brute_force_candidate"]
+    batches = num_units * math.ceil(num_candidates / batch_size)
+    total += batches * costs["batch"] + num_units * num_candidates * costs["batched_candidate"]
+    if strategy == "hill_climbing":
+        # each climb adds or moves about one lead per step, first on the index of coincidence and then on the scorer
+        steps = 2 * (max_leads + 1)
+        total += (min(hill_climbing_candidates, num_units * num_candidates) * steps * HILL_CLIMBING_NEIGHBOURS *
+                  costs["batched_candidate"])
+    return total
+
+
+# Choose the strategy and loop order with the shortest estimated time.
+# strategies = strategies to choose from, loop_order = fixed loop order (None = try all the orders).
+# Returns a SearchPlan; on equal estimates the first strategy and the default loop order are kept.
+def plan_search(loop_sizes, num_candidates, costs, strategies, batch_size, hill_climbing_candidates, max_leads,
+                loop_order=None):
+    loop_orders = [loop_order] if loop_order is not None else list(itertools.permutations(SEARCH_LOOPS))
+    best_plan = None
+    for strategy in strategies:
+        if strategy not in SEARCH_STRATEGIES:
+            raise ValueError(f"Search strategy {strategy} does not exist")
+        sizes = dict(loop_sizes, plugboard=1) if strategy == "hill_climbing" else loop_sizes
+        for order in loop_orders:
+            if sorted(order) != sorted(SEARCH_LOOPS):
+                raise ValueError(f"Loop order must be a permutation of {SEARCH_LOOPS}")
+            estimate = estimate_time(strategy, order, sizes, num_candidates, costs, batch_size,
+                                     hill_climbing_candidates, max_leads)
+            # ignore the rounding differences between equivalent orders
+            if best_plan is None or estimate < best_plan.estimated_time * (1 - 1e-9):
+                best_plan = SearchPlan(strategy, order, sizes, num_candidates, estimate)
+    return best_plan
+
+
+if __name__ == '__main__':
+    costs = {"reconfigure_plugboard": 1e-5, "reconfigure_reflector": 5e-5, "reconfigure_rotors": 1e-4,
+             "batch": 1e-4, "batched_candidate": 1e-6, "brute_force_candidate": 1e-4}
+    sizes = {"plugboard": 1000, "reflector": 3, "rotors": 60}
+    assert (reconfiguration_counts(SEARCH_LOOPS, sizes) == {"plugboard": 1000, "reflector": 3000, "rotors": 180000})
+    assert (reconfiguration_counts(SEARCH_LOOPS, dict(sizes, plugboard=1))["plugboard"] == 1)
+    # The most expensive reconfiguration goes to the outermost loop
+    plan = plan_search(sizes, 1, costs, ["brute_force", "batched"], 4096, 20, 10)
+    assert (plan.loop_order == ("rotors", "reflector", "plugboard") and plan.strategy == "brute_force")
+    # Many candidates are decoded faster in batches
+    plan = plan_search(sizes, 17576, costs, ["brute_force", "batched"], 4096, 20, 10)
+    assert (plan.strategy == "batched")
+    # A fixed order is kept, equivalent orders keep the default one
+    plan = plan_search(sizes, 1, costs, ["batched"], 4096, 20, 10, loop_order=SEARCH_LOOPS)
+    assert (plan.loop_order == SEARCH_LOOPS)
+    plan = plan_search({"plugboard": 1, "reflector": 1, "rotors": 1}, 100, costs, ["batched"], 4096, 20, 10)
+    assert (plan.loop_order == SEARCH_LOOPS)
+    # Hill climbing avoids enumerating a large plugboard
+    plan = plan_search(dict(sizes, plugboard=10 ** 9), 17576, costs, ["batched", "hill_climbing"], 4096, 20, 10)
+    assert (plan.strategy == "hill_climbing")
+    print(plan)
+    print("Search planner tests passed")
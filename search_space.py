@@ -0,0 +1,394 @@
+import math
+import random
+import numpy as np
+import search_planner
+import utility
+from reflector import get_wiring_by_ReflectorType, reflectorType_from_name
+
+PLUGBOARD_CONTACTS = tuple(chr(x) for x in range(65, 65 + 26))
+
+
+# Indexable search space of a code breaking search. Every key (rotors, rotor positions, ring settings, reflector,
+# reflector wiring swaps, plug leads) satisfying the constraints has an index in range(num_keys):
+#   index = unit index * num_candidates + candidate
+#   candidate = rotor positions index * num_ring_settings + ring settings index
+# where the unit index enumerates the plugboard, reflector (with its wiring) and rotors loops nested in loop_order
+# (outermost first). Keys are computed from their index (and back) without enumerating the space, so memory does not
+# depend on its size.
+# rotor_orders = allowed rotors (tuples from the leftmost rotor), positions/ring_settings = allowed values of each rotor
+# (from the leftmost rotor, in enumeration order), reflectors = allowed reflector names, reflector_pairs_to_swap =
+# number of reflector wires swapped (even), plugboard_connection = plug leads constraints, e.g. ["AB", "C?", "??"].
+# A key is a dictionary {"rotors", "positions", "ring_settings", "reflector", "reflector_swaps", "plugleads"} where
+# reflector_swaps are the pairs of reflector contacts whose wires are swapped (see swap_reflector_wiring).
+class SearchSpace:
+
+    def __init__(self, rotor_orders, positions, ring_settings, reflectors, reflector_pairs_to_swap=0,
+                 plugboard_connection=(), loop_order=search_planner.SEARCH_LOOPS):
+        if reflector_pairs_to_swap % 2 == 1:
+            raise ValueError("Pairs of contacts to swap must be an even number")
+        if sorted(loop_order) != sorted(search_planner.SEARCH_LOOPS):
+            raise ValueError(f"Loop order must be a permutation of {search_planner.SEARCH_LOOPS}")
+        self.rotor_orders = [tuple(rotors) for rotors in rotor_orders]
+        self.positions = [list(values) for values in positions]
+        self.ring_settings = [list(values) for values in ring_settings]
+        self.reflectors = list(reflectors)
+        self.reflector_pairs_to_swap = reflector_pairs_to_swap
+        self.plugboard_connection = list(plugboard_connection)
+        self.loop_order = tuple(loop_order)
+        # Reflector wires (identified by the contact receiving the input letter) which can be swapped
+        self.__reflector_contacts = {name: reflector_wire_contacts(get_wiring_by_ReflectorType(reflectorType_from_name(name)))
+                                     for name in self.reflectors}
+        # Plugboard: contacts of the half defined plug leads, then pairs of the undefined plug leads from the others
+        known_letters = set("".join(self.plugboard_connection)) - {"?"}
+        self.__free_plugs = [plug for plug in PLUGBOARD_CONTACTS if plug not in known_letters]
+        self.__half_terms = [lead for lead in self.plugboard_connection if "?" in lead and lead != "??"]
+        self.__num_full_pairs = self.plugboard_connection.count("??")
+        num_half = len(self.__half_terms)
+        self.__num_half_combinations = math.comb(len(self.__free_plugs), num_half)
+        self.__num_full_pairings = full_pair_combination_num(len(self.__free_plugs) - num_half, self.__num_full_pairs)
+        self.num_plugboards = self.__num_half_combinations * self.__num_full_pairings * math.factorial(num_half)
+        self.num_reflector_wirings = (math.comb(13, reflector_pairs_to_swap) *
+                                      full_pair_combination_num(reflector_pairs_to_swap, reflector_pairs_to_swap // 2))
+        self.loop_sizes = {"plugboard": self.num_plugboards,
+                           "reflector": len(self.reflectors) * self.num_reflector_wirings,
+                           "rotors": len(self.rotor_orders)}
+        self.num_units = math.prod(self.loop_sizes.values())
+        self.num_positions = math.prod(len(values) for values in self.positions)
+        self.num_ring_settings = math.prod(len(values) for values in self.ring_settings)
+        self.num_candidates = self.num_positions * self.num_ring_settings
+        self.num_keys = self.num_units * self.num_candidates
+
+    # Copy of the search space with some of the constructor arguments changed, e.g. replace(loop_order=...)
+    def replace(self, **changes):
+        return SearchSpace(**dict(self.constraints(), **changes))
+
+    # Constructor arguments of the search space
+    def constraints(self):
+        return {"rotor_orders": self.rotor_orders, "positions": self.positions, "ring_settings": self.ring_settings,
+                "reflectors": self.reflectors, "reflector_pairs_to_swap": self.reflector_pairs_to_swap,
+                "plugboard_connection": self.plugboard_connection, "loop_order": self.loop_order}
+
+    # Key of an index in range(num_keys)
+    def key(self, index):
+        if not 0 <= index < self.num_keys:
+            raise ValueError(f"Index {index} is out of the search space (0 - {self.num_keys - 1})")
+        unit_idx, candidate = divmod(index, self.num_candidates)
+        plugleads, reflector, reflector_swaps, rotors = self.unit(unit_idx)
+        positions, ring_settings = self.candidate(candidate)
+        return {"rotors": rotors, "positions": positions, "ring_settings": ring_settings, "reflector": reflector,
+                "reflector_swaps": reflector_swaps, "plugleads": plugleads}
+
+    # Index of a key of the search space (ValueError if the key is not in the search space)
+    def index(self, key):
+        unit_idx = self.unit_index(key["plugleads"], key["reflector"], key["reflector_swaps"], key["rotors"])
+        candidate = self.candidate_index(key["positions"], key["ring_settings"])
+        return unit_idx * self.num_candidates + candidate
+
+    # Generator of the keys of the indices from start to stop (excluded, None = end of the search space)
+    def keys(self, start=0, stop=None):
+        for index in range(start, self.num_keys if stop is None else stop):
+            yield self.key(index)
+
+    # Key drawn uniformly from the search space
+    def sample(self, rng=random):
+        return self.key(rng.randrange(self.num_keys))
+
+    # (plug leads, reflector name, reflector wiring swaps, rotors) of a unit index in range(num_units)
+    def unit(self, unit_idx):
+        digits = dict(zip(self.loop_order, mixed_radix_unrank([self.loop_sizes[name] for name in self.loop_order],
+                                                              unit_idx)))
+        reflector_idx, wiring_idx = divmod(digits["reflector"], self.num_reflector_wirings)
+        reflector = self.reflectors[reflector_idx]
+        return (self.plugleads(digits["plugboard"]), reflector, self.reflector_swaps(reflector, wiring_idx),
+                self.rotor_orders[digits["rotors"]])
+
+    # Index of a unit in the enumeration order of the default loop order (search_planner.SEARCH_LOOPS), which identifies
+    # the unit whatever the loop order of the search space
+    def canonical_unit_index(self, unit_idx):
+        digits = dict(zip(self.loop_order, mixed_radix_unrank([self.loop_sizes[name] for name in self.loop_order],
+                                                              unit_idx)))
+        return mixed_radix_rank([self.loop_sizes[name] for name in search_planner.SEARCH_LOOPS],
+                                [digits[name] for name in search_planner.SEARCH_LOOPS])
+
+    def unit_index(self, plugleads, reflector, reflector_swaps, rotors):
+        digits = {"plugboard": self.plugleads_index(plugleads),
+                  "reflector": (self.reflectors.index(reflector) * self.num_reflector_wirings +
+                                self.reflector_swaps_index(reflector, reflector_swaps)),
+                  "rotors": self.rotor_orders.index(tuple(rotors))}
+        return mixed_radix_rank([self.loop_sizes[name] for name in self.loop_order],
+                                [digits[name] for name in self.loop_order])
+
+    # (rotor positions, ring settings) of a candidate in range(num_candidates)
+    def candidate(self, candidate):
+        pos_idx, setting_idx = divmod(candidate, self.num_ring_settings)
+        return (tuple(values[digit] for values, digit in
+                      zip(self.positions, mixed_radix_unrank([len(values) for values in self.positions], pos_idx))),
+                tuple(values[digit] for values, digit in
+                      zip(self.ring_settings, mixed_radix_unrank([len(values) for values in self.ring_settings],
+                                                                 setting_idx))))
+
+    def candidate_index(self, positions, ring_settings):
+        pos_idx = mixed_radix_rank([len(values) for values in self.positions],
+                                   [values.index(value) for values, value in zip(self.positions, positions)])
+        setting_idx = mixed_radix_rank([len(values) for values in self.ring_settings],
+                                       [values.index(value) for values, value in zip(self.ring_settings, ring_settings)])
+        return pos_idx * self.num_ring_settings + setting_idx
+
+    # Rotor positions and ring settings of an array of candidates as integer arrays ordered from the rightmost rotor
+    # (positions and ring settings 0 - 25)
+    def candidate_arrays(self, candidates):
+        pos_idx, setting_idx = np.divmod(np.asarray(candidates, dtype=np.int64), self.num_ring_settings)
+        pos_arr = candidate_digits(pos_idx, [[ord(value) - 65 for value in values] for values in self.positions])
+        ring_arr = candidate_digits(setting_idx, [[value - 1 for value in values] for values in self.ring_settings])
+        return pos_arr, ring_arr
+
+    # Candidates of arrays of rotor positions and ring settings ordered from the rightmost rotor (see candidate_arrays)
+    def candidate_indices(self, pos_arr, ring_arr):
+        pos_idx = candidate_digits_index(pos_arr, [[ord(value) - 65 for value in values] for values in self.positions])
+        setting_idx = candidate_digits_index(ring_arr, [[value - 1 for value in values] for values in self.ring_settings])
+        return pos_idx * self.num_ring_settings + setting_idx
+
+    # Plug leads of a plugboard index in range(num_plugboards), in the order of code_breaking.plugboard_combinations_gen
+    def plugleads(self, plugboard_idx):
+        num_half = len(self.__half_terms)
+        combination_idx, permutation_idx = divmod(plugboard_idx, math.factorial(num_half))
+        half_idx, full_idx = divmod(combination_idx, self.__num_full_pairings)
+        half_plugs = combination_unrank(self.__free_plugs, num_half, half_idx)
+        full_pairs = iter(pairing_unrank([plug for plug in self.__free_plugs if plug not in half_plugs],
+                                         self.__num_full_pairs, full_idx))
+        half_plugs = iter(permutation_unrank(half_plugs, permutation_idx))
+        return ["".join(next(full_pairs)) if lead == "??" else lead.replace("?", next(half_plugs)) if "?" in lead
+                else lead for lead in self.plugboard_connection]
+
+    def plugleads_index(self, plugleads):
+        if len(plugleads) != len(self.plugboard_connection):
+            raise ValueError("The plug leads do not match the plug board constraints")
+        half_plugs = []
+        full_pairs = []
+        for constraint, lead in zip(self.plugboard_connection, plugleads):
+            if constraint == "??":
+                full_pairs.append(tuple(lead))
+            elif "?" in constraint:
+                half_plugs.append(lead[constraint.index("?")])
+            elif lead != constraint:
+                raise ValueError(f"Plug lead {lead} does not match the constraint {constraint}")
+        half_combination = tuple(plug for plug in self.__free_plugs if plug in half_plugs)
+        half_idx = combination_rank(self.__free_plugs, half_combination)
+        full_idx = pairing_rank([plug for plug in self.__free_plugs if plug not in half_plugs], full_pairs)
+        permutation_idx = permutation_rank(half_combination, half_plugs)
+        return (half_idx * self.__num_full_pairings + full_idx) * math.factorial(len(half_plugs)) + permutation_idx
+
+    # Pairs of swapped wires of a reflector wiring index in range(num_reflector_wirings), in the order of
+    # code_breaking.reflector_wiring_comb_gen
+    def reflector_swaps(self, reflector, wiring_idx):
+        n = self.reflector_pairs_to_swap
+        combination_idx, pairing_idx = divmod(wiring_idx, full_pair_combination_num(n, n // 2))
+        return pairing_unrank(combination_unrank(self.__reflector_contacts[reflector], n, combination_idx), n // 2,
+                              pairing_idx)
+
+    def reflector_swaps_index(self, reflector, reflector_swaps):
+        n = self.reflector_pairs_to_swap
+        contacts = self.__reflector_contacts[reflector]
+        combination = tuple(contact for contact in contacts if any(contact in pair for pair in reflector_swaps))
+        if len(combination) != n or len(reflector_swaps) != n // 2:
+            raise ValueError(f"{n} reflector wires must be swapped")
+        return (combination_rank(contacts, combination) * full_pair_combination_num(n, n // 2) +
+                pairing_rank(combination, reflector_swaps))
+
+    # Reflector wiring of a reflector with the wires of reflector_swaps swapped
+    def reflector_wiring(self, reflector, reflector_swaps):
+        return swap_reflector_wiring(get_wiring_by_ReflectorType(reflectorType_from_name(reflector)), reflector_swaps)
+
+
+# Contiguous range (start, stop) of the items of shard in range(num_shards), the shards have the same size +- 1
+def shard_range(num_items, shard, num_shards):
+    return num_items * shard // num_shards, num_items * (shard + 1) // num_shards
+
+
+# Digits (most significant first) of an index in a mixed radix system
+def mixed_radix_unrank(radices, index):
+    digits = []
+    for radix in reversed(radices):
+        index, digit = divmod(index, radix)
+        digits.append(digit)
+    return digits[::-1]
+
+
+def mixed_radix_rank(radices, digits):
+    index = 0
+    for radix, digit in zip(radices, digits):
+        index = index * radix + digit
+    return index
+
+
+# Values of the digits of an array of indices in the mixed radix system of the allowed values of each rotor, as an
+# integer array ordered from the rightmost rotor
+def candidate_digits(indices, values):
+    out = np.empty((len(indices), len(values)), dtype=np.intp)
+    for column, rotor_values in enumerate(reversed(values)):
+        indices, digits = np.divmod(indices, len(rotor_values))
+        out[:, column] = np.asarray(rotor_values, dtype=np.intp)[digits]
+    return out
+
+
+# Indices in the mixed radix system of the allowed values of each rotor of an integer array of values ordered from the
+# rightmost rotor (inverse of candidate_digits)
+def candidate_digits_index(arr, values):
+    indices = np.zeros(len(arr), dtype=np.int64)
+    for idx, rotor_values in enumerate(values):
+        lookup = np.full(26, -1, dtype=np.int64)
+        lookup[rotor_values] = np.arange(len(rotor_values))
+        indices = indices * len(rotor_values) + lookup[np.asarray(arr)[:, len(values) - 1 - idx]]
+    return indices
+
+
+# Combination of k items with the given index in itertools.combinations(items, k) and back
+def combination_unrank(items, k, index):
+    combination = []
+    start = 0
+    for position in range(k):
+        for idx in range(start, len(items)):
+            count = math.comb(len(items) - idx - 1, k - position - 1)
+            if index < count:
+                break
+            index -= count
+        combination.append(items[idx])
+        start = idx + 1
+    return tuple(combination)
+
+
+def combination_rank(items, combination):
+    index = 0
+    start = 0
+    for position, item in enumerate(combination):
+        idx = items.index(item)
+        index += sum(math.comb(len(items) - skipped - 1, len(combination) - position - 1) for skipped in range(start, idx))
+        start = idx + 1
+    return index
+
+
+# Permutation of items with the given index in itertools.permutations(items) and back
+def permutation_unrank(items, index):
+    items = list(items)
+    permutation = []
+    while items:
+        idx, index = divmod(index, math.factorial(len(items) - 1))
+        permutation.append(items.pop(idx))
+    return tuple(permutation)
+
+
+def permutation_rank(items, permutation):
+    items = list(items)
+    index = 0
+    for item in permutation:
+        idx = items.index(item)
+        index += idx * math.factorial(len(items) - 1)
+        items.pop(idx)
+    return index
+
+
+# Pairing of n pairs of contacts with the given index in code_breaking.full_pair_combination_gen(contacts, n) and
+# back. The pairings are ordered by their first pair, then by the next ones: the first contacts of the pairs are
+# increasing and the pairings starting with a given pair are counted with full_pair_combination_num
+def pairing_unrank(contacts, n, index):
+    following = list(contacts)     # free contacts after the first contact of the previous pair
+    pairs = []
+    for num_pairs in range(n, 0, -1):
+        for first_idx in range(len(following)):
+            after_first = following[first_idx + 1:]
+            count = full_pair_combination_num(len(after_first) - 1, num_pairs - 1)
+            if index < count * len(after_first):
+                second_idx, index = divmod(index, count)
+                pairs.append((following[first_idx], after_first[second_idx]))
+                following = after_first[:second_idx] + after_first[second_idx + 1:]
+                break
+            index -= count * len(after_first)
+    return tuple(pairs)
+
+
+def pairing_rank(contacts, pairs):
+    following = list(contacts)
+    index = 0
+    for num_pairs, (first, second) in zip(range(len(pairs), 0, -1), pairs):
+        first_idx = following.index(first)
+        for skipped in range(first_idx):
+            index += full_pair_combination_num(len(following) - skipped - 2, num_pairs - 1) * (len(following) - skipped - 1)
+        after_first = following[first_idx + 1:]
+        second_idx = after_first.index(second)
+        index += second_idx * full_pair_combination_num(len(after_first) - 1, num_pairs - 1)
+        following = after_first[:second_idx] + after_first[second_idx + 1:]
+    return index
+
+
+# Number of pairings of n pairs from num_contacts contacts: the 2n contacts used, paired up
+def full_pair_combination_num(num_contacts, n):
+    if n < 0 or 2 * n > num_contacts:
+        return 0
+    return math.comb(num_contacts, 2 * n) * utility.doubleFactorial(2 * n - 1)
+
+
+# Reflector wires which can be swapped, each identified by the contact receiving the input letter, in wiring order
+def reflector_wire_contacts(std_wiring):
+    contacts = []
+    for left_contact, right_contact in std_wiring:
+        if left_contact not in contacts:
+            contacts.append(right_contact)
+    return contacts
+
+
+# Reflector wiring (list of (contact, contact) connections indexed by the second contact) with the wires of each pair
+# of right contacts swapped: e.g. wires A-Y and B-R become A-R and B-Y
+def swap_reflector_wiring(std_wiring, right_contact_pairs):
+    new_wiring = list(std_wiring)
+    for pair in right_contact_pairs:
+        # Find the correspondent left contacts and swap them
+        left_contacts = [y for (y, x) in std_wiring if x in pair]
+        for left_contact, right_contact in zip((left_contacts[1], left_contacts[0]), pair):
+            idx = ord(right_contact) - 65
+            assert (right_contact != new_wiring[idx][0])
+            new_wiring[idx] = (left_contact, right_contact)
+            new_wiring[ord(left_contact) - 65] = (right_contact, left_contact)
+    return new_wiring
+
+
+if __name__ == '__main__':
+    import itertools
+
+    letters = "ABCDEFG"
+    for k in range(len(letters) + 1):
+        for index, combination in enumerate(itertools.combinations(letters, k)):
+            assert (combination_unrank(letters, k, index) == combination and combination_rank(letters, combination) == index)
+    for index, permutation in enumerate(itertools.permutations("ABCD")):
+        assert (permutation_unrank("ABCD", index) == permutation and permutation_rank("ABCD", permutation) == index)
+    for n in range(4):
+        pairings = [pairing for pairing in itertools.combinations(itertools.combinations(letters, 2), n)
+                    if len(set(itertools.chain(*pairing))) == 2 * n]
+        assert (full_pair_combination_num(len(letters), n) == len(pairings))
+        for index, pairing in enumerate(pairings):
+            assert (pairing_unrank(letters, n, index) == pairing and pairing_rank(letters, pairing) == index)
+
+    # Every index maps to a key and back, the keys are all different and satisfy the constraints
+    space = SearchSpace([("I", "II", "III"), ("II", "I", "III")], [["A"], ["B", "C"], ["Z"]], [[1], [2], [3, 4, 5]],
+                        ["B", "C"], 2, ["AB", "C?", "??"], loop_order=("rotors", "plugboard", "reflector"))
+    assert (space.num_keys == 2 * 2 * 3 * 2 * 78 * 23 * 231)
+    rng = random.Random(0)
+    for index in [0, 1, space.num_keys - 1] + [rng.randrange(space.num_keys) for _ in range(500)]:
+        key = space.key(index)
+        assert (space.index(key) == index and key["plugleads"][0] == "AB" and key["plugleads"][1][0] == "C")
+    assert (len({str(key) for key in space.keys(1000, 3000)}) == 2000)
+    default_space = space.replace(loop_order=search_planner.SEARCH_LOOPS)
+    for unit_idx in [0, space.num_units - 1] + [rng.randrange(space.num_units) for _ in range(100)]:
+        assert (space.canonical_unit_index(unit_idx) == default_space.unit_index(*space.unit(unit_idx)))
+    assert (space.index(space.sample(rng)) < space.num_keys)
+    # 10 unknown plug leads, 4 rotors: the space is never enumerated
+    space = SearchSpace([("Beta", "I", "II", "III")], [PLUGBOARD_CONTACTS] * 4, [list(range(1, 27))] * 4, ["B"], 4,
+                        ["??"] * 10)
+    assert (space.num_plugboards == 150738274937250 and space.num_candidates == 26 ** 8)
+    key = space.sample(rng)
+    assert (space.index(key) < space.num_keys and space.key(space.index(key)) == key)
+    pos_arr, ring_arr = space.candidate_arrays(np.array([0, 26 ** 4 + 1]))
+    assert (pos_arr.tolist() == [[0, 0, 0, 0], [1, 0, 0, 0]] and ring_arr.tolist() == [[0, 0, 0, 0], [1, 0, 0, 0]])
+    candidates = np.array([rng.randrange(space.num_candidates) for _ in range(100)])
+    assert ((space.candidate_indices(*space.candidate_arrays(candidates)) == candidates).all())
+    assert ([shard_range(10, shard, 3) for shard in range(3)] == [(0, 3), (3, 6), (6, 10)])
+    print("Search space tests passed")
@@ -0,0 +1,121 @@
+import numpy as np
+from multiprocessing import shared_memory
+import compiled_enigma
+
+
+# Read-only store of the scrambler tables of every rotor state (see compiled_enigma.state_scrambler_tables) of several
+# machine configurations, in a single shared memory block.
+# configurations = dictionary key -> (forward rotor wirings, backward rotor wirings, reflector), the key is any
+# hashable description of the rotor order and reflector wiring (e.g. (rotor names, reflector bytes)).
+# The tables are indexed by the rotor offsets (position - ring setting), so one table serves every rotor position and
+# ring setting of a configuration.
+# The process which creates the store fills the tables once. A copy sent to another process (pickle) attaches to the
+# same memory without copying or computing anything: its tables are read-only views of the shared block, so the
+# memory used grows with the number of configurations and not with the number of processes.
+# close() must be called by every process when it no longer needs the tables; the creating process also frees the
+# shared memory, so it must be the last one to close the store.
+class SharedScramblerTables:
+
+    def __init__(self, configurations):
+        self.__layout = {}      # key -> (byte offset in the shared memory, number of rotors)
+        size = 0
+        for key, (forward, _, _) in configurations.items():
+            self.__layout[key] = (size, forward.shape[0])
+            size += 26 ** (forward.shape[0] + 1)
+        self.__memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.__owner = True
+        self.__tables = self.__views()
+        for key, (forward, backward, reflector) in configurations.items():
+            compiled_enigma.state_scrambler_tables(forward, backward, reflector, out=self.__tables[key])
+            self.__tables[key].flags.writeable = False
+
+    def __len__(self):
+        return len(self.__layout)
+
+    def __contains__(self, key):
+        return key in self.__layout
+
+    # Scrambler tables (26^num_rotors x 26) of the configuration key, None if they are not in the store
+    def get(self, key):
+        return self.__tables.get(key)
+
+    # Size of the shared memory block in bytes (it may be rounded up to a whole number of pages)
+    def nbytes(self):
+        return self.__memory.size if self.__memory is not None else 0
+
+    # Detach from the shared memory (and free it in the process which created the store)
+    def close(self):
+        if self.__memory is None:
+            return
+        # The views must be released before the memory
+        self.__tables = {}
+        self.__memory.close()
+        if self.__owner:
+            self.__memory.unlink()
+        self.__memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Views of the tables of each configuration in the shared memory block
+    def __views(self, writeable=True):
+        tables = {}
+        for key, (offset, num_rotors) in self.__layout.items():
+            tables[key] = np.ndarray((26 ** num_rotors, 26), dtype=np.uint8, buffer=self.__memory.buf, offset=offset)
+            tables[key].flags.writeable = writeable
+        return tables
+
+    # Only the name of the shared memory and the layout of the tables are sent to another process
+    def __getstate__(self):
+        if self.__memory is None:
+            raise ValueError("The shared scrambler tables have been closed")
+        return {"name": self.__memory.name, "layout": self.__layout}
+
+    def __setstate__(self, state):
+        self.__layout = state["layout"]
+        self.__memory = shared_memory.SharedMemory(name=state["name"])
+        self.__owner = False
+        self.__tables = self.__views(writeable=False)
+
+
+# Sum of the shared tables of each key as seen by a worker process, and whether they can be written
+def _worker_checksums(tables, keys):
+    with tables:
+        return [int(tables.get(key).sum(dtype=np.int64)) for key in keys], tables.get(keys[0]).flags.writeable
+
+
+if __name__ == '__main__':
+    import concurrent.futures
+    import pickle
+    from enigma import EnigmaMachine
+
+    em = EnigmaMachine()
+    configurations = {}
+    for rotor_names, reflector_name in [(("I", "II", "III"), "B"), (("V", "IV", "II"), "C"),
+                                        (("Beta", "I", "II", "III"), "B")]:
+        em.configure({"rotors": list(rotor_names), "reflector": reflector_name})
+        rotors_list = em.rotorcase.rotors
+        configurations[(rotor_names, reflector_name)] = (
+            np.array([compiled_enigma.rotor_wiring_array(r, 0) for r in rotors_list], dtype=np.uint8),
+            np.array([compiled_enigma.rotor_wiring_array(r, 1) for r in rotors_list], dtype=np.uint8),
+            compiled_enigma.reflector_array(em.reflector))
+    keys = list(configurations)
+    with SharedScramblerTables(configurations) as tables:
+        assert (len(tables) == 3 and tables.nbytes() >= 2 * 26 ** 4 + 26 ** 5 and tables.get("missing") is None)
+        for key, arrays in configurations.items():
+            assert ((tables.get(key) == compiled_enigma.state_scrambler_tables(*arrays)).all())
+        # A copy attaches to the same memory: no copy of the tables, read-only
+        copy = pickle.loads(pickle.dumps(tables))
+        assert (not copy.get(keys[0]).flags.writeable and len(pickle.dumps(tables)) < 1000)
+        assert ((copy.get(keys[2]) == tables.get(keys[2])).all())
+        copy.close()
+        # Worker processes see the tables filled by this process
+        expected = [int(tables.get(key).sum(dtype=np.int64)) for key in keys]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+            for checksums, writeable in executor.map(_worker_checksums, [tables] * 2, [keys] * 2):
+                assert (checksums == expected and not writeable)
+    assert (tables.nbytes() == 0)
+    print("Shared scrambler tables tests passed")
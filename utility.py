@@ -1,3 +1,5 @@
+import json
+import os
 import warnings
 
 # helper method to check the formatting of a input message
@@ -40,5 +42,13 @@ def moving_average(in_list, ww):
     return out_list
 
 
+# Load a settings dictionary from a JSON string or from the path of a JSON file
+def load_settings(spec):
+    if os.path.isfile(spec):
+        with open(spec, 'r') as file:
+            return json.load(file)
+    return json.loads(spec)
+
+
 if __name__ == '__main__':
     pass
@@ -0,0 +1,127 @@
+import numpy as np
+
+
+# Aho-Corasick automaton which finds all the occurrences of a list of words (UPPERCASE A-Z) in one pass over a phrase.
+# The automaton is stored as a complete transition table (num_states x 26) so that a batch of phrases can be scanned
+# at once with array gathers, one letter column at the time.
+class WordAutomaton:
+
+    def __init__(self, words):
+        self.words = list(words)                    # Words searched by the automaton, word ids are list indexes
+        self.terminals = {}                         # State -> ids of the words ending in that state
+        children = [{}]
+        parents = [0]
+        chars = [0]
+        depths = [0]
+        # Build the trie of the words
+        for word_id, word in enumerate(self.words):
+            # Words which cannot appear in a formatted phrase are never found
+            if len(word) == 0 or not all(65 <= ord(char) <= 90 for char in word):
+                continue
+            state = 0
+            for char in word:
+                num = ord(char) - 65
+                next_state = children[state].get(num)
+                if next_state is None:
+                    next_state = len(children)
+                    children[state][num] = next_state
+                    children.append({})
+                    parents.append(state)
+                    chars.append(num)
+                    depths.append(depths[state] + 1)
+                state = next_state
+            self.terminals.setdefault(state, []).append(word_id)
+        self.num_states = len(children)
+        parents = np.array(parents, dtype=np.int32)
+        chars = np.array(chars, dtype=np.intp)
+        depths = np.array(depths, dtype=np.intp)
+        terminal = np.zeros(self.num_states, dtype=bool)
+        terminal[list(self.terminals.keys())] = True
+        self.transitions = np.zeros((self.num_states, 26), dtype=np.int32)    # Complete transition table
+        fail = np.zeros(self.num_states, dtype=np.int32)                       # Failure links
+        self.has_output = terminal.copy()           # True if a word ends in the state or in one of its suffixes
+        self.dict_link = np.zeros(self.num_states, dtype=np.int32)  # Longest proper suffix state where a word ends
+        # Complete the transitions one trie level at the time: the failure link of a state is always shallower
+        order = np.argsort(depths, kind="stable")
+        level_starts = np.searchsorted(depths[order], np.arange(1, depths.max(initial=0) + 2))
+        for level in range(len(level_starts) - 1):
+            states = order[level_starts[level]: level_starts[level + 1]]
+            state_parents = parents[states]
+            state_chars = chars[states]
+            fail[states] = np.where(state_parents == 0, 0, self.transitions[fail[state_parents], state_chars])
+            self.transitions[state_parents, state_chars] = states
+            self.transitions[states] = self.transitions[fail[states]]
+            self.has_output[states] |= self.has_output[fail[states]]
+            self.dict_link[states] = np.where(terminal[fail[states]], fail[states], self.dict_link[fail[states]])
+        self.__set_flat_views()
+
+    # Flat views used by the one phrase scan, indexing them returns plain python integers
+    def __set_flat_views(self):
+        self.__flat_transitions = memoryview(self.transitions.ravel())
+        self.__flat_has_output = memoryview(self.has_output.view(np.uint8))
+        self.__flat_dict_link = memoryview(self.dict_link)
+
+    # Memory views cannot be pickled (e.g. to send the automaton to worker processes): they are rebuilt on unpickling
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ["_WordAutomaton__flat_transitions", "_WordAutomaton__flat_has_output", "_WordAutomaton__flat_dict_link"]:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__set_flat_views()
+
+    # Return the set of the ids of the words found in the phrase
+    def find(self, phrase):
+        transitions = self.__flat_transitions
+        has_output = self.__flat_has_output
+        found = set()
+        state = 0
+        for char in phrase:
+            state = transitions[state * 26 + ord(char) - 65]
+            if has_output[state]:
+                # Collect the words ending here and in all the suffixes of the current state
+                output_state = state
+                while output_state:
+                    if output_state in self.terminals:
+                        found.update(self.terminals[output_state])
+                    output_state = self.__flat_dict_link[output_state]
+        return found
+
+    # Check which phrases of a batch contain at least one of the words.
+    # letters = array (num_phrases x phrase length) of integers (A=0 ... Z=25)
+    # Returns a boolean array with one element per phrase
+    def contains_any(self, letters):
+        states = np.zeros(letters.shape[0], dtype=np.int32)
+        found = np.zeros(letters.shape[0], dtype=bool)
+        for idx in range(letters.shape[1]):
+            states = self.transitions[states, letters[:, idx]]
+            found |= self.has_output[states]
+        return found
+
+
+if __name__ == '__main__':
+    import pickle
+    import random
+
+    # Test the automaton against the "word in phrase" check
+    automaton = WordAutomaton(["HE", "SHE", "HIS", "HERS", "USHERS", "S", "HERS", "A?", ""])
+    assert (automaton.find("USHERS") == {0, 1, 3, 4, 5, 6})
+    assert (automaton.find("AHISX") == {2, 5})
+    assert (automaton.find("") == set())
+
+    random.seed(0)
+    words = ["".join(random.choice("ABCDE") for _ in range(random.randint(1, 6))) for _ in range(300)]
+    automaton = WordAutomaton(words)
+    phrases = ["".join(random.choice("ABCDE") for _ in range(40)) for _ in range(200)]
+    for phrase in phrases:
+        assert (automaton.find(phrase) == {idx for idx, word in enumerate(words) if word in phrase})
+    automaton = WordAutomaton(["ABCDE", "EDCBA", "AAAAAA"])
+    letters = np.array([[ord(char) - 65 for char in phrase] for phrase in phrases], dtype=np.uint8)
+    expected = [any(word in phrase for word in automaton.words) for phrase in phrases]
+    assert (list(automaton.contains_any(letters)) == expected)
+    # The automaton can be sent to worker processes
+    restored = pickle.loads(pickle.dumps(automaton))
+    assert (restored.find("XABCDEDCBAX") == {0, 1} and list(restored.contains_any(letters)) == expected)
+    print("Word automaton tests passed")